@@ -96,6 +96,14 @@ class ThorConnector:
         data = await self._request(path)
         return data
 
+    async def query_thorchain_block_stream(self, height, decoder_factory):
+        """
+        Same as query_thorchain_block_raw, but the response is decoded incrementally by a fresh
+        decoder_factory() per attempt (see ThorNodeClient.request_stream) and the decoder's result is returned.
+        """
+        path = self.env.path_thorchain_block_by_height.format(height=height)
+        return await self._request(path, decoder_factory=decoder_factory)
+
     async def query_genesis(self):
         data = await self._request(self.env.path_genesis, is_rpc=True)
         return data['result']['genesis'] if data else None
@@ -278,13 +286,16 @@ class ThorConnector:
         for client in self._clients:
             client.set_client_id_header(client_id)
 
-    async def _request(self, path, is_rpc=False, treat_empty_as_ok=True):
+    async def _request(self, path, is_rpc=False, treat_empty_as_ok=True, decoder_factory=None):
         for client in self._clients:
             for attempt in range(1, client.env.retries + 1):
                 if attempt > 1:
                     self.logger.debug(f'Retry #{attempt} for path "{path}"')
                 try:
-                    data = await client.request(path, is_rpc=is_rpc)
+                    if decoder_factory:
+                        data = await client.request_stream(path, decoder_factory(), is_rpc=is_rpc)
+                    else:
+                        data = await client.request(path, is_rpc=is_rpc)
 
                     if treat_empty_as_ok:
                         return data
@@ -9,6 +9,7 @@ from api.aionode.env import ThorEnvironment
 
 class ThorNodeClient:
     HEADER_CLIENT_ID = 'X-Client-ID'
+    STREAM_CHUNK_SIZE = 1 << 16
 
     def __init__(self, session: ClientSession, env: ThorEnvironment, logger=None, extra_headers=None):
         self.session = session
@@ -17,18 +18,33 @@ class ThorNodeClient:
         self.extra_headers = extra_headers
         self.env = env
 
+    def _check_status(self, resp, url):
+        self.logger.debug(f'Node RESPONSE ({resp.status}) "{url}"')
+        if resp.status == 404:
+            raise FileNotFoundError(f'{url} not found, sorry!')
+        elif resp.status == 501:
+            raise NotImplementedError(f'{url} not implemented, sorry!')
+
     async def request(self, path, is_rpc=False):
         url = self.connection_url(path, is_rpc)
         self.logger.debug(f'Node GET "{url}"')
         async with self.session.get(url, timeout=self.timeout, headers=self.extra_headers) as resp:
-            self.logger.debug(f'Node RESPONSE ({resp.status}) "{url}"')
-            if resp.status == 404:
-                raise FileNotFoundError(f'{url} not found, sorry!')
-            elif resp.status == 501:
-                raise NotImplementedError(f'{url} not implemented, sorry!')
+            self._check_status(resp, url)
             text = await resp.text()
             return ujson.loads(text)
 
+    async def request_stream(self, path, decoder, is_rpc=False):
+        """
+        Feeds the response body to decoder.feed(bytes) chunk by chunk as it arrives and returns decoder.close().
+        """
+        url = self.connection_url(path, is_rpc)
+        self.logger.debug(f'Node GET (stream) "{url}"')
+        async with self.session.get(url, timeout=self.timeout, headers=self.extra_headers) as resp:
+            self._check_status(resp, url)
+            async for chunk in resp.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                decoder.feed(chunk)
+            return decoder.close()
+
     def set_client_id_header(self, client_id: str):
         if not isinstance(self.extra_headers, dict):
             self.extra_headers = {}
@@ -144,6 +144,9 @@ class BaseFetcher(WithDelegates, WatchedEntity, ABC, WithLogger):
     async def post_action(self, data):
         ...
 
+    def sleep_before_next_run(self) -> float:
+        return self.sleep_period
+
     @abstractmethod
     async def fetch(self):
         ...
@@ -197,7 +200,7 @@ class BaseFetcher(WithDelegates, WatchedEntity, ABC, WithLogger):
 
         while True:
             await self.run_once()
-            await asyncio.sleep(self.sleep_period)
+            await asyncio.sleep(self.sleep_before_next_run())
 
     async def run(self):
         try:
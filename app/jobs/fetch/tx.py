@@ -45,12 +45,13 @@ class TxFetcher(BaseFetcher):
         txs = await self._fetch_unseen_txs()
         if txs:
             self.logger.info(f'New tx to analyze: {len(txs)}')
+            if self.deduplicator.front_cache is not None:
+                self.logger.info(f'Dedup front cache: {self.deduplicator.front_cache.stats}')
         return txs
 
     async def post_action(self, txs: List[ThorAction]):
         hashes = [self.get_seen_hash(t) for t in txs]
-        for h in hashes:
-            await self.deduplicator.mark_as_seen(h)
+        await self.deduplicator.mark_as_seen_hashes(hashes)
 
     # -----------------------
 
@@ -231,8 +232,9 @@ class TxFetcher(BaseFetcher):
 
             # filter out TXs from "selected_txs" that have been seen already
             unseen_new_txs = []
-            for tx in selected_txs:
-                if not await self.deduplicator.have_ever_seen(tx):
+            seen_flags = await self.deduplicator.batch_ever_seen_txs(selected_txs)
+            for tx, seen in zip(selected_txs, seen_flags):
+                if not seen:
                     unseen_new_txs.append(tx)
 
                     # It was previously pending, but now it's successful
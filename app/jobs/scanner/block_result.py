@@ -1,9 +1,12 @@
+import heapq
 import logging
 import re
+from collections import defaultdict
 from dataclasses import dataclass, replace
-from typing import List, NamedTuple, Iterable
+from functools import cached_property
+from typing import List, NamedTuple, Iterable, Dict, Tuple
 
-from jobs.scanner.tx import NativeThorTx, ThorEvent, ThorObservedTx
+from jobs.scanner.tx import NativeThorTx, ThorEvent, ThorObservedTx, ThorTxMessage
 from lib.date_utils import date_parse_rfc
 from lib.utils import safe_get
 
@@ -31,8 +34,20 @@ def is_block_error(result):
         return ScannerError(code, message, last_available_block)
 
 
+def _merge_in_order(index: dict, keys) -> list:
+    # index values are lists of (position, item) sorted by position
+    lists = [index[k] for k in keys if k in index]
+    if len(lists) == 1:
+        return [item for _, item in lists[0]]
+    return [item for _, item in heapq.merge(*lists, key=lambda pair: pair[0])]
+
+
 @dataclass
 class BlockResult:
+    """
+    The indexes below are built once on the first use and shared by all subscribers of the block.
+    """
+
     block_no: int
     txs: List[NativeThorTx]
     end_block_events: List[ThorEvent]
@@ -52,11 +67,38 @@ class BlockResult:
     def is_behind(self):
         return self.error.last_available_block != 0 and self.block_no < self.error.last_available_block
 
-    def find_tx_by_type(self, msg_type) -> Iterable[NativeThorTx]:
+    @cached_property
+    def _messages_by_type(self) -> Dict[str, List[Tuple[int, Tuple[NativeThorTx, ThorTxMessage]]]]:
+        index = defaultdict(list)
+        position = 0
         for tx in self.txs:
             for message in tx.messages:
-                if message.type == msg_type:
-                    yield tx
+                index[message.type].append((position, (tx, message)))
+                position += 1
+        return dict(index)
+
+    @cached_property
+    def _end_block_events_by_type(self) -> Dict[str, List[Tuple[int, ThorEvent]]]:
+        index = defaultdict(list)
+        for position, ev in enumerate(self.end_block_events):
+            index[ev.type].append((position, ev))
+        return dict(index)
+
+    def find_tx_by_type(self, msg_type) -> Iterable[NativeThorTx]:
+        # a tx is yielded once per message of this type, like before
+        return (tx for _, (tx, _) in self._messages_by_type.get(msg_type, ()))
+
+    def find_messages_by_type(self, *msg_types) -> List[Tuple[NativeThorTx, ThorTxMessage]]:
+        """
+        Returns (tx, message) pairs in the block order
+        """
+        return _merge_in_order(self._messages_by_type, msg_types)
+
+    def find_end_block_events(self, *ev_types) -> List[ThorEvent]:
+        """
+        Returns end block events of the given types in the block order
+        """
+        return _merge_in_order(self._end_block_events_by_type, ev_types)
 
     @property
     def only_successful(self) -> 'BlockResult':
@@ -89,23 +131,26 @@ class BlockResult:
 
     @property
     def all_event_types(self):
-        return set(ev.type for ev in self.end_block_events)
+        return set(self._end_block_events_by_type.keys())
 
-    @property
+    @cached_property
+    def observed_txs_by_id(self) -> Dict[str, ThorObservedTx]:
+        return {tx.tx_id: tx for tx in self.all_observed_txs}
+
+    @cached_property
     def all_observed_txs(self) -> List[ThorObservedTx]:
         observed_txs = {}
-        for tx in self.txs:
-            for message in tx.messages:
-                if message.type == message.MsgObservedTxIn:
-                    for inner_tx in message.txs:
-                        observed_txs[inner_tx['tx']['id']] = inner_tx
-                elif message.type == message.MsgObservedTxQuorum:
-                    quo_tx = message.get('quoTx', {})
-                    obs_tx = quo_tx.get('obsTx', {})
-                    is_inbound = quo_tx.get('inbound', False)
-                    obs_tx['__is_inbound'] = is_inbound
-                    obs_tx['__is_quorum'] = True
-                    observed_txs[obs_tx['tx']['id']] = obs_tx
+        for _, message in self.find_messages_by_type(ThorTxMessage.MsgObservedTxIn, ThorTxMessage.MsgObservedTxQuorum):
+            if message.type == message.MsgObservedTxIn:
+                for inner_tx in message.txs:
+                    observed_txs[inner_tx['tx']['id']] = inner_tx
+            else:
+                quo_tx = message.get('quoTx', {})
+                obs_tx = quo_tx.get('obsTx', {})
+                is_inbound = quo_tx.get('inbound', False)
+                obs_tx['__is_inbound'] = is_inbound
+                obs_tx['__is_quorum'] = True
+                observed_txs[obs_tx['tx']['id']] = obs_tx
         return [
             ThorObservedTx.from_dict(d) for d in observed_txs.values()
         ]
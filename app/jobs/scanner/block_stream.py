@@ -0,0 +1,67 @@
+from typing import Optional
+
+from jobs.scanner.block_result import BlockResult, ScannerError, is_block_error
+from jobs.scanner.tx import NativeThorTx, ThorEvent
+from lib.date_utils import date_parse_rfc
+from lib.json_stream import JsonObjectStream
+from lib.utils import safe_get
+
+
+class BlockResultStreamDecoder:
+    """
+    Builds a BlockResult from the raw "/thorchain/block" response while it is being downloaded.
+    Every tx and event is converted as soon as its JSON is complete, so the response text and
+    the full raw dict never exist at once. The result is the same as of BlockResult.load_block.
+    """
+
+    STREAM_KEYS = ('txs', 'begin_block_events', 'end_block_events')
+
+    def __init__(self, block_no):
+        self.block_no = block_no
+        self.txs = []
+        self.begin_block_events = []
+        self.end_block_events = []
+        self._pending_txs = []  # txs that came before the header, they need the block timestamp
+        self._timestamp: Optional[float] = None
+        self._stream = JsonObjectStream(self.STREAM_KEYS, self._on_item)
+
+    @property
+    def timestamp(self):
+        if self._timestamp is None:
+            if (header := self._stream.result.get('header')) is not None:
+                self._timestamp = date_parse_rfc(safe_get(header, 'time')).timestamp()
+        return self._timestamp
+
+    def _on_item(self, key, item):
+        if key == 'txs':
+            if (ts := self.timestamp) is None:
+                self._pending_txs.append(item)
+            else:
+                self.txs.append(NativeThorTx.from_dict(item, self.block_no, ts))
+        elif key == 'begin_block_events':
+            self.begin_block_events.append(ThorEvent.from_dict(item, self.block_no))
+        else:
+            self.end_block_events.append(ThorEvent.from_dict(item, self.block_no))
+
+    def feed(self, chunk: bytes):
+        self._stream.feed(chunk)
+
+    def close(self) -> BlockResult:
+        head = self._stream.close()
+        if err := is_block_error(head):
+            return BlockResult(self.block_no, txs=[], end_block_events=[], begin_block_events=[], error=err,
+                               timestamp=0)
+
+        ts = self.timestamp
+        if self._pending_txs:
+            self.txs[:0] = [NativeThorTx.from_dict(tx, self.block_no, ts) for tx in self._pending_txs]
+            self._pending_txs.clear()
+
+        return BlockResult(
+            block_no=self.block_no,
+            txs=self.txs,
+            end_block_events=self.end_block_events,
+            begin_block_events=self.begin_block_events,
+            error=ScannerError(0, ''),
+            timestamp=ts,
+        )
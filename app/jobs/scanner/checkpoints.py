@@ -0,0 +1,240 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from redis.asyncio import Redis
+
+from jobs.scanner.block_result import BlockResult
+from lib.db import DB
+from lib.delegates import INotified
+from lib.logs import WithLogger
+from lib.timings import pipeline_timings
+
+
+class BlockCheckpointStore:
+    """
+    The last block height that each block consumer has processed, kept in one Redis hash.
+    Updates are buffered in memory and written by flush() in one round trip.
+    """
+
+    DB_KEY = 'tx:scanner:checkpoints'
+
+    def __init__(self, db: DB):
+        self.db = db
+        self._heights: Dict[str, int] = {}
+        self._dirty = set()
+        self._loaded = False
+
+    async def load(self):
+        if not self._loaded:
+            r: Redis = await self.db.get_redis()
+            stored = await r.hgetall(self.DB_KEY)
+            for name, height in stored.items():
+                self._heights.setdefault(name, int(height))
+            self._loaded = True
+        return dict(self._heights)
+
+    async def get(self, name) -> int:
+        await self.load()
+        return self._heights.get(name, 0)
+
+    def set(self, name, height):
+        self._heights[name] = height
+        self._dirty.add(name)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        mapping = {name: self._heights[name] for name in self._dirty}
+        self._dirty.clear()
+        r: Redis = await self.db.get_redis()
+        await r.hset(self.DB_KEY, mapping=mapping)
+
+    async def clear(self):
+        self._heights.clear()
+        self._dirty.clear()
+        r: Redis = await self.db.get_redis()
+        await r.delete(self.DB_KEY)
+
+
+class BlockCatchUpBuffer(WithLogger):
+    """
+    The most recent parsed blocks, shared by the consumers that are behind the scanner.
+    A block that is not here anymore is fetched again, once for all consumers that wait for it.
+    """
+
+    def __init__(self, fetch_fn: Callable[[int], Awaitable[Optional[BlockResult]]], max_blocks=200):
+        super().__init__()
+        self.fetch_fn = fetch_fn
+        self.max_blocks = max_blocks
+        self._blocks: OrderedDict[int, BlockResult] = OrderedDict()
+        self._in_flight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def put(self, block: BlockResult):
+        self._blocks[block.block_no] = block
+        self._blocks.move_to_end(block.block_no)
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    async def get(self, height) -> Optional[BlockResult]:
+        if (block := self._blocks.get(height)) is not None:
+            self.hits += 1
+            return block
+
+        self.misses += 1
+        if (future := self._in_flight.get(height)) is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[height] = future
+        try:
+            block = await self.fetch_fn(height)
+            if block is not None and block.is_error:
+                block = None
+            if block is not None:
+                self.put(block)
+            future.set_result(block)
+            return block
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # nobody else might be waiting
+            raise
+        finally:
+            del self._in_flight[height]
+
+
+class CheckpointedSubscriber(INotified, WithLogger):
+    """
+    Feeds a block consumer strictly in height order from its own durable checkpoint.
+    If the consumer is behind (it failed, or it was stopped for a while), it catches up in the background
+    from the shared buffer, so the scanner and the other consumers do not wait for it.
+    A block that keeps failing is skipped after max_attempts.
+    """
+
+    def __init__(self, delegate: INotified, name: str,
+                 store: BlockCheckpointStore, buffer: BlockCatchUpBuffer,
+                 max_attempts=5, retry_delay=1.0, max_catch_up_blocks=600):
+        super().__init__()
+        self.delegate = delegate
+        self.name = name
+        self.store = store
+        self.buffer = buffer
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_catch_up_blocks = max_catch_up_blocks
+
+        self.checkpoint = 0
+        self.target = 0
+        self._loaded = False
+        self._catch_up_task: Optional[asyncio.Task] = None
+        self._attempts = 0
+        self.skipped = 0
+
+    def __str__(self):
+        return str(self.delegate)
+
+    def __repr__(self):
+        return f'CheckpointedSubscriber({self.name!r}, checkpoint={self.checkpoint}, target={self.target})'
+
+    @property
+    def lag_blocks(self):
+        return max(0, self.target - self.checkpoint)
+
+    @property
+    def is_catching_up(self):
+        return self._catch_up_task is not None and not self._catch_up_task.done()
+
+    async def _load(self, height):
+        if self._loaded:
+            return
+        self._loaded = True
+        self.checkpoint = await self.store.get(self.name)
+        if not self.checkpoint:
+            # the first run: start at the current block
+            self.checkpoint = height - 1
+        elif height - self.checkpoint > self.max_catch_up_blocks:
+            new_checkpoint = height - self.max_catch_up_blocks - 1
+            self.logger.warning(f'{self.name} is {height - self.checkpoint} blocks behind; '
+                                f'it skips blocks #{self.checkpoint + 1}..#{new_checkpoint}.')
+            self.checkpoint = new_checkpoint
+        elif self.checkpoint + 1 < height:
+            self.logger.info(f'{self.name} resumes from block #{self.checkpoint + 1}.')
+
+    async def on_data(self, sender, block: BlockResult):
+        height = block.block_no
+        await self._load(height)
+        self.target = max(self.target, height)
+
+        if height <= self.checkpoint:
+            return
+
+        if height == self.checkpoint + 1 and not self.is_catching_up:
+            # the usual path: the consumer is at the scanner's head
+            await self._process(sender, block)
+        elif not self.is_catching_up:
+            self._catch_up_task = asyncio.create_task(self._catch_up(sender))
+
+    async def on_error(self, sender, e):
+        await self.delegate.on_error(sender, e)
+
+    async def _process(self, sender, block: BlockResult):
+        try:
+            await self.delegate.on_data(sender, block)
+        except Exception as e:
+            self._attempts += 1
+            if self._attempts < self.max_attempts:
+                self.logger.exception(f'{self.name} failed at block #{block.block_no} '
+                                      f'(attempt {self._attempts}): {e!r}')
+                return False
+            self.logger.exception(f'{self.name} gives up block #{block.block_no} '
+                                  f'after {self._attempts} attempts: {e!r}')
+            self._skip(block.block_no)
+            return True
+        self._advance(block.block_no)
+        return True
+
+    def _advance(self, height):
+        self._attempts = 0
+        self.checkpoint = height
+        self.store.set(self.name, height)
+
+    def _skip(self, height):
+        self.skipped += 1
+        self._advance(height)
+
+    async def _catch_up(self, sender):
+        pipeline_timings.detach()
+        while self.checkpoint < self.target:
+            height = self.checkpoint + 1
+            try:
+                block = await self.buffer.get(height)
+            except Exception as e:
+                self.logger.error(f'{self.name} could not get block #{height}: {e!r}')
+                block = None
+
+            if block is None:
+                self._attempts += 1
+                if self._attempts >= self.max_attempts:
+                    self.logger.error(f'{self.name} skips block #{height}: it is not available.')
+                    self._skip(height)
+                else:
+                    await asyncio.sleep(self.retry_delay)
+                continue
+
+            if not await self._process(sender, block):
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            await self.store.flush()
+
+        self.logger.info(f'{self.name} caught up at block #{self.checkpoint}.')
+
+    def stop(self):
+        if self._catch_up_task:
+            self._catch_up_task.cancel()
+            self._catch_up_task = None
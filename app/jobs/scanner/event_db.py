@@ -1,27 +1,177 @@
+import base64
 import json
-from typing import Optional
+import zlib
+from collections import OrderedDict
+from typing import Optional, Iterable, Dict, List
 
 from redis.asyncio import Redis
+from redis.exceptions import ResponseError, WatchError
 
 from jobs.scanner.swap_props import SwapProps
-from lib.date_utils import DAY
+from lib.date_utils import DAY, MINUTE, now_ts
 from lib.db import DB
 from lib.logs import WithLogger
 
 
+class TxStateCache:
+    """
+    In-process copy of the recently used tx:tracker hashes (LRU, bounded by size).
+    An entry lives as long as its Redis key: a loaded entry gets the TTL the key has left,
+    and the TTL is restarted by every write, like EXPIRE does.
+    """
+
+    def __init__(self, max_size=10_000, ttl=5 * DAY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple] = OrderedDict()  # tx_id -> (attrs, expires at)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, tx_id):
+        return tx_id in self._entries
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+        }
+
+    def get(self, tx_id, now=None) -> Optional[dict]:
+        entry = self._entries.get(tx_id)
+        if entry is not None:
+            attrs, expires_at = entry
+            if expires_at > (now or now_ts()):
+                self._entries.move_to_end(tx_id)
+                self.hits += 1
+                return dict(attrs)
+            del self._entries[tx_id]
+        self.misses += 1
+
+    def put(self, tx_id, attrs: dict, now=None, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[tx_id] = (dict(attrs), (now or now_ts()) + ttl)
+        self._entries.move_to_end(tx_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def update(self, tx_id, stored_mapping: dict, now=None):
+        """
+        Write-through: only the txs that are already cached are updated, the others are unknown in full.
+        """
+        if (entry := self._entries.get(tx_id)) is not None:
+            self.put(tx_id, {**entry[0], **stored_mapping}, now)
+
+    def drop(self, tx_id):
+        self._entries.pop(tx_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
 class EventDatabase(WithLogger):
-    def __init__(self, db: DB, expiration_sec=5 * DAY):
+    """
+    Tracked txs live in "tx:tracker:{tx_id}" keys. There are two record formats:
+     - compact: one string with the JSON of all attributes (zlib + base64 if that is shorter), SET with EX;
+     - legacy: a hash with one field per attribute, HSET followed by EXPIRE.
+    Both are readable whatever the write format is; migrate_to_compact() converts the legacy ones in place.
+    A compact record is written as a whole, so the writes read the record first (or take it from the hot cache).
+    """
+
+    # zset: tx_id -> last update timestamp. It does not match "tx:tracker:*" on purpose
+    DB_KEY_INDEX = 'tx:tracker-index'
+    PRUNE_INTERVAL = 10 * MINUTE
+
+    COMPRESSED_PREFIX = 'z1:'
+    COMPRESS_LEVEL = 6
+    MIGRATE_ATTEMPTS = 5
+
+    def __init__(self, db: DB, expiration_sec=5 * DAY, hot_cache_size=0, compact=True):
         super().__init__()
         self.db = db
+        self.compact = compact
         self._expiration_sec = expiration_sec
+        self._last_prune_ts = 0.0
+        # Only for the instance that writes the txs, other writers would make it stale
+        self.cache = TxStateCache(hot_cache_size, expiration_sec) if hot_cache_size > 0 else None
 
     @staticmethod
     def key_to_tx(tx_id):
         return f'tx:tracker:{tx_id}'
 
+    # --- record format ---
+
+    @classmethod
+    def encode_record(cls, attrs: dict) -> str:
+        data = json.dumps(attrs, separators=(',', ':'))
+        packed = zlib.compress(data.encode('utf-8'), cls.COMPRESS_LEVEL)
+        compressed = cls.COMPRESSED_PREFIX + base64.b64encode(packed).decode('ascii')
+        # small records do not shrink
+        return compressed if len(compressed) < len(data) else data
+
+    @classmethod
+    def decode_record(cls, data: Optional[str]) -> dict:
+        if not data:
+            return {}
+        if data.startswith(cls.COMPRESSED_PREFIX):
+            data = zlib.decompress(base64.b64decode(data[len(cls.COMPRESSED_PREFIX):]))
+        return json.loads(data)
+
+    def _queue_read(self, pipe, tx_id, compact):
+        key = self.key_to_tx(tx_id)
+        if compact:
+            pipe.get(key)
+        else:
+            pipe.hgetall(key)
+
+    async def _load_records(self, r: Redis, tx_ids: List[str], with_ttl=False):
+        """
+        Expects the records in the current write format; the ones in the other format
+        (WRONGTYPE) are read again in the second round trip.
+        with_ttl: also returns the TTLs the keys have left (sec; None if the key has no TTL or is gone).
+        """
+        records = [{} for _ in tx_ids]
+        ttls = [None for _ in tx_ids]
+        todo = list(range(len(tx_ids)))
+        for compact in (self.compact, not self.compact):
+            if not todo:
+                break
+            async with r.pipeline(transaction=False) as pipe:
+                for i in todo:
+                    self._queue_read(pipe, tx_ids[i], compact)
+                    if with_ttl and compact == self.compact:
+                        pipe.pttl(self.key_to_tx(tx_ids[i]))
+                results = await pipe.execute(raise_on_error=False)
+            if with_ttl and compact == self.compact:
+                for i, pttl in zip(todo, results[1::2]):
+                    ttls[i] = pttl / 1000.0 if isinstance(pttl, int) and pttl >= 0 else None
+                results = results[0::2]
+            other_format = []
+            for i, result in zip(todo, results):
+                if isinstance(result, ResponseError) and str(result).startswith('WRONGTYPE'):
+                    other_format.append(i)
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    records[i] = self.decode_record(result) if compact else result
+            todo = other_format
+        return (records, ttls) if with_ttl else records
+
+    async def _read_raw(self, tx_id) -> dict:
+        return (await self.read_tx_status_raw_many([tx_id]))[tx_id]
+
     async def read_tx_status(self, tx_id) -> Optional[SwapProps]:
-        r: Redis = await self.db.get_redis()
-        props = await r.hgetall(self.key_to_tx(tx_id))
+        props = await self._read_raw(tx_id)
         return SwapProps.restore_events_from_tx_status(props)
 
     @staticmethod
@@ -36,47 +186,372 @@ class EventDatabase(WithLogger):
             except TypeError:
                 return str(v)
 
+    @classmethod
+    def as_stored(cls, mapping: dict) -> dict:
+        """
+        The values the way they come back from Redis.
+        """
+        result = {}
+        for k, v in mapping.items():
+            v = cls._convert_type(v)
+            result[k] = v.decode() if isinstance(v, bytes) else str(v)
+        return result
+
     async def write_tx_status(self, tx_id, mapping):
-        if mapping:
+        await self.write_tx_status_many({tx_id: mapping})
+
+    async def write_tx_status_kw(self, tx_id, **kwargs):
+        await self.write_tx_status(tx_id, kwargs)
+
+    async def read_tx_status_raw_many(self, tx_ids: Iterable[str]) -> Dict[str, dict]:
+        """
+        Raw attributes of many txs in one round trip. Unknown txs get empty dicts.
+        """
+        result = {}
+        to_load = []
+        for tx_id in dict.fromkeys(tx_ids):
+            if self.cache is not None and (attrs := self.cache.get(tx_id)) is not None:
+                result[tx_id] = attrs
+            else:
+                to_load.append(tx_id)
+
+        if to_load:
             r: Redis = await self.db.get_redis()
-            kwargs = {k: self._convert_type(v) for k, v in mapping.items()}
+            if self.cache is not None:
+                loaded, ttls = await self._load_records(r, to_load, with_ttl=True)
+                for tx_id, attrs, ttl in zip(to_load, loaded, ttls):
+                    # the entry must not outlive the key
+                    self.cache.put(tx_id, attrs, ttl=ttl)
+            else:
+                loaded = await self._load_records(r, to_load)
+            result.update(zip(to_load, loaded))
+        return result
 
-            key = self.key_to_tx(tx_id)
+    async def write_tx_status_many(self, mappings: Dict[str, dict]):
+        """
+        Merges the attributes into the records of many txs in one round trip
+        (two for the compact records that are not in the hot cache).
+        """
+        mappings = {tx_id: mapping for tx_id, mapping in mappings.items() if mapping}
+        if not mappings:
+            return
 
-            await r.hset(key, mapping=kwargs)
-            await r.expire(key, int(self._expiration_sec))
+        if self.compact:
+            await self._merge_records(mappings)
+            return
 
-            # print(f"{tx_id}: {mapping}")
+        r: Redis = await self.db.get_redis()
+        now = now_ts()
+        async with r.pipeline(transaction=False) as pipe:
+            for tx_id, mapping in mappings.items():
+                key = self.key_to_tx(tx_id)
+                pipe.hset(key, mapping={k: self._convert_type(v) for k, v in mapping.items()})
+                pipe.expire(key, int(self._expiration_sec))
+            # the index score is the last update time, so the key expires "expiration_sec" after it
+            pipe.zadd(self.DB_KEY_INDEX, dict.fromkeys(mappings.keys(), now))
+            results = await pipe.execute(raise_on_error=False)
 
-    async def write_tx_status_kw(self, tx_id, **kwargs):
-        await self.write_tx_status(tx_id, kwargs)
+        # the records that are compact already stay compact
+        compact_ones = {}
+        for (tx_id, mapping), result in zip(mappings.items(), results[0::2]):
+            if isinstance(result, ResponseError) and str(result).startswith('WRONGTYPE'):
+                compact_ones[tx_id] = mapping
+            elif isinstance(result, Exception):
+                raise result
+        if compact_ones:
+            await self._merge_records(compact_ones)
+
+        await self._prune_from_time_to_time(now)
+
+        if self.cache is not None:
+            for tx_id, mapping in mappings.items():
+                if tx_id not in compact_ones:
+                    self.cache.update(tx_id, self.as_stored(mapping))
+
+    async def _merge_records(self, mappings: Dict[str, dict]):
+        current = await self.read_tx_status_raw_many(mappings.keys())
+        await self.write_tx_records({
+            tx_id: {**current[tx_id], **self.as_stored(mapping)}
+            for tx_id, mapping in mappings.items()
+        })
+
+    async def write_tx_records(self, records: Dict[str, dict]):
+        """
+        Replaces the whole records of many txs (compact format) in one round trip.
+        The values must be stored already (see as_stored).
+        """
+        if not records:
+            return
+        r: Redis = await self.db.get_redis()
+        now = now_ts()
+        async with r.pipeline(transaction=False) as pipe:
+            for tx_id, attrs in records.items():
+                pipe.set(self.key_to_tx(tx_id), self.encode_record(attrs), ex=int(self._expiration_sec))
+            pipe.zadd(self.DB_KEY_INDEX, dict.fromkeys(records.keys(), now))
+            await pipe.execute()
+
+        await self._prune_from_time_to_time(now)
+
+        if self.cache is not None:
+            for tx_id, attrs in records.items():
+                self.cache.put(tx_id, attrs)
+
+    async def _prune_from_time_to_time(self, now):
+        if now - self._last_prune_ts > self.PRUNE_INTERVAL:
+            await self.prune_index(now)
+
+    def batch(self) -> 'TxStatusBatch':
+        return TxStatusBatch(self)
 
     @property
     def all_keys_pattern(self):
         return self.key_to_tx('*')
 
-    async def load_all_keys(self):
-        pattern = self.all_keys_pattern
+    # --- index ---
+
+    async def prune_index(self, now=None):
+        """
+        Removes the txs whose keys have expired in Redis.
+        """
+        now = now or now_ts()
+        self._last_prune_ts = now
         r: Redis = await self.db.get_redis()
-        keys = await r.keys(pattern)
-        return keys
+        removed = await r.zremrangebyscore(self.DB_KEY_INDEX, '-inf', now - self._expiration_sec)
+        if removed:
+            self.logger.info(f'Removed {removed} expired txs from the index.')
+        return removed
+
+    async def count_tx_ids(self, since_ts=0.0):
+        r: Redis = await self.db.get_redis()
+        return await r.zcount(self.DB_KEY_INDEX, since_ts or '-inf', '+inf')
+
+    async def list_tx_ids(self, offset=0, limit=100, newest_first=True, since_ts=0.0):
+        """
+        One page of the tracked tx ids ordered by the last update time.
+        """
+        r: Redis = await self.db.get_redis()
+        if newest_first:
+            return await r.zrevrangebyscore(self.DB_KEY_INDEX, '+inf', since_ts or '-inf', start=offset, num=limit)
+        else:
+            return await r.zrangebyscore(self.DB_KEY_INDEX, since_ts or '-inf', '+inf', start=offset, num=limit)
+
+    async def iter_tx_ids(self, page_size=1000):
+        """
+        All tracked tx ids, oldest update first, page by page, even if the index changes meanwhile.
+        The pages go by score (the update time), not by rank: the writes move ids to the end and prune_index
+        removes them from the start, so rank offsets would skip ids or repeat them.
+        A write moves an id forward only, so nothing is skipped; an id that is updated after it was yielded
+        comes again with its new score. Only the ids of the last score yielded are kept in memory.
+        """
+        r: Redis = await self.db.get_redis()
+        min_score, boundary = '-inf', set()  # boundary: the ids yielded with min_score, they come first again
+        while True:
+            num = page_size + len(boundary)
+            page = await r.zrangebyscore(self.DB_KEY_INDEX, min_score, '+inf', start=0, num=num, withscores=True)
+            for tx_id, score in page:
+                if not (score == min_score and tx_id in boundary):
+                    yield tx_id
+            if len(page) < num:
+                break
+            min_score = page[-1][1]
+            boundary = {tx_id for tx_id, score in page if score == min_score}
+
+    async def iter_tx_records(self, page_size=500):
+        """
+        Yields (tx_id, attrs) of all tracked txs; one round trip per page.
+        The ids whose keys are gone are removed from the index on the way.
+        """
+        r: Redis = await self.db.get_redis()
+        page = []
+
+        async def load(ids):
+            results = await self._load_records(r, ids)
+            gone = [tx_id for tx_id, attrs in zip(ids, results) if not attrs]
+            if gone:
+                await r.zrem(self.DB_KEY_INDEX, *gone)
+            return [(tx_id, attrs) for tx_id, attrs in zip(ids, results) if attrs]
+
+        async for tx_id in self.iter_tx_ids(page_size):
+            page.append(tx_id)
+            if len(page) >= page_size:
+                for item in await load(page):
+                    yield item
+                page = []
+        if page:
+            for item in await load(page):
+                yield item
+
+    async def rebuild_index(self, scan_count=1000):
+        """
+        Puts the txs written before the index existed into it. Uses SCAN, so Redis is not blocked.
+        Their last update time is estimated from the remaining TTL.
+        """
+        r: Redis = await self.db.get_redis()
+        prefix = self.key_to_tx('')
+        now = now_ts()
+        n = 0
+        batch = []
+
+        async def flush(keys):
+            async with r.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.ttl(key)
+                ttls = await pipe.execute()
+            scores = {
+                key[len(prefix):]: now - self._expiration_sec + (ttl if ttl > 0 else self._expiration_sec)
+                for key, ttl in zip(keys, ttls) if ttl != -2
+            }
+            if scores:
+                await r.zadd(self.DB_KEY_INDEX, scores)
+            return len(scores)
+
+        async for key in r.scan_iter(match=self.all_keys_pattern, count=scan_count):
+            batch.append(key)
+            if len(batch) >= scan_count:
+                n += await flush(batch)
+                batch = []
+        if batch:
+            n += await flush(batch)
+
+        self.logger.info(f'Indexed {n} txs.')
+        return n
+
+    async def load_all_keys(self):
+        return [self.key_to_tx(tx_id) async for tx_id in self.iter_tx_ids()]
 
     async def backup(self, filename):
+        """
+        Streams all tracked txs to a JSON file ({key: attrs}) page by page, in bounded memory.
+        It is safe to run while the bot is writing (see iter_tx_ids): a tx updated during the backup may be
+        written twice, and the later copy, which a JSON reader keeps, is the newer one.
+        """
         self.logger.info('Saving a backup')
+        n = 0
+        with open(filename, 'w') as f:
+            f.write('{')
+            async for tx_id, attrs in self.iter_tx_records():
+                f.write(',\n' if n else '\n')
+                f.write(f'{json.dumps(self.key_to_tx(tx_id))}: {json.dumps(attrs)}')
+                n += 1
+            f.write('\n}\n')
+        self.logger.info(f'Saved a backup containing {n} records.')
+        return n
+
+    # --- migration ---
+
+    async def migrate_to_compact(self, scan_count=200):
+        """
+        Converts the legacy hash records into compact ones in place, keeping their remaining TTL.
+        It is safe to run while the scanner writes: a page is converted in a MULTI/EXEC transaction that WATCHes
+        its keys, so a page that is changed in the meantime is read and converted again.
+        """
         r: Redis = await self.db.get_redis()
-        keys = await self.load_all_keys()
+        stats = {'converted': 0, 'conflicts': 0, 'failed': 0}
 
-        local_db = {}
-        for key in keys:
-            props = await r.hgetall(key)
-            local_db[key] = props
+        async def convert(keys):
+            for _ in range(self.MIGRATE_ATTEMPTS):
+                async with r.pipeline(transaction=True) as tx:
+                    await tx.watch(*keys)
+                    # the reads go through another connection, WATCH only cares about the changes
+                    async with r.pipeline(transaction=False) as pipe:
+                        for key in keys:
+                            pipe.hgetall(key)
+                            pipe.pttl(key)
+                        results = await pipe.execute(raise_on_error=False)
 
-        with open(filename, 'w') as f:
-            json.dump(local_db, f, indent=4)
-            self.logger.info(f'Saved a backup containing {len(local_db)} records.')
+                    tx.multi()
+                    n = 0
+                    for key, attrs, ttl_ms in zip(keys, results[0::2], results[1::2]):
+                        if isinstance(attrs, dict) and attrs:  # not converted or removed meanwhile
+                            ttl_ms = ttl_ms if isinstance(ttl_ms, int) and ttl_ms > 0 else self._expiration_sec * 1000
+                            tx.set(key, self.encode_record(attrs), px=int(ttl_ms))
+                            n += 1
+                    try:
+                        await tx.execute()
+                        return n
+                    except WatchError:
+                        stats['conflicts'] += 1
+            self.logger.warning(f'Gave up converting {len(keys)} records, they keep changing. Run it again later.')
+            stats['failed'] += len(keys)
+            return 0
 
-    async def erase_tx_id(self, tx_id):
+        page = []
+        async for key in r.scan_iter(match=self.all_keys_pattern, count=scan_count, _type='hash'):
+            page.append(key)
+            if len(page) >= scan_count:
+                stats['converted'] += await convert(page)
+                page = []
+        if page:
+            stats['converted'] += await convert(page)
+
+        self.logger.info(f'Migration to the compact records: {stats}.')
+        return stats
+
+    async def erase_tx_ids(self, tx_ids: List[str]):
+        """
+        Deletes the records and their index entries in one round trip. Returns the number of deleted records.
+        """
+        if not tx_ids:
+            return 0
         r: Redis = await self.db.get_redis()
-        key = self.key_to_tx(tx_id)
-        await r.delete(key)
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.delete(*[self.key_to_tx(tx_id) for tx_id in tx_ids])
+            pipe.zrem(self.DB_KEY_INDEX, *tx_ids)
+            deleted, _ = await pipe.execute()
+        if self.cache is not None:
+            for tx_id in tx_ids:
+                self.cache.drop(tx_id)
+        return deleted
+
+    async def erase_tx_id(self, tx_id):
+        await self.erase_tx_ids([tx_id])
         self.logger.warning(f'Erased tx_id {tx_id} from the database.')
+
+
+class TxStatusBatch:
+    """
+    Reads the statuses of many txs in one round trip, applies the writes to the local copy
+    (so the following reads see them, like they would see them in Redis) and commits them all in one round trip.
+    """
+
+    def __init__(self, db: EventDatabase):
+        self._db = db
+        self._attrs: Dict[str, dict] = {}
+        self._pending: Dict[str, dict] = {}
+
+    async def load(self, tx_ids: Iterable[str]):
+        missing = [tx_id for tx_id in tx_ids if tx_id and tx_id not in self._attrs]
+        self._attrs.update(await self._db.read_tx_status_raw_many(missing))
+
+    def read_tx_status(self, tx_id) -> Optional[SwapProps]:
+        # like EventDatabase.read_tx_status, no record (or no id, e.g. an outbound without in-tx id) gives None
+        if not tx_id or tx_id not in self._attrs:
+            return None
+        return SwapProps.restore_events_from_tx_status(self._attrs[tx_id])
+
+    def write_tx_status(self, tx_id, mapping):
+        if not mapping:
+            return
+        self._pending.setdefault(tx_id, {}).update(mapping)
+        if tx_id in self._attrs:
+            self._attrs[tx_id] = {**self._attrs[tx_id], **self._db.as_stored(mapping)}
+
+    def write_tx_status_kw(self, tx_id, **kwargs):
+        self.write_tx_status(tx_id, kwargs)
+
+    @property
+    def pending_writes(self):
+        return len(self._pending)
+
+    async def commit(self):
+        pending, self._pending = self._pending, {}
+        if not self._db.compact:
+            await self._db.write_tx_status_many(pending)
+            return
+
+        # compact records are written whole, so the txs that were written blindly are read now
+        missing = [tx_id for tx_id in pending if tx_id not in self._attrs]
+        if missing:
+            for tx_id, attrs in (await self._db.read_tx_status_raw_many(missing)).items():
+                self._attrs[tx_id] = {**attrs, **self._db.as_stored(pending[tx_id])}
+        await self._db.write_tx_records({tx_id: self._attrs[tx_id] for tx_id in pending})
@@ -0,0 +1,96 @@
+from typing import Optional
+
+from lib.constants import THOR_BLOCK_TIME
+from lib.date_utils import now_ts
+
+
+class ScannerLagMonitor:
+    """
+    Tracks how far the block scanner is behind the node and decides how long to sleep before the next poll:
+    back-to-back fetches when behind, tight polling around the expected next block time at the head,
+    exponential backoff when the node produces no blocks or fails.
+    """
+
+    def __init__(self, block_time=THOR_BLOCK_TIME, min_poll=0.5, max_sleep=THOR_BLOCK_TIME,
+                 stale_after=3 * THOR_BLOCK_TIME, max_backoff=60.0):
+        self.block_time = block_time
+        self.min_poll = min_poll
+        self.max_sleep = max_sleep
+        self.stale_after = stale_after
+        self.max_backoff = max_backoff
+
+        self.node_height = 0
+        self.last_block = 0  # the last processed height
+        self.last_block_time = 0.0  # its chain timestamp
+        self.last_block_seen_ts = 0.0  # when the scanner processed it
+        self.empty_polls = 0
+        self.errors = 0
+
+    def on_node_height(self, height):
+        if height:
+            self.node_height = max(self.node_height, int(height))
+
+    def on_block(self, height, block_time=0.0, now: Optional[float] = None):
+        self.last_block = height
+        self.last_block_time = block_time or self.last_block_time
+        self.last_block_seen_ts = now or now_ts()
+        self.node_height = max(self.node_height, height)
+        self.empty_polls = 0
+        self.errors = 0
+
+    def on_empty_poll(self):
+        """
+        The next block is not produced yet, so the scanner is at the head.
+        """
+        self.empty_polls += 1
+        self.errors = 0
+        self.node_height = self.last_block
+
+    def on_error(self):
+        self.errors += 1
+
+    @property
+    def lag_blocks(self):
+        return max(0, self.node_height - self.last_block)
+
+    def lag_seconds(self, now: Optional[float] = None):
+        if not self.last_block_time:
+            return 0.0
+        return max(0.0, (now or now_ts()) - self.last_block_time)
+
+    def is_node_stale(self, now: Optional[float] = None):
+        if not self.last_block_seen_ts:
+            return False
+        return (now or now_ts()) - self.last_block_seen_ts > self.stale_after
+
+    def _backoff(self, n):
+        return min(self.max_backoff, self.min_poll * 2 ** min(n, 16))
+
+    def next_sleep(self, now: Optional[float] = None) -> float:
+        now = now or now_ts()
+
+        if self.errors:
+            return self._backoff(self.errors)
+
+        if self.lag_blocks > 0:
+            return 0.0
+
+        if self.is_node_stale(now):
+            return self._backoff(self.empty_polls)
+
+        if not self.last_block_time:
+            return self.max_sleep
+
+        expected_in = self.last_block_time + self.block_time - now
+        return min(self.max_sleep, max(self.min_poll, expected_in))
+
+    @property
+    def summary(self):
+        return {
+            'node_height': self.node_height,
+            'last_block': self.last_block,
+            'lag_blocks': self.lag_blocks,
+            'lag_sec': self.lag_seconds(),
+            'empty_polls': self.empty_polls,
+            'errors': self.errors,
+        }
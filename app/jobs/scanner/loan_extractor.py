@@ -23,7 +23,7 @@ class LoanExtractorBlock(WithLogger, WithDelegates, INotified):
         results = []
         ph = self.deps.price_holder
 
-        for e in block.end_block_events:
+        for e in block.find_end_block_events('loan_open', 'loan_repayment'):
             event = parse_swap_and_out_event(e)
 
             if isinstance(event, EventLoanOpen):
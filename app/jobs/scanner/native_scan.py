@@ -1,11 +1,18 @@
 import asyncio
+import time
 from typing import Optional
 
 from jobs.fetch.base import BaseFetcher
 from jobs.scanner.block_result import BlockResult
+from jobs.scanner.block_stream import BlockResultStreamDecoder
+from jobs.scanner.checkpoints import BlockCheckpointStore, BlockCatchUpBuffer, CheckpointedSubscriber
+from jobs.scanner.lag_monitor import ScannerLagMonitor
+from jobs.scanner.prefetch import BlockPrefetchWindow
 from lib.constants import THOR_BLOCK_TIME
 from lib.date_utils import now_ts_utc
+from lib.delegates import INotified, unwrap_delegate
 from lib.depcont import DepContainer
+from lib.timings import pipeline_timings, measure_hop
 from lib.utils import safe_get
 
 
@@ -14,7 +21,18 @@ class BlockScanner(BaseFetcher):
 
     NAME = 'block_scanner'
 
-    def __init__(self, deps: DepContainer, sleep_period=None, last_block=0, max_attempts=MAX_ATTEMPTS_TO_SKIP_BLOCK):
+    LAG_CHECK_INTERVAL = 60.0  # sec
+    LAG_ALERT_BLOCKS = 10
+
+    TIMING_REPORT_EVERY = 100  # blocks
+
+    STAGE_FETCH = 'BlockScanner.fetch'
+    STAGE_PARSE = 'BlockResult.load_block'
+    STAGE_FETCH_DECODE = 'BlockScanner.fetch_decode'
+
+    def __init__(self, deps: DepContainer, sleep_period=None, last_block=0, max_attempts=MAX_ATTEMPTS_TO_SKIP_BLOCK,
+                 prefetch_window=1, prefetch_target_latency=BlockPrefetchWindow.DEFAULT_TARGET_LATENCY,
+                 adaptive_polling=False, streaming_decode=False, slow_block_threshold=THOR_BLOCK_TIME):
         sleep_period = sleep_period or THOR_BLOCK_TIME * 0.99
         super().__init__(deps, sleep_period)
         self._last_block = last_block
@@ -28,6 +46,56 @@ class BlockScanner(BaseFetcher):
         # if more time has passed since the last block, we should run aggressive scan
         self._time_tolerance_for_aggressive_scan = THOR_BLOCK_TIME * 1.5  # 6 sec + 50%
 
+        # during the aggressive scan, several upcoming blocks are fetched concurrently
+        self._prefetch = BlockPrefetchWindow(self.fetch_one_block,
+                                             max_size=prefetch_window,
+                                             target_latency=prefetch_target_latency,
+                                             last_height_fn=lambda: self.lag.node_height)
+
+        # lag against the node's latest height; it also decides how long to sleep between polls if adaptive
+        self.lag = ScannerLagMonitor(max_sleep=self.sleep_period)
+        self.adaptive_polling = adaptive_polling
+        self._last_lag_check_ts = 0.0
+
+        # decode txs and events while the block is being downloaded instead of loading the whole JSON first
+        self.streaming_decode = streaming_decode
+
+        # fetch and parse times per height, they are added to the block's timing when it is dispatched
+        self._fetch_timings = {}
+        # a block that takes longer than that (fetch + parse + listeners) is logged with its slowest stages
+        self.slow_block_threshold = slow_block_threshold
+        self._blocks_dispatched = 0
+
+        # optional per-subscriber checkpoints, see use_checkpoints
+        self.checkpoints: Optional[BlockCheckpointStore] = None
+        self.catch_up_buffer: Optional[BlockCatchUpBuffer] = None
+        self._checkpoint_options = {}
+
+    def use_checkpoints(self, buffer_size=200, max_catch_up_blocks=600):
+        """
+        Opt-in: the subscribers added after this call keep their own durable last processed height,
+        resume from it after a restart and catch up independently (see CheckpointedSubscriber).
+        """
+        self.checkpoints = BlockCheckpointStore(self.deps.db)
+        self.catch_up_buffer = BlockCatchUpBuffer(self.fetch_one_block, max_blocks=buffer_size)
+        self._checkpoint_options = dict(max_attempts=self.max_attempts, max_catch_up_blocks=max_catch_up_blocks)
+        return self
+
+    def add_subscriber(self, delegate: INotified, name=None):
+        if self.checkpoints is not None and delegate and delegate not in self.subscribers:
+            name = name or delegate.__class__.__name__
+            delegate = CheckpointedSubscriber(delegate, name, self.checkpoints, self.catch_up_buffer,
+                                              **self._checkpoint_options)
+        return super().add_subscriber(delegate)
+
+    @property
+    def subscriber_checkpoints(self):
+        checkpointed = [unwrap_delegate(d, stop_at=CheckpointedSubscriber) for d in self.delegates]
+        return {
+            d.name: {'checkpoint': d.checkpoint, 'lag': d.lag_blocks, 'skipped': d.skipped}
+            for d in checkpointed if isinstance(d, CheckpointedSubscriber)
+        }
+
     @property
     def last_block_ts(self):
         return self._last_block_ts
@@ -40,6 +108,19 @@ class BlockScanner(BaseFetcher):
     def last_block(self):
         return self._last_block
 
+    @property
+    def lag_blocks(self):
+        return self.lag.lag_blocks
+
+    @property
+    def lag_seconds(self):
+        return self.lag.lag_seconds()
+
+    def sleep_before_next_run(self) -> float:
+        if not self.adaptive_polling:
+            return super().sleep_before_next_run()
+        return self.lag.next_sleep()
+
     @last_block.setter
     def last_block(self, value):
         self.logger.warning(f'Last block number manually changed from {self._last_block} to {value}.')
@@ -47,6 +128,7 @@ class BlockScanner(BaseFetcher):
 
     def _on_error(self, reason='', **kwargs):
         self.logger.warning(f'Error fetching block #{self._last_block} ({reason = !r}).')
+        self.lag.on_error()
         self._this_block_attempts += 1
         if self._this_block_attempts >= self.max_attempts:
             self.logger.error(f'Too many attempts to get block #{self._last_block}. Skipping it.')
@@ -68,19 +150,30 @@ class BlockScanner(BaseFetcher):
                 await asyncio.sleep(self.sleep_period)
 
     async def check_lagging(self):
-        # todo: use it!
         real_last_block = await self._fetch_last_block()
         if not real_last_block:
             self.logger.error('Failed to get real last block number!')
             return False
+        self.lag.on_node_height(real_last_block)
         delta = real_last_block - self._last_block
-        if delta > 10:
+        if delta > self.LAG_ALERT_BLOCKS:
             self.logger.warning(f'Lagging behind {delta} blocks!')
             self.deps.emergency.report(self.NAME, 'Lagging behind',
                                        delta=delta,
                                        my_block=self._last_block,
                                        real_block=real_last_block)
             return False
+        return True
+
+    async def _check_lagging_periodically(self):
+        if now_ts_utc() - self._last_lag_check_ts < self.LAG_CHECK_INTERVAL:
+            return
+        self._last_lag_check_ts = now_ts_utc()
+        try:
+            await self.check_lagging()
+            self.logger.info(f'Lag: {self.lag.summary}')
+        except Exception as e:
+            self.logger.warning(f'Failed to check the lag: {e!r}')
 
     def _on_error_block(self, block: BlockResult):
         self._on_error(f'Block.error #{block.error.code}: {block.error.message}',
@@ -94,7 +187,8 @@ class BlockScanner(BaseFetcher):
             self.logger.info(f'😡 time_since_last_block = {time_since_last_block:.3f} sec. Run aggressive scan!')
             return True
 
-        lag_behind_node_block = int(self.deps.last_block_store) - self._last_block
+        self.lag.on_node_height(int(self.deps.last_block_store))
+        lag_behind_node_block = self.lag.node_height - self._last_block
         if lag_behind_node_block > 2:
             self.logger.info(f"😡 {lag_behind_node_block = }. Run aggressive scan!")
             return True
@@ -103,9 +197,14 @@ class BlockScanner(BaseFetcher):
 
     async def fetch(self):
         await self.ensure_last_block()
+        await self._check_lagging_periodically()
 
         if self._last_block % 10 == 0:
             self.logger.info(f'👿 Tick start for block #{self._last_block}.')
+            if dispatch_stats := self.dispatch_stats:
+                self.logger.info(f'Listener queues: {dispatch_stats}')
+            if checkpoints := self.subscriber_checkpoints:
+                self.logger.info(f'Listener checkpoints: {checkpoints}')
         else:
             self.logger.debug(f'👿 Tick start for block #{self._last_block}.')
 
@@ -118,7 +217,7 @@ class BlockScanner(BaseFetcher):
         while True:
             try:
                 self.logger.info(f'Fetching block #{self._last_block}. Cycle: {self._block_cycle}.')
-                block_result = await self.fetch_one_block(self._last_block)
+                block_result = await self._fetch_next_block(aggressive)
 
                 if block_result is None:
                     self._on_error('None returned')
@@ -144,6 +243,7 @@ class BlockScanner(BaseFetcher):
                             self.logger.debug(f'We are running ahead of real block height. '
                                               f'{self._last_block = },'
                                               f'{last_av_b = }')
+                            self.lag.on_empty_poll()
                             break
                         else:
                             self._on_error_block(block_result)
@@ -157,11 +257,12 @@ class BlockScanner(BaseFetcher):
                 self._on_error(str(e))
                 break
 
+            self.lag.on_block(self._last_block, block_result.timestamp)
             self._last_block += 1
             self._this_block_attempts = 0
             self._block_cycle += 1
 
-            await self.pass_data_to_listeners(block_result)
+            await self._dispatch_block(block_result)
 
             if self.one_block_per_run:
                 self.logger.warning('One block per run mode is on. Stopping.')
@@ -171,6 +272,42 @@ class BlockScanner(BaseFetcher):
                 # only one block at the time if it is not aggressive scan
                 break
 
+    async def _dispatch_block(self, block_result: BlockResult):
+        height = block_result.block_no
+        fetch_stages = self._fetch_timings.pop(height, {})
+        for stale_height in [h for h in self._fetch_timings if h < height]:
+            del self._fetch_timings[stale_height]
+
+        if self.catch_up_buffer is not None:
+            self.catch_up_buffer.put(block_result)
+
+        trace = pipeline_timings.begin_block(height)
+        t0 = time.perf_counter()
+        try:
+            await self.pass_data_to_listeners(block_result)
+            if self.checkpoints is not None:
+                await self.checkpoints.flush()
+        finally:
+            dispatch_time = time.perf_counter() - t0
+            trace[0].stages.update(fetch_stages)
+            trace = pipeline_timings.end_block(trace, dispatch_time + sum(fetch_stages.values()),
+                                               self.slow_block_threshold)
+
+        if self.slow_block_threshold and trace.total >= self.slow_block_threshold:
+            self.logger.warning(f'Slow block! {trace}')
+
+        self._blocks_dispatched += 1
+        if self._blocks_dispatched % self.TIMING_REPORT_EVERY == 0:
+            self.logger.info(f'Pipeline timings:\n{pipeline_timings.report()}')
+
+    async def _fetch_next_block(self, aggressive) -> Optional[BlockResult]:
+        if aggressive and self._prefetch.is_enabled:
+            return await self._prefetch.get(self._last_block)
+        else:
+            # at the head of the chain there is nothing to prefetch
+            self._prefetch.reset()
+            return await self.fetch_one_block(self._last_block)
+
     async def _fetch_last_block(self):
         result = await self.deps.thor_connector.query_native_status_raw()
         if result:
@@ -179,12 +316,33 @@ class BlockScanner(BaseFetcher):
     async def _fetch_raw_block(self, block_no):
         return await self.deps.thor_connector.query_thorchain_block_raw(block_no)
 
-    async def fetch_one_block(self, block_index) -> Optional[BlockResult]:
-        block_raw = await self._fetch_raw_block(block_index)
+    async def _fetch_block_result(self, block_index) -> Optional[BlockResult]:
+        if self.streaming_decode:
+            with measure_hop(self.STAGE_FETCH_DECODE) as fetch_timer:
+                result = await self.deps.thor_connector.query_thorchain_block_stream(
+                    block_index, lambda: BlockResultStreamDecoder(block_index)
+                )
+            self._fetch_timings[block_index] = {self.STAGE_FETCH_DECODE: fetch_timer.elapsed}
+            return result
+
+        with measure_hop(self.STAGE_FETCH) as fetch_timer:
+            block_raw = await self._fetch_raw_block(block_index)
         if block_raw is None:
             return None
 
-        block_result = BlockResult.load_block(block_raw, block_index)
+        with measure_hop(self.STAGE_PARSE) as parse_timer:
+            result = BlockResult.load_block(block_raw, block_index)
+
+        self._fetch_timings[block_index] = {
+            self.STAGE_FETCH: fetch_timer.elapsed,
+            self.STAGE_PARSE: parse_timer.elapsed,
+        }
+        return result
+
+    async def fetch_one_block(self, block_index) -> Optional[BlockResult]:
+        block_result = await self._fetch_block_result(block_index)
+        if block_result is None:
+            return None
 
         if block_result.is_error:
             return block_result
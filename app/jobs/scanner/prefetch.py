@@ -0,0 +1,111 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from jobs.scanner.block_result import BlockResult
+from lib.logs import WithLogger
+
+
+class BlockPrefetchWindow(WithLogger):
+    """
+    Fetches and parses several upcoming blocks concurrently but hands them out strictly in height order.
+    The window grows by one block after every fast fetch and halves on errors or slow responses.
+    Nothing above the last height known to the node (last_height_fn) is prefetched, and a block that is
+    not produced yet is not an error: the window keeps its size.
+    """
+
+    DEFAULT_MAX_SIZE = 8
+    DEFAULT_TARGET_LATENCY = 2.0  # sec
+
+    def __init__(self, fetch_fn: Callable[[int], Awaitable[Optional[BlockResult]]],
+                 max_size=DEFAULT_MAX_SIZE, min_size=1, target_latency=DEFAULT_TARGET_LATENCY,
+                 last_height_fn: Optional[Callable[[], int]] = None):
+        super().__init__()
+        assert 1 <= min_size <= max(1, max_size)
+        self._fetch_fn = fetch_fn
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.target_latency = target_latency
+        self._last_height_fn = last_height_fn
+        self.size = min_size
+        self.last_latency = 0.0
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    @property
+    def is_enabled(self):
+        return self.max_size > 1
+
+    @property
+    def pending_heights(self):
+        return sorted(self._tasks.keys())
+
+    def __repr__(self):
+        return f'BlockPrefetchWindow(size={self.size}/{self.max_size}, pending={len(self._tasks)})'
+
+    async def _timed_fetch(self, height):
+        t0 = time.monotonic()
+        result = await self._fetch_fn(height)
+        return result, time.monotonic() - t0
+
+    @staticmethod
+    def _discard(task: asyncio.Task):
+        if task.done():
+            if not task.cancelled():
+                # retrieve it, so asyncio does not complain about an unhandled exception
+                task.exception()
+        else:
+            task.cancel()
+
+    def _schedule(self, height):
+        # nobody is going to ask for the heights below, they are already delivered or skipped
+        for h in [h for h in self._tasks if h < height]:
+            self._discard(self._tasks.pop(h))
+
+        end = height + self.size
+        if self._last_height_fn is not None:
+            # the requested height itself is always fetched, it is how a new block is found
+            end = min(end, max(height + 1, (self._last_height_fn() or 0) + 1))
+
+        for h in range(height, end):
+            if h not in self._tasks:
+                self._tasks[h] = asyncio.create_task(self._timed_fetch(h))
+
+    def reset(self):
+        for task in self._tasks.values():
+            self._discard(task)
+        self._tasks.clear()
+
+    def _grow(self):
+        self.size = min(self.max_size, self.size + 1)
+
+    def _shrink(self):
+        new_size = max(self.min_size, self.size // 2)
+        if new_size != self.size:
+            self.logger.info(f'Prefetch window shrinks: {self.size} => {new_size}')
+        self.size = new_size
+
+    async def get(self, height) -> Optional[BlockResult]:
+        self._schedule(height)
+        task = self._tasks.pop(height)
+        try:
+            result, latency = await task
+        except Exception:
+            self._shrink()
+            self.reset()
+            raise
+
+        self.last_latency = latency
+
+        if result is not None and result.is_ahead:
+            # not produced yet: neither are the blocks after it, and it is no reason to shrink
+            self.reset()
+        elif result is None or result.is_error:
+            # The node has no data for this height, so the blocks after it are not trustworthy either
+            self._shrink()
+            self.reset()
+        elif latency > self.target_latency:
+            self._shrink()
+        else:
+            self._grow()
+
+        return result
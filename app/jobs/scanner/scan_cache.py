@@ -1,23 +1,201 @@
+import base64
+import zlib
+
 import ujson
+from redis.asyncio import Redis
 
+from jobs.scanner.block_result import is_block_error
 from jobs.scanner.native_scan import BlockScanner
+from lib.date_utils import DAY, now_ts
+from lib.db import DB
 from lib.depcont import DepContainer
+from lib.logs import WithLogger
 
 
-class BlockScannerCached(BlockScanner):
+class BlockRawCache(WithLogger):
+    """
+    Raw block JSON cache in Redis. Payloads are zlib-compressed.
+    The cache is bounded by the number of blocks, by total payload bytes and by age; the lowest heights go first.
+    """
+
     DB_KEY_BLOCK = 'tx:__cache:block'
+    DB_KEY_HEIGHTS = 'tx:__cache:block:heights'  # zset: height -> height
+    DB_KEY_TIMES = 'tx:__cache:block:times'  # zset: height -> insertion timestamp
+    DB_KEY_STATS = 'tx:__cache:block:stats'
+
+    COMPRESSED_PREFIX = 'z1:'
+    EVICT_BATCH = 100
+
+    def __init__(self, db: DB, max_blocks=10_000, max_bytes=0, max_age=3 * DAY, compress_level=6):
+        super().__init__()
+        self.db = db
+        self.max_blocks = max_blocks
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress_level = compress_level
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, block: dict) -> str:
+        packed = zlib.compress(ujson.dumps(block).encode('utf-8'), self.compress_level)
+        return self.COMPRESSED_PREFIX + base64.b64encode(packed).decode('ascii')
+
+    @classmethod
+    def decode(cls, data: str) -> dict:
+        if data.startswith(cls.COMPRESSED_PREFIX):
+            packed = base64.b64decode(data[len(cls.COMPRESSED_PREFIX):])
+            data = zlib.decompress(packed)
+        # plain JSON is written by older versions
+        return ujson.loads(data)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get(self, block_no):
+        r: Redis = await self.db.get_redis()
+        data = await r.hget(self.DB_KEY_BLOCK, str(block_no))
+        if data:
+            self.hits += 1
+            return self.decode(data)
+        else:
+            self.misses += 1
+
+    async def put(self, block_no, block: dict):
+        r: Redis = await self.db.get_redis()
+        key = str(block_no)
+        data = self.encode(block)
+
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.zscore(self.DB_KEY_HEIGHTS, key)
+            pipe.hstrlen(self.DB_KEY_BLOCK, key)
+            indexed, old_size = await pipe.execute()
+        # a block stored by an older version was never counted in the bytes
+        old_size = old_size if indexed is not None else 0
+
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.hset(self.DB_KEY_BLOCK, key, data)
+            pipe.zadd(self.DB_KEY_HEIGHTS, {key: int(block_no)})
+            pipe.zadd(self.DB_KEY_TIMES, {key: now_ts()})
+            pipe.hincrby(self.DB_KEY_STATS, 'bytes', len(data) - old_size)
+            await pipe.execute()
+
+        await self.evict()
+
+    async def _remove(self, r: Redis, keys):
+        if not keys:
+            return 0
+
+        async with r.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hstrlen(self.DB_KEY_BLOCK, key)
+            sizes = await pipe.execute()
+
+        freed = sum(sizes)
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.hdel(self.DB_KEY_BLOCK, *keys)
+            pipe.zrem(self.DB_KEY_HEIGHTS, *keys)
+            pipe.zrem(self.DB_KEY_TIMES, *keys)
+            pipe.hincrby(self.DB_KEY_STATS, 'bytes', -freed)
+            pipe.hincrby(self.DB_KEY_STATS, 'evicted', len(keys))
+            await pipe.execute()
+        return len(keys)
+
+    async def evict(self):
+        r: Redis = await self.db.get_redis()
+        evicted = 0
+
+        if self.max_age > 0:
+            expired = await r.zrangebyscore(self.DB_KEY_TIMES, '-inf', now_ts() - self.max_age)
+            evicted += await self._remove(r, expired)
+
+        if self.max_blocks > 0:
+            extra = await r.zcard(self.DB_KEY_HEIGHTS) - self.max_blocks
+            if extra > 0:
+                oldest = await r.zrange(self.DB_KEY_HEIGHTS, 0, extra - 1)
+                evicted += await self._remove(r, oldest)
+
+        if self.max_bytes > 0:
+            while (excess := int(await r.hget(self.DB_KEY_STATS, 'bytes') or 0) - self.max_bytes) > 0:
+                oldest = await r.zrange(self.DB_KEY_HEIGHTS, 0, self.EVICT_BATCH - 1)
+                if not oldest:
+                    break
+                async with r.pipeline(transaction=False) as pipe:
+                    for key in oldest:
+                        pipe.hstrlen(self.DB_KEY_BLOCK, key)
+                    sizes = await pipe.execute()
+
+                # only as many of the oldest blocks as needed to get under the limit
+                n = 0
+                while n < len(oldest) and excess > 0:
+                    excess -= sizes[n]
+                    n += 1
+                evicted += await self._remove(r, oldest[:n])
+
+        if evicted:
+            self.logger.debug(f'Evicted {evicted} blocks from the cache.')
+        return evicted
+
+    async def reindex(self):
+        """
+        Puts the blocks stored by older versions under the eviction policy and compresses them.
+        """
+        r: Redis = await self.db.get_redis()
+        n = 0
+        async for key, data in r.hscan_iter(self.DB_KEY_BLOCK):
+            if not data.startswith(self.COMPRESSED_PREFIX) or await r.zscore(self.DB_KEY_HEIGHTS, key) is None:
+                await self.put(int(key), self.decode(data))
+                n += 1
+        self.logger.info(f'Reindexed {n} blocks.')
+        return n
+
+    async def stats(self):
+        r: Redis = await self.db.get_redis()
+        stats = await r.hgetall(self.DB_KEY_STATS)
+        return {
+            'blocks': await r.zcard(self.DB_KEY_HEIGHTS),
+            'bytes': int(stats.get('bytes', 0)),
+            'evicted': int(stats.get('evicted', 0)),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+        }
+
+    async def clear(self):
+        r: Redis = await self.db.get_redis()
+        await r.delete(self.DB_KEY_BLOCK, self.DB_KEY_HEIGHTS, self.DB_KEY_TIMES, self.DB_KEY_STATS)
+
+
+class BlockScannerCached(BlockScanner):
+    DB_KEY_BLOCK = BlockRawCache.DB_KEY_BLOCK
+    REPORT_STATS_EVERY = 100
 
     def __init__(self, deps: DepContainer,
                  sleep_period=None, last_block=0,
-                 max_attempts=BlockScanner.MAX_ATTEMPTS_TO_SKIP_BLOCK):
-        super().__init__(deps, sleep_period, last_block, max_attempts)
+                 max_attempts=BlockScanner.MAX_ATTEMPTS_TO_SKIP_BLOCK,
+                 prefetch_window=1,
+                 max_blocks=10_000, max_bytes=0, max_age=3 * DAY):
+        super().__init__(deps, sleep_period, last_block, max_attempts, prefetch_window=prefetch_window)
+        self.cache = BlockRawCache(deps.db, max_blocks=max_blocks, max_bytes=max_bytes, max_age=max_age)
+        self._reindexed = False
 
     async def _fetch_raw_block(self, block_no):
-        cached_data = await self.deps.db.redis.hget(self.DB_KEY_BLOCK, str(block_no))
+        if not self._reindexed:
+            # once at startup: the cache left by an older version is brought under the limits
+            self._reindexed = True
+            await self.cache.reindex()
+
+        cached_data = await self.cache.get(block_no)
         if cached_data:
-            return ujson.loads(cached_data)
+            real_block = cached_data
         else:
             real_block = await super()._fetch_raw_block(block_no)
-            if real_block:
-                await self.deps.db.redis.hset(self.DB_KEY_BLOCK, str(block_no), ujson.dumps(real_block))
-            return real_block
+            # errors like "this block is not produced yet" must not stick in the cache
+            if real_block and not is_block_error(real_block):
+                await self.cache.put(block_no, real_block)
+
+        if (self.cache.hits + self.cache.misses) % self.REPORT_STATS_EVERY == 0:
+            self.logger.info(f'Block cache stats: {await self.cache.stats()}')
+
+        return real_block
@@ -3,7 +3,7 @@ import os
 import sys
 from typing import List
 
-from jobs.scanner.event_db import EventDatabase
+from jobs.scanner.event_db import EventDatabase, TxStatusBatch
 from jobs.scanner.native_scan import BlockResult
 from jobs.scanner.swap_props import SwapProps
 from jobs.scanner.swap_start_detector import SwapStartDetector
@@ -13,7 +13,8 @@ from lib.depcont import DepContainer
 from lib.logs import WithLogger
 from lib.utils import hash_of_string_repr, say
 from models.events import EventOutbound, EventScheduledOutbound, \
-    parse_swap_and_out_event, TypeEventSwapAndOut, EventSwap
+    parse_swap_and_out_event, TypeEventSwapAndOut, EventSwap, PARSEABLE_EVENT_TYPES
+from models.memo import parsed_memo_cache
 from models.tx import ThorAction
 
 
@@ -22,19 +23,24 @@ def _consists_only_zeros(s):
 
 
 class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
+    REPORT_CACHE_STATS_EVERY = 100  # blocks
+
     def __init__(self, deps: DepContainer):
         super().__init__()
         self.deps = deps
         self._swap_detector = SwapStartDetector(deps)
 
         expiration_sec = deps.cfg.as_interval('native_scanner.db.ttl', '3d')
-        self._db = EventDatabase(deps.db, expiration_sec=expiration_sec)
+        hot_cache_size = deps.cfg.as_int('native_scanner.db.hot_cache_size', 10_000)
+        compact = bool(deps.cfg.get('native_scanner.db.compact_records', True))
+        self._db = EventDatabase(deps.db, expiration_sec=expiration_sec, hot_cache_size=hot_cache_size,
+                                 compact=compact)
 
         self._dbg_init()
 
     async def on_data(self, sender, block: BlockResult) -> List[ThorAction]:
-        # Incoming swap intentions will be recorded in the DB
-        new_swaps = await self.register_new_swaps(block)
+        # Incoming swap intentions
+        new_swaps = self._swap_detector.detect_swaps(block)
 
         # Swaps and Outbounds
         interesting_end_block_events = list(self.get_end_block_events_of_interest(block))
@@ -44,33 +50,48 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
 
         # Also get quorum observed outbounds
         outbound_tx_ids, outbound_events = self.detect_observed_quorum_outbounds(block)
+        all_outbounds_tx_ids = end_block_outbounds_tx_ids + outbound_tx_ids
+
+        # All the reads of the block go in one round trip, all the writes go in another one
+        batch = self._db.batch()
+        await batch.load(
+            [swap.tx_id for swap in new_swaps] + all_outbounds_tx_ids +
+            [ev.tx_id for ev in interesting_end_block_events] + [ev.tx_id for ev in outbound_events]
+        )
+
+        # Incoming swap intentions will be recorded in the DB
+        await self.register_new_swaps(batch, new_swaps)
 
         # Write them into the DB
-        await self.register_swap_events(block, interesting_end_block_events)
-        await self.register_swap_events(block, outbound_events)
+        self.register_swap_events(batch, block, interesting_end_block_events)
+        self.register_swap_events(batch, block, outbound_events)
 
         # Extract finished TX from these two sources
-        all_outbounds_tx_ids = end_block_outbounds_tx_ids + outbound_tx_ids
-        txs = await self.handle_finished_swaps(all_outbounds_tx_ids)
+        txs = self.handle_finished_swaps(batch, all_outbounds_tx_ids)
+
+        await batch.commit()
 
         self.dbg_track_swap_id(txs)
 
         if new_swaps or txs:
             self.logger.info(f"New swaps detected {len(new_swaps)} and {len(txs)} passed in block #{block.block_no}")
 
+        if block.block_no % self.REPORT_CACHE_STATS_EVERY == 0:
+            if self._db.cache is not None:
+                self.logger.info(f'Swap state cache: {self._db.cache.stats}')
+            self.logger.info(f'Parsed memo cache: {parsed_memo_cache.stats}')
+
         # Pass them down the pipe
         await self.pass_data_to_listeners(txs)
 
         return txs
 
-    async def register_new_swaps(self, block):
-        swaps = self._swap_detector.detect_swaps(block)
-
+    async def register_new_swaps(self, batch: TxStatusBatch, swaps):
         for swap in swaps:
-            props = await self._db.read_tx_status(swap.tx_id)
+            props = batch.read_tx_status(swap.tx_id)
             if not props or not props.attrs.get('status'):
                 # self.logger.debug(f'Detect new swap: {swap.tx_id} from {swap.from_address} ({swap.memo})')
-                await self._db.write_tx_status_kw(
+                batch.write_tx_status_kw(
                     swap.tx_id,
                     id=swap.tx_id,
                     status=SwapProps.STATUS_OBSERVED_IN,
@@ -101,7 +122,8 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
         short_hash_key = hash_key[:7]
         return f"ev_{event.original.type}_{short_hash_key}"
 
-    async def register_swap_events(self, block: BlockResult, interesting_events: List[TypeEventSwapAndOut]):
+    def register_swap_events(self, batch: TxStatusBatch, block: BlockResult,
+                             interesting_events: List[TypeEventSwapAndOut]):
         for event in interesting_events:
             if not event.tx_id:
                 continue
@@ -111,7 +133,7 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
                 continue
 
             event_ident = self._event_ident(event, block.block_no)
-            await self._db.write_tx_status(event.tx_id, {
+            batch.write_tx_status(event.tx_id, {
                 event_ident: event.original.attrs
             })
 
@@ -119,7 +141,7 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
 
     @staticmethod
     def get_end_block_events_of_interest(block: BlockResult):
-        for ev in block.end_block_events:
+        for ev in block.find_end_block_events(*PARSEABLE_EVENT_TYPES):
             swap_ev = parse_swap_and_out_event(ev)
             if swap_ev:
                 yield swap_ev
@@ -161,13 +183,13 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
                 completed_txs_ids.append(tx.tx_id)
         return completed_txs_ids, events
 
-    async def handle_finished_swaps(self, outbound_tx_id) -> List[ThorAction]:
+    def handle_finished_swaps(self, batch: TxStatusBatch, outbound_tx_id) -> List[ThorAction]:
         """
         Outbound can come from end_block_events or from observed quorum txs.
         """
         results = []
         for tx_id in outbound_tx_id:
-            swap_props = await self._db.read_tx_status(tx_id)
+            swap_props = batch.read_tx_status(tx_id)
             if not swap_props:
                 self.logger.warning(f'There are outbounds for tx {tx_id}, but there is no info about its initiation.')
                 continue
@@ -179,7 +201,7 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
             # Check if the swap is completed and not given away
             if swap_props.is_completed and not given_away:
                 # Update the status to avoid double processing in the future
-                await self._db.write_tx_status_kw(tx_id, status=SwapProps.STATUS_GIVEN_AWAY)
+                batch.write_tx_status_kw(tx_id, status=SwapProps.STATUS_GIVEN_AWAY)
 
                 # Build a ThorAction and put it into the results
                 action = swap_props.build_action()
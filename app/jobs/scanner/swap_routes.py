@@ -120,6 +120,7 @@ class SwapRouteRecorder(WithLogger, INotified):
                 await self.clear_old_events(self.days_to_keep)
 
     async def on_data(self, sender, data: List[ThorAction]):
+        swaps = []
         for tx in data:
             if not tx.meta_swap:
                 continue  # skip non-swap tx
@@ -128,12 +129,19 @@ class SwapRouteRecorder(WithLogger, INotified):
                 self.logger.warning(f"Skip tx {tx.tx_hash} with zero RUNE amount")
                 continue
 
-            if await self._dedup.have_ever_seen_hash(tx.tx_hash):
-                continue
-
-            await self.store_swap_event(tx)
-
-            await self._dedup.mark_as_seen(tx.tx_hash)
+            swaps.append(tx)
+
+        # one round trip to check them all and one to mark the stored ones
+        seen_flags = await self._dedup.batch_ever_seen_hashes([tx.tx_hash for tx in swaps])
+        stored = []
+        try:
+            for tx, seen in zip(swaps, seen_flags):
+                if seen or tx.tx_hash in stored:
+                    continue
+                await self.store_swap_event(tx)
+                stored.append(tx.tx_hash)
+        finally:
+            await self._dedup.mark_as_seen_hashes(stored)
 
         # Sometimes we need to clear old dates
         await self._clear_routes_if_needed()
@@ -29,13 +29,14 @@ class TradeAccEventDecoder(WithLogger, INotified, WithDelegates):
                 all_events[observed_tx.tx_id] = tr_dep_event
 
         # We need to check all transactions in the block for MsgDeposit and plain "sends" with memo
-        for tx in block.txs:
-            for message in tx.messages:
-                if message.type == message.MsgDeposit or message.is_send:
-                    # trade withdraw
-                    tx_events = self._make_withdrawals(message, block.block_no, tx.tx_hash)
-                    for event in tx_events:
-                        all_events[event.tx_hash] = event
+        deposits_and_sends = block.find_messages_by_type(
+            ThorTxMessage.MsgDeposit, ThorTxMessage.MsgSend, ThorTxMessage.MsgSendCosmos
+        )
+        for tx, message in deposits_and_sends:
+            # trade withdraw
+            tx_events = self._make_withdrawals(message, block.block_no, tx.tx_hash)
+            for event in tx_events:
+                all_events[event.tx_hash] = event
 
         # Unique for this block, but may not be unique across the entire blockchain
         unique_events = list(all_events.values())
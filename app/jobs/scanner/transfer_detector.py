@@ -143,7 +143,7 @@ class RuneTransferDetectorTxLogs(WithLogger):
         transfers = []
 
         # Second, add Protocol's Outbounds
-        for ev in r.end_block_events:
+        for ev in r.find_end_block_events('outbound'):
             if t := self._build_transfer_from_event(ev, r.block_no):
                 transfers.append(t)
 
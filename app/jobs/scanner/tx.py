@@ -5,30 +5,65 @@ from jobs.scanner.util import thor_decode_amount_field, pubkey_to_thor_address
 from lib.utils import safe_get
 
 
-class ThorEvent(NamedTuple):
-    attrs: dict
+class ThorEvent:
+    """
+    Block or tx event. Combined "coin"/"amount" fields are decoded into "_amount" and "_asset"
+    only when the attributes are touched for the first time, because most of the events are filtered by type only.
+    Behaves like the former NamedTuple(attrs: dict): same repr, equality and attrs dict.
+    """
+
+    __slots__ = ('_attrs', '_lazy', '_lazy_height')
+
+    def __init__(self, attrs: dict):
+        self._attrs = attrs
+        self._lazy = False
+        self._lazy_height = 0
+
+    @property
+    def attrs(self) -> dict:
+        if self._lazy:
+            self._decode()
+        return self._attrs
 
     def get(self, key, default=None):
-        return self.attrs.get(key, default)
+        # the raw attributes never start with "_", so there is no need to decode them
+        if key.startswith('_'):
+            return self.attrs.get(key, default)
+        return self._attrs.get(key, default)
 
     @staticmethod
     def _decode_combined_value_asset(d, v):
         d['_amount'], d['_asset'] = thor_decode_amount_field(v)
 
-    @classmethod
-    def from_dict(cls, d, height=0):
+    def _decode(self):
+        d = self._attrs
         if coin := d.get('coin'):
-            cls._decode_combined_value_asset(d, coin)
+            self._decode_combined_value_asset(d, coin)
         elif amount := d.get('amount'):
             # if there are any letters in "amount"
             if any(c.isalpha() for c in amount):
-                cls._decode_combined_value_asset(d, amount)
+                self._decode_combined_value_asset(d, amount)
+
+        if self._lazy_height:
+            d['_height'] = int(self._lazy_height)
 
+        self._lazy = False
+
+    @classmethod
+    def from_dict(cls, d, height=0):
         o = cls(d)
-        if height:
-            o.height = height
+        o._lazy = True
+        o._lazy_height = height
         return o
 
+    def __repr__(self):
+        return f'ThorEvent(attrs={self.attrs!r})'
+
+    def __eq__(self, other):
+        if isinstance(other, ThorEvent):
+            return self.attrs == other.attrs
+        return NotImplemented
+
     @property
     def amount(self):
         return self.attrs.get('_amount', 0)
@@ -39,11 +74,13 @@ class ThorEvent(NamedTuple):
 
     @property
     def type(self):
-        return self.attrs.get('type', '')
+        return self._attrs.get('type', '')
 
     @property
     def height(self):
-        return int(self.attrs.get('_height', 0))
+        if self._lazy and self._lazy_height:
+            return int(self._lazy_height)
+        return int(self._attrs.get('_height', 0))
 
     @height.setter
     def height(self, value):
@@ -1,10 +1,21 @@
 import base64
 import hashlib
+import re
+from functools import lru_cache
 
 import bech32
 
+# the same signers and addresses come up in every block
+ADDRESS_CACHE_SIZE = 10_000
+
 
 def parse_thor_address(addr: bytes, prefix='thor') -> str:
+    if isinstance(addr, bytes):
+        return _parse_thor_address_cached(addr, prefix)
+    return _parse_thor_address(addr, prefix)
+
+
+def _parse_thor_address(addr: bytes, prefix='thor') -> str:
     if isinstance(addr, bytes) and addr.startswith(prefix.encode('utf-8')):
         return addr.decode('utf-8')
 
@@ -13,6 +24,9 @@ def parse_thor_address(addr: bytes, prefix='thor') -> str:
     return bech32.bech32_encode(prefix, good_bits)
 
 
+_parse_thor_address_cached = lru_cache(maxsize=ADDRESS_CACHE_SIZE)(_parse_thor_address)
+
+
 def debase64(s: str) -> bytes:
     if not s:
         return b''
@@ -21,6 +35,7 @@ def debase64(s: str) -> bytes:
     return dec
 
 
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
 def pubkey_to_thor_address(pubkey: str, prefix='thor') -> str:
     pubkey = debase64(pubkey)
     s = hashlib.new("sha256", pubkey).digest()
@@ -30,6 +45,27 @@ def pubkey_to_thor_address(pubkey: str, prefix='thor') -> str:
     return bech32.bech32_encode(prefix, five_bit_r)
 
 
+def address_cache_stats():
+    return {
+        'pubkey': pubkey_to_thor_address.cache_info()._asdict(),
+        'raw': _parse_thor_address_cached.cache_info()._asdict(),
+    }
+
+
+_LEADING_DIGITS = re.compile('[0-9]*')
+
+
+def _split_leading_digits(string: str):
+    if string.isascii():
+        # for ASCII str.isdigit() is exactly [0-9]
+        i = _LEADING_DIGITS.match(string).end()
+    else:
+        i = 0
+        while i < len(string) and string[i].isdigit():
+            i += 1
+    return string[:i], string[i:]
+
+
 def thor_decode_amount_field(string: str):
     if ' ' in string:
         # Handle cases with space, e.g. "114731984 rune" or "BSC.BNB-0x33434 900514"
@@ -39,15 +75,7 @@ def thor_decode_amount_field(string: str):
             amt, asset = asset, amt
     else:
         """ e.g. 114731984rune """
-        amt, asset = '', ''
-        still_numbers = True
-        for symbol in string:
-            if not str.isdigit(symbol):
-                still_numbers = False
-            if still_numbers:
-                amt += symbol
-            else:
-                asset += symbol
+        amt, asset = _split_leading_digits(string)
 
     asset = asset.strip().upper()
     if not asset:
@@ -57,6 +85,6 @@ def thor_decode_amount_field(string: str):
 
     try:
         amt = int(amt)
-        return amt, asset.strip().upper()
+        return amt, asset
     except ValueError:
         raise ValueError(f"Unable to parse amount and asset from string: {string!r}")
@@ -1,8 +1,42 @@
 import hashlib
+import json
 import math
+from typing import List, NamedTuple, Optional
+
+from lib.date_utils import now_ts, DAY, HOUR
+
+
+class BloomCapacity(NamedTuple):
+    """
+    How full a filter is and when it is going to exceed its false positive target (see BloomFilter.capacity_report).
+    items are estimated from the bit population; the projection is made of the growth over the recorded samples.
+    """
+    key: str
+    size: int
+    hash_count: int
+    fill_ratio: float
+    items: float
+    false_positive_rate: float
+    target_false_positive_rate: float
+    items_left: float  # until the false positive rate reaches the target
+    items_per_day: Optional[float] = None  # None: not enough samples or no growth
+    breach_ts: Optional[float] = None
+
+    @property
+    def is_breached(self):
+        return self.false_positive_rate >= self.target_false_positive_rate
 
 
 class BloomFilter:
+    """
+    Bloom filter in a Redis bit string. Every operation on an item (add, check, check-and-add) is one BITFIELD
+    command over all its k bits, so it is atomic and takes one round trip. BITFIELD u1 addresses the bits
+    exactly like SETBIT/GETBIT, so the filters written bit by bit stay valid.
+    """
+
+    # whether an item can drop out of the filter by itself
+    forgets_items = False
+
     def __init__(self, redis_instance, redis_key='bloom_filter', capacity=1000000, error_rate=0.001):
         self.capacity = capacity
         self.error_rate = error_rate
@@ -38,25 +72,96 @@ class BloomFilter:
         sha3.update(f"{item}{seed}".encode('utf-8'))
         return sha3.hexdigest()
 
+    def positions(self, item) -> List[int]:
+        """
+        The bit positions of the item.
+        """
+        return [int(self.get_sha3_hash(item, i), 16) % self.size for i in range(self.hash_count)]
+
+    # --- BITFIELD commands, they can be queued into a pipeline as well ---
+
+    OP_ADD = 'add'
+    OP_CONTAINS = 'contains'
+    OP_CHECK_AND_ADD = 'check_and_add'
+
+    def set_command(self, positions, key=None) -> list:
+        args = ['BITFIELD', key or self.redis_key]
+        for position in positions:
+            args += ('SET', 'u1', position, 1)
+        return args
+
+    def get_command(self, positions, key=None) -> list:
+        args = ['BITFIELD', key or self.redis_key]
+        for position in positions:
+            args += ('GET', 'u1', position)
+        return args
+
+    @staticmethod
+    def all_set(reply) -> bool:
+        """
+        For the replies of both commands: SET returns the old values of the bits.
+        """
+        return all(reply)
+
+    def same_positions_as(self, other: 'BloomFilter') -> bool:
+        """
+        The filters hash an item to the same bits, so its positions can be computed once for both.
+        """
+        return type(self).positions is type(other).positions and \
+            (self.size, self.hash_count) == (other.size, other.hash_count)
+
+    def commands(self, op, item, positions=None) -> List[list]:
+        """
+        The Redis commands of the operation on the item. The answer is made of their replies by answer().
+        positions: of the item, if they are known already.
+        """
+        positions = positions if positions is not None else self.positions(item)
+        if op == self.OP_CONTAINS:
+            return [self.get_command(positions)]
+        else:
+            return [self.set_command(positions)]
+
+    def command_count(self, op) -> int:
+        """
+        len(commands(op, ...)), it does not depend on the item.
+        """
+        return 1
+
+    def answer(self, op, replies) -> bool:
+        return self.all_set(replies[0])
+
+    @property
+    def filters(self) -> List['BloomFilter']:
+        return [self]
+
+    async def run(self, op, item) -> bool:
+        commands = self.commands(op, item)
+        if len(commands) == 1:
+            replies = [await self.redis.execute_command(*commands[0])]
+        else:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for command in commands:
+                    pipe.execute_command(*command)
+                replies = await pipe.execute()
+        return self.answer(op, replies)
+
     async def add(self, item):
         """
         Add an item to the Bloom filter.
         """
-        for i in range(self.hash_count):
-            sha3_hash = self.get_sha3_hash(item, i)
-            bit_position = int(sha3_hash, 16) % self.size
-            await self.redis.setbit(self.redis_key, bit_position, 1)
+        await self.run(self.OP_ADD, item)
 
     async def contains(self, item):
         """
         Check if an item is in the Bloom filter.
         """
-        for i in range(self.hash_count):
-            sha3_hash = self.get_sha3_hash(item, i)
-            bit_position = int(sha3_hash, 16) % self.size
-            if not await self.redis.getbit(self.redis_key, bit_position):
-                return False
-        return True
+        return await self.run(self.OP_CONTAINS, item)
+
+    async def check_and_add(self, item):
+        """
+        Adds the item and tells if it was (probably) in the filter before.
+        """
+        return await self.run(self.OP_CHECK_AND_ADD, item)
 
     async def bit_count(self):
         """
@@ -70,6 +175,92 @@ class BloomFilter:
         """
         return await self.redis.strlen(self.redis_key)
 
+    async def fill_ratio(self):
+        """
+        The share of the bits set to 1.
+        """
+        return await self.bit_count() / self.size
+
+    def false_positive_rate_at(self, fill_ratio):
+        return fill_ratio ** self.hash_count
+
+    async def estimated_false_positive_rate(self):
+        """
+        The chance that a new item is reported as seen, given the bits set now.
+        """
+        return self.false_positive_rate_at(await self.fill_ratio())
+
+    # --- capacity ---
+
+    @property
+    def target_false_positive_rate(self):
+        """
+        To compare with false_positive_rate_at(fill_ratio()).
+        """
+        return self.error_rate
+
+    def estimated_items(self, fill_ratio):
+        """
+        The number of the distinct items that sets this share of the bits: n = -(m / k) * ln(1 - X / m).
+        """
+        if fill_ratio >= 1.0:
+            return math.inf
+        return -self.size / self.hash_count * math.log1p(-fill_ratio)
+
+    def fill_ratio_at(self, false_positive_rate):
+        return false_positive_rate ** (1.0 / self.hash_count)
+
+    CAPACITY_SAMPLES = 500
+
+    @property
+    def capacity_samples_key(self):
+        return f'{self.redis_key}:capacity'
+
+    async def capacity_report(self, now=None, record=True, sample_interval=HOUR, lookback=7 * DAY) -> BloomCapacity:
+        """
+        The fill ratio and the estimated number of items come from the bit population (BITCOUNT, O(size)).
+        The growth rate is taken over the samples of the last "lookback" seconds: every call records a sample
+        (the estimated number of items) unless the last one is younger than sample_interval.
+        """
+        now = now or now_ts()
+        fill = await self.fill_ratio()
+        items = self.estimated_items(fill)
+        target = self.target_false_positive_rate
+        items_left = self.estimated_items(self.fill_ratio_at(target)) - items
+
+        samples = [json.loads(sample) for sample in await self.redis.lrange(self.capacity_samples_key, 0, -1)]
+        items_per_day = breach_ts = None
+        if baseline := [sample for sample in samples if sample['ts'] >= now - lookback]:
+            oldest = baseline[-1]  # LPUSH: the newest one goes first
+            elapsed = now - oldest['ts']
+            if elapsed > 0 and items > oldest['items']:
+                items_per_day = (items - oldest['items']) / elapsed * DAY
+                breach_ts = now + max(0.0, items_left) / items_per_day * DAY
+        if items_left <= 0:
+            breach_ts = now
+
+        if record and not math.isinf(items) and (not samples or samples[0]['ts'] <= now - sample_interval):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.lpush(self.capacity_samples_key, json.dumps({'ts': now, 'items': items}))
+                pipe.ltrim(self.capacity_samples_key, 0, self.CAPACITY_SAMPLES - 1)
+                await pipe.execute()
+
+        return BloomCapacity(
+            key=self.redis_key,
+            size=self.size,
+            hash_count=self.hash_count,
+            fill_ratio=fill,
+            items=items,
+            false_positive_rate=self.false_positive_rate_at(fill),
+            target_false_positive_rate=target,
+            items_left=items_left,
+            items_per_day=items_per_day,
+            breach_ts=breach_ts,
+        )
+
+    async def clear(self):
+        await self.redis.delete(self.redis_key)
+
     def __str__(self):
         """
         Return a string representation of the Bloom filter.
@@ -97,12 +288,185 @@ class BloomFilterV2(BloomFilter):
         for i in range(self.hash_count):
             yield (h1 + i * h2) % self.size
 
-    async def add(self, item):
-        for position in self._hashes(item):
-            await self.redis.setbit(self.redis_key, position, 1)
+    def positions(self, item) -> List[int]:
+        return list(self._hashes(item))
 
-    async def contains(self, item):
-        for position in self._hashes(item):
-            if not await self.redis.getbit(self.redis_key, position):
-                return False
-        return True
+
+class RotatingBloomFilter(BloomFilter):
+    """
+    Bloom filter that forgets: the items are added to the generation of the current time period,
+    and an item is in the filter if any of the last "generations" generations has it.
+    Every generation is a separate key that expires when it leaves the window, so the memory is fixed
+    and the filter never saturates as long as one period does not bring more than capacity / generations items.
+    The generations share the size and the bit positions; each one gets error_rate / generations,
+    so the whole window keeps the error rate.
+    """
+
+    forgets_items = True
+
+    def __init__(self, redis_instance, redis_key='bloom_filter', capacity=1000000, error_rate=0.001,
+                 generations=4, period=7 * DAY):
+        assert generations >= 1 and period > 0
+        super().__init__(redis_instance, redis_key, max(1, capacity // generations), error_rate / generations)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.generations = generations
+        self.period = period
+
+    def generation_no(self, now=None):
+        return int((now or now_ts()) // self.period)
+
+    def generation_key(self, generation_no):
+        return f'{self.redis_key}:g{generation_no}'
+
+    def live_keys(self, now=None) -> List[str]:
+        """
+        The keys of the live generations, the current one goes first.
+        """
+        current = self.generation_no(now)
+        return [self.generation_key(g) for g in range(current, current - self.generations, -1)]
+
+    def commands(self, op, item, positions=None, now=None) -> List[list]:
+        positions = positions if positions is not None else self.positions(item)
+        current = self.generation_no(now)
+        current_key = self.generation_key(current)
+        older_keys = self.live_keys(now)[1:]
+        if op == self.OP_CONTAINS:
+            return [self.get_command(positions, key) for key in [current_key] + older_keys]
+
+        commands = [self.set_command(positions, current_key)]
+        if op == self.OP_CHECK_AND_ADD:
+            commands += [self.get_command(positions, key) for key in older_keys]
+        # the generation expires when it leaves the window
+        commands.append(['EXPIREAT', current_key, int((current + self.generations) * self.period)])
+        return commands
+
+    def command_count(self, op) -> int:
+        if op == self.OP_CONTAINS:
+            return self.generations
+        elif op == self.OP_CHECK_AND_ADD:
+            return self.generations + 1
+        return 2
+
+    def answer(self, op, replies) -> bool:
+        if op == self.OP_CONTAINS:
+            return any(self.all_set(reply) for reply in replies)
+        elif op == self.OP_CHECK_AND_ADD:
+            return any(self.all_set(reply) for reply in replies[:-1])
+        return False
+
+    async def _for_live_keys(self, command):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.live_keys():
+                getattr(pipe, command)(key)
+            return await pipe.execute()
+
+    async def bit_count(self):
+        return sum(await self._for_live_keys('bitcount'))
+
+    async def get_length(self):
+        return sum(await self._for_live_keys('strlen'))
+
+    async def fill_ratios(self) -> List[float]:
+        """
+        The fill ratio of every live generation, the current one goes first.
+        """
+        return [bits / self.size for bits in await self._for_live_keys('bitcount')]
+
+    async def fill_ratio(self):
+        """
+        Of the fullest generation.
+        """
+        return max(await self.fill_ratios())
+
+    async def estimated_false_positive_rate(self):
+        """
+        An item is a false positive if any generation reports it.
+        """
+        # 1 - prod(1 - p), without losing the tiny rates to rounding
+        return -math.expm1(sum(math.log1p(-self.false_positive_rate_at(fill)) for fill in await self.fill_ratios()))
+
+    @property
+    def target_false_positive_rate(self):
+        """
+        Of one generation, the capacity reports are of the fullest one.
+        """
+        return self.error_rate / self.generations
+
+    async def clear(self):
+        await self.redis.delete(*self.live_keys())
+
+    def __str__(self):
+        return (f"RotatingBloomFilter(key='{self.redis_key}', generations={self.generations}, "
+                f"period={self.period}, size={self.size}, hash_count={self.hash_count})")
+
+
+class MigratingBloomFilter(BloomFilter):
+    """
+    Two filters during the move to another one (bigger, other error rate, rotating):
+    every item is written to both, and it is in the filter if either of them has it.
+    Once the new one has seen everything that may come again, the old one can be dropped without a cold start.
+    It is the old filter for everything else (positions, size, stats).
+    """
+
+    def __init__(self, old: BloomFilter, new: BloomFilter):
+        # not super().__init__: the shape of a rotating filter is not the one of its capacity and error rate
+        self.capacity = old.capacity
+        self.error_rate = old.error_rate
+        self.size = old.size
+        self.hash_count = old.hash_count
+        self.redis = old.redis
+        self.redis_key = old.redis_key
+        self.old = old
+        self.new = new
+        self.forgets_items = old.forgets_items or new.forgets_items
+
+    def positions(self, item) -> List[int]:
+        return self.old.positions(item)
+
+    def same_positions_as(self, other: 'BloomFilter') -> bool:
+        return False
+
+    @property
+    def filters(self) -> List['BloomFilter']:
+        return [self.old, self.new]
+
+    def commands(self, op, item, positions=None) -> List[list]:
+        return self.old.commands(op, item, positions=positions) + self.new.commands(op, item)
+
+    def command_count(self, op) -> int:
+        return self.old.command_count(op) + self.new.command_count(op)
+
+    def answer(self, op, replies) -> bool:
+        n = self.old.command_count(op)
+        return self.old.answer(op, replies[:n]) or self.new.answer(op, replies[n:])
+
+    async def bit_count(self):
+        return await self.old.bit_count()
+
+    async def get_length(self):
+        return await self.old.get_length()
+
+    async def fill_ratio(self):
+        return await self.old.fill_ratio()
+
+    @property
+    def target_false_positive_rate(self):
+        return self.old.target_false_positive_rate
+
+    @property
+    def capacity_samples_key(self):
+        return self.old.capacity_samples_key
+
+    async def estimated_false_positive_rate(self):
+        # either of them
+        return -math.expm1(sum([
+            math.log1p(-await bf.estimated_false_positive_rate()) for bf in self.filters
+        ]))
+
+    async def clear(self):
+        for bf in self.filters:
+            await bf.clear()
+
+    def __str__(self):
+        return f"MigratingBloomFilter(old={self.old}, new={self.new})"
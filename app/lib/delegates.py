@@ -1,6 +1,12 @@
+import asyncio
+import contextvars
 import logging
 import time
 from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional, Callable
+
+from lib.timings import pipeline_timings
 
 
 class INotified(ABC):
@@ -11,18 +17,200 @@ class INotified(ABC):
         ...
 
 
+class DispatchOverflow:
+    BLOCK = 'block'  # the sender waits until there is room in the queue
+    DROP_OLDEST = 'drop_oldest'  # the oldest queued item is thrown away
+    COALESCE = 'coalesce'  # the new item is merged into the newest queued one (lists only, the others BLOCK)
+
+    ALL = (BLOCK, DROP_OLDEST, COALESCE)
+
+
+def coalesce_data(old, new):
+    """
+    The merged payload, or None if the two cannot be merged without losing one of them.
+    """
+    if isinstance(old, list) and isinstance(new, list):
+        return old + new
+    return None
+
+
+class QueuedDelegate(INotified):
+    """
+    Wraps a listener with its own bounded queue and worker task, so a slow listener does not hold the sender.
+    Items are delivered to the wrapped listener in the order they were sent.
+    """
+
+    def __init__(self, delegate: INotified, max_size=100, overflow=DispatchOverflow.BLOCK,
+                 coalesce_fn: Optional[Callable] = None):
+        if overflow not in DispatchOverflow.ALL:
+            raise ValueError(f'Unknown overflow policy: {overflow!r}')
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+
+        self.delegate = delegate
+        self.max_size = max_size
+        self.overflow = overflow
+        self.coalesce_fn = coalesce_fn or coalesce_data
+
+        self._items = deque()  # (sender, data, enqueue time)
+        self._has_items = asyncio.Event()
+        self._has_room = asyncio.Event()
+        self._has_room.set()
+        self._worker: Optional[asyncio.Task] = None
+        self._current_item_ts = 0.0
+
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_processing_time = 0.0
+
+    def __str__(self):
+        return str(self.delegate)
+
+    def __repr__(self):
+        return f'QueuedDelegate({self.delegate!r}, queued={len(self._items)}, overflow={self.overflow})'
+
+    @property
+    def queue_length(self):
+        return len(self._items)
+
+    @property
+    def lag_seconds(self):
+        """
+        How long the oldest item that is not processed yet has been waiting (including the one being processed).
+        """
+        oldest_ts = self._current_item_ts or (self._items[0][2] if self._items else 0.0)
+        return time.monotonic() - oldest_ts if oldest_ts else 0.0
+
+    @property
+    def stats(self):
+        return {
+            'queue_length': self.queue_length,
+            'lag_sec': self.lag_seconds,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'last_processing_time': self.last_processing_time,
+        }
+
+    def _ensure_worker(self):
+        if not self._worker or self._worker.done():
+            # a clean context: the hop timing and alike of the dispatch that happens to start it are not its
+            self._worker = asyncio.create_task(self._work(), context=contextvars.Context())
+
+    async def on_data(self, sender, data):
+        self._ensure_worker()
+
+        now = time.monotonic()
+        if len(self._items) >= self.max_size:
+            if self.overflow == DispatchOverflow.DROP_OLDEST:
+                self._items.popleft()
+                self.dropped += 1
+            elif (self.overflow == DispatchOverflow.COALESCE and
+                  (merged := self.coalesce_fn(self._items[-1][1], data)) is not None):
+                _, _, now = self._items.pop()  # keeps the older timestamp for the lag
+                data = merged
+                self.coalesced += 1
+            else:
+                # BLOCK, and COALESCE of the payloads that cannot be merged
+                while len(self._items) >= self.max_size:
+                    self._has_room.clear()
+                    await self._has_room.wait()
+
+        self._items.append((sender, data, now))
+        self._has_items.set()
+
+    async def on_error(self, sender, e):
+        await self.delegate.on_error(sender, e)
+
+    async def _work(self):
+        while True:
+            if not self._items:
+                self._has_items.clear()
+                await self._has_items.wait()
+                continue
+
+            sender, data, self._current_item_ts = self._items.popleft()
+            self._has_room.set()
+
+            t0 = time.monotonic()
+            try:
+                await self.delegate.on_data(sender, data)
+            except Exception as e:
+                self.errors += 1
+                logging.exception(f"{self.delegate}: {e!r}")
+            finally:
+                self.last_processing_time = time.monotonic() - t0
+                self.processed += 1
+                self._current_item_ts = 0.0
+
+    async def join(self):
+        """
+        Waits until everything queued so far is processed.
+        """
+        while self._items or self._current_item_ts:
+            await asyncio.sleep(0.01)
+
+    def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+
+
+def unwrap_delegate(delegate, stop_at=None):
+    """
+    Looks through the wrappers (queues, checkpoints...) down to the actual listener or to the stop_at class.
+    """
+    while isinstance(getattr(delegate, 'delegate', None), INotified):
+        if stop_at and isinstance(delegate, stop_at):
+            break
+        delegate = delegate.delegate
+    return delegate
+
+
+def stage_name(delegate):
+    queued = isinstance(delegate, QueuedDelegate)
+    name = unwrap_delegate(delegate).__class__.__name__
+    return f'{name}(queued)' if queued else name
+
+
 class WithDelegates:
+    _dispatch_queue_size = 0  # 0 = listeners are awaited one after another
+    _dispatch_overflow = DispatchOverflow.BLOCK
+
     def __init__(self):
         super().__init__()
         self.delegates = []  # list for fixed order
 
+    def use_dispatch_queues(self, max_size=100, overflow=DispatchOverflow.BLOCK):
+        """
+        Opt-in: the subscribers added after this call get their own queue and worker (see QueuedDelegate).
+        """
+        self._dispatch_queue_size = max_size
+        self._dispatch_overflow = overflow
+        return self
+
     def add_subscriber(self, delegate: INotified):
         if not delegate:
             raise ValueError("Delegate is None")
-        if delegate not in self.delegates:
+        if delegate not in self.delegates and delegate not in self.subscribers:
+            if self._dispatch_queue_size > 0 and not isinstance(delegate, QueuedDelegate):
+                delegate = QueuedDelegate(delegate, self._dispatch_queue_size, self._dispatch_overflow)
             self.delegates.append(delegate)
         return self
 
+    @property
+    def subscribers(self):
+        return [unwrap_delegate(d) for d in self.delegates]
+
+    @property
+    def dispatch_stats(self):
+        return {
+            str(d): d.stats for d in self.delegates if isinstance(d, QueuedDelegate)
+        }
+
     async def handle_error(self, e, sender=None):
         sender = sender or self
         for delegate in self.delegates:
@@ -37,12 +225,14 @@ class WithDelegates:
 
         for delegate in self.delegates:
             delegate: INotified
-            t0 = time.monotonic()
+            hop = pipeline_timings.enter_hop()
+            t0 = time.perf_counter()
             try:
                 await delegate.on_data(sender, data)
             except Exception as e:
                 logging.exception(f"{e!r}")
-            t1 = time.monotonic()
-            summary[str(delegate)] = t1 - t0
+            elapsed = time.perf_counter() - t0
+            pipeline_timings.leave_hop(stage_name(delegate), hop, elapsed)
+            summary[str(delegate)] = elapsed
 
         return summary
@@ -0,0 +1,151 @@
+import codecs
+import json
+from typing import Any, Callable, Collection, Optional
+
+
+class JsonObjectStream:
+    """
+    Incremental decoder for a JSON object that arrives in chunks.
+    The elements of the arrays under "stream_keys" are decoded one by one as soon as their bytes arrive and
+    handed to on_item(key, item); they are not kept here. All other top-level values go to "result".
+    So neither the full text nor the full tree is ever held in memory at once.
+    """
+
+    MIN_RETRY_SIZE = 4096  # an incomplete value is re-parsed only after the pending text doubles (and at least this)
+    COMPACT_SIZE = 1 << 16
+
+    _S_START, _S_KEY, _S_COLON, _S_VALUE, _S_AFTER_VALUE, _S_ITEM, _S_AFTER_ITEM, _S_DONE = range(8)
+
+    def __init__(self, stream_keys: Collection[str], on_item: Callable[[str, Any], None]):
+        self.stream_keys = set(stream_keys)
+        self.on_item = on_item
+        self.result = {}
+        self.items_decoded = 0
+
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._state = self._S_START
+        self._key: Optional[str] = None
+        self._retry_at = 0
+
+    @property
+    def is_done(self):
+        return self._state == self._S_DONE
+
+    def feed(self, chunk: bytes):
+        text = self._text_decoder.decode(chunk)
+        if not text:
+            return
+        if self._pos >= self.COMPACT_SIZE or self._pos * 2 >= len(self._buf):
+            self._buf = self._buf[self._pos:]
+            self._retry_at -= self._pos
+            self._pos = 0
+        self._buf += text
+        if len(self._buf) >= self._retry_at:
+            self._parse(final=False)
+
+    def close(self) -> dict:
+        self._buf += self._text_decoder.decode(b'', final=True)
+        self._retry_at = 0
+        self._parse(final=True)
+        if not self.is_done:
+            raise json.JSONDecodeError('Unexpected end of JSON object', self._buf, len(self._buf))
+        return self.result
+
+    def _skip_ws(self):
+        buf, pos, n = self._buf, self._pos, len(self._buf)
+        while pos < n and buf[pos] in ' \t\r\n':
+            pos += 1
+        self._pos = pos
+        return buf[pos] if pos < n else ''
+
+    def _expect(self, c, char):
+        if c != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', self._buf, self._pos)
+        self._pos += 1
+
+    def _decode_value(self, final):
+        """
+        Returns (True, value) or (False, None) if the value is not complete yet.
+        """
+        try:
+            value, end = self._json.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            pending = len(self._buf) - self._pos
+            self._retry_at = len(self._buf) + max(pending, self.MIN_RETRY_SIZE)
+            return False, None
+
+        if end >= len(self._buf) and not final:
+            # a number might continue in the next chunk
+            return False, None
+
+        self._pos = end
+        return True, value
+
+    def _parse(self, final):
+        while self._state != self._S_DONE:
+            c = self._skip_ws()
+            if not c:
+                return
+
+            state = self._state
+            if state == self._S_START:
+                self._expect(c, '{')
+                self._state = self._S_KEY
+            elif state == self._S_KEY:
+                if c == '}':
+                    self._pos += 1
+                    self._state = self._S_DONE
+                    continue
+                ok, key = self._decode_value(final)
+                if not ok:
+                    return
+                if not isinstance(key, str):
+                    raise json.JSONDecodeError('Expecting property name', self._buf, self._pos)
+                self._key = key
+                self._state = self._S_COLON
+            elif state == self._S_COLON:
+                self._expect(c, ':')
+                self._state = self._S_VALUE
+            elif state == self._S_VALUE:
+                if c == '[' and self._key in self.stream_keys:
+                    self._pos += 1
+                    self.result.setdefault(self._key, [])
+                    self._state = self._S_ITEM
+                    continue
+                ok, value = self._decode_value(final)
+                if not ok:
+                    return
+                self.result[self._key] = value
+                self._state = self._S_AFTER_VALUE
+            elif state == self._S_AFTER_VALUE:
+                self._pos += 1
+                if c == ',':
+                    self._state = self._S_KEY
+                elif c == '}':
+                    self._state = self._S_DONE
+                else:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", self._buf, self._pos - 1)
+            elif state == self._S_ITEM:
+                if c == ']':
+                    self._pos += 1
+                    self._state = self._S_AFTER_VALUE
+                    continue
+                ok, item = self._decode_value(final)
+                if not ok:
+                    return
+                self.items_decoded += 1
+                self.on_item(self._key, item)
+                self._state = self._S_AFTER_ITEM
+            elif state == self._S_AFTER_ITEM:
+                self._pos += 1
+                if c == ',':
+                    self._state = self._S_ITEM
+                elif c == ']':
+                    self._state = self._S_AFTER_VALUE
+                else:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", self._buf, self._pos - 1)
@@ -70,6 +70,19 @@ class WindowAverage:
         return median(self._values) if self._values else None
 
 
+def percentile_of_sorted(values, p):
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))] if values else None
+
+
+class WindowPercentiles(WindowAverage):
+    def percentile(self, p):
+        return self.percentiles(p)[0]
+
+    def percentiles(self, *ps):
+        values = sorted(self._values)
+        return [percentile_of_sorted(values, p) for p in ps]
+
+
 class RPSCounter:
     def __init__(self, window_size=60, max_requests=10_000):
         self.requests = deque()  # Use a deque to store request timestamps
@@ -1,4 +1,5 @@
 import re
+from bisect import bisect_left
 from typing import List
 from unicodedata import lookup
 from urllib.parse import urlparse
@@ -222,6 +223,62 @@ def fuzzy_search(query: str, realm, f=str.upper) -> List[str]:
     return variants
 
 
+class FuzzySearchIndex:
+    """
+    The same results as fuzzy_search(query, realm, f) for a fixed realm, without a scan per query.
+    The substrings are found by a binary search over the sorted suffixes of all names,
+    the "PREFIX-SUFFIX" form by a binary search over the sorted names. The results are ordered like the realm.
+    """
+
+    MAX_MEMO = 4096
+
+    def __init__(self, realm, f=str.upper):
+        self.f = f
+        self.names = list(dict.fromkeys(realm))
+        self.name_set = set(self.names)
+        self._order = {name: i for i, name in enumerate(self.names)}
+        self._sorted_names = sorted(self.names)
+        suffixes = sorted((name[i:], name) for name in self.names for i in range(len(name)))
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_owners = [name for _, name in suffixes]
+        self._memo = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _starting_with(keys: List[str], prefix: str, values: List[str]):
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            yield values[i]
+            i += 1
+
+    def _search(self, query: str) -> List[str]:
+        # noinspection PyArgumentList
+        query = self.f(query) if self.f else query
+        if query in self.name_set:  # perfect match
+            return [query]
+
+        variants = set(self._starting_with(self._suffixes, query, self._suffix_owners))
+        query_comp = query.split('-', 2)
+        if len(query_comp) >= 2:
+            # So ETH.USDT-EC7 matches ETH.USDT-0XDAC17F958D2EE523A2206206994597C13D831EC7
+            variants.update(
+                name for name in self._starting_with(self._sorted_names, query_comp[0], self._sorted_names)
+                if name.endswith(query_comp[1])
+            )
+        return sorted(variants, key=self._order.__getitem__)
+
+    def search(self, query: str) -> List[str]:
+        if not query:
+            return []
+        if (variants := self._memo.get(query)) is None:
+            if len(self._memo) >= self.MAX_MEMO:
+                self._memo.clear()
+            variants = self._memo[query] = tuple(self._search(query))
+        return list(variants)
+
+
 def safe_sum(*args):
     return sum((int(arg) for arg in args), 0)
 
@@ -0,0 +1,162 @@
+import time
+from collections import deque, defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from lib.lru import WindowPercentiles
+
+# time spent in the nested hops of the hop that is running now (a one-item list, so it can be added to)
+_current_hop: ContextVar[Optional[list]] = ContextVar('current_hop', default=None)
+# per-stage self time of the block that is being dispatched now
+_current_block: ContextVar[Optional['BlockTrace']] = ContextVar('current_block', default=None)
+
+
+class StageStats:
+    def __init__(self, window):
+        self.total = WindowPercentiles(window)  # including the nested listeners
+        self.self_time = WindowPercentiles(window)  # excluding them
+        self.calls = 0
+        self.total_self_time = 0.0
+
+    def add(self, total, self_time):
+        self.total.append(total)
+        self.self_time.append(self_time)
+        self.calls += 1
+        self.total_self_time += self_time
+
+    @property
+    def summary(self):
+        p50, p90, p99 = self.self_time.percentiles(50, 90, 99)
+        return {
+            'calls': self.calls,
+            'self_p50': p50,
+            'self_p90': p90,
+            'self_p99': p99,
+            'total_p99': self.total.percentile(99),
+            'max': self.total.max,
+            'self_sum': self.total_self_time,
+        }
+
+
+class BlockTrace:
+    def __init__(self, height):
+        self.height = height
+        self.stages = defaultdict(float)  # stage -> self time
+        self.total = 0.0
+
+    def top(self, n=3):
+        return sorted(self.stages.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    def __repr__(self):
+        top = ', '.join(f'{name} {t * 1e3:.0f} ms' for name, t in self.top())
+        return f'Block #{self.height}: {self.total * 1e3:.0f} ms ({top})'
+
+
+class PipelineTimings:
+    """
+    Always-on timing of the delegate hops (see WithDelegates.pass_data_to_listeners) with rolling percentiles
+    per stage and per block, and a log of the slowest blocks.
+    """
+
+    BLOCK = 'block'
+
+    def __init__(self, window=1000, slow_blocks_to_keep=20):
+        self.window = window
+        self.stages = defaultdict(lambda: StageStats(self.window))
+        self.blocks = StageStats(window)
+        self.slow_blocks = deque(maxlen=slow_blocks_to_keep)
+
+    def record(self, stage, total, self_time=None):
+        self_time = total if self_time is None else self_time
+        self.stages[stage].add(total, self_time)
+        if (trace := _current_block.get()) is not None:
+            trace.stages[stage] += self_time
+
+    # --- hops ---
+
+    @staticmethod
+    def enter_hop():
+        frame = [0.0]
+        return frame, _current_hop.set(frame)
+
+    def leave_hop(self, stage, frame_and_token, elapsed):
+        frame, token = frame_and_token
+        _current_hop.reset(token)
+        if (parent := _current_hop.get()) is not None:
+            parent[0] += elapsed
+        self.record(stage, elapsed, max(0.0, elapsed - frame[0]))
+
+    @staticmethod
+    def detach():
+        """
+        For a worker task that outlives the hop it was started from: its time must not go to that hop or block.
+        """
+        _current_hop.set(None)
+        _current_block.set(None)
+
+    # --- blocks ---
+
+    @staticmethod
+    def begin_block(height):
+        trace = BlockTrace(height)
+        return trace, _current_block.set(trace)
+
+    def end_block(self, trace_and_token, total, slow_threshold=0.0) -> BlockTrace:
+        trace, token = trace_and_token
+        _current_block.reset(token)
+        trace.total = total
+        self.blocks.add(total, total)
+        if slow_threshold and total >= slow_threshold:
+            self.slow_blocks.append(trace)
+        return trace
+
+    @property
+    def summary(self):
+        return {
+            self.BLOCK: self.blocks.summary,
+            **{
+                name: stats.summary
+                for name, stats in sorted(self.stages.items(), key=lambda kv: kv[1].total_self_time, reverse=True)
+            }
+        }
+
+    def report(self, top=10):
+        def ms(x):
+            return f'{x * 1e3:.1f}' if x is not None else '-'
+
+        lines = []
+        for name, st in list(self.summary.items())[:top + 1]:
+            lines.append(f"{name}: {st['calls']} calls, self p50/p90/p99 = "
+                         f"{ms(st['self_p50'])}/{ms(st['self_p90'])}/{ms(st['self_p99'])} ms, "
+                         f"total p99 = {ms(st['total_p99'])} ms")
+        return '\n'.join(lines)
+
+    def reset(self, window=None):
+        self.window = window or self.window
+        self.stages.clear()
+        self.blocks = StageStats(self.window)
+        self.slow_blocks.clear()
+
+
+pipeline_timings = PipelineTimings()
+
+
+def measure_hop(stage):
+    """
+    Times a stage that is not a delegate hop (e.g. fetching a block): "with measure_hop('fetch'): ...".
+    """
+    return _HopTimer(stage)
+
+
+class _HopTimer:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self._frame = pipeline_timings.enter_hop()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.elapsed = time.perf_counter() - self._t0
+        pipeline_timings.leave_hop(self.stage, self._frame, self.elapsed)
@@ -46,9 +46,10 @@ from jobs.user_counter import UserCounterMiddleware
 from jobs.volume_filler import VolumeFillerUpdater
 from jobs.volume_recorder import VolumeRecorder, TxCountRecorder
 from lib.config import Config, SubConfig
-from lib.constants import HTTP_CLIENT_ID
+from lib.constants import HTTP_CLIENT_ID, THOR_BLOCK_TIME
 from lib.date_utils import parse_timespan_to_seconds
 from lib.db import DB
+from lib.delegates import DispatchOverflow
 from lib.depcont import DepContainer
 from lib.emergency import EmergencyReport
 from lib.logs import WithLogger, setup_logs_from_config
@@ -62,6 +63,7 @@ from models.node_watchers import AlertWatchers
 from notify.alert_presenter import AlertPresenter
 from notify.broadcast import Broadcaster
 from notify.channel import BoardMessage
+from notify.dup_stop import MultiTxDeduplicator, dedup_stats_flusher, DedupCapacityMonitor
 from notify.personal.balance import PersonalBalanceNotifier
 from notify.personal.bond_provider import PersonalBondProviderNotifier
 from notify.personal.personal_main import NodeChangePersonalNotifier
@@ -93,7 +95,8 @@ from notify.public.stats_notify import NetworkStatsNotifier
 from notify.public.supply_notify import SupplyNotifier
 from notify.public.trade_acc_notify import TradeAccTransactionNotifier, TradeAccSummaryNotifier
 from notify.public.transfer_notify import RuneMoveNotifier
-from notify.public.tx_notify import GenericTxNotifier, LiquidityTxNotifier, SwapTxNotifier, RefundTxNotifier
+from notify.public.tx_notify import GenericTxNotifier, LiquidityTxNotifier, SwapTxNotifier, RefundTxNotifier, \
+    DB_KEY_TX_ANNOUNCED_HASHES
 from notify.public.version_notify import VersionNotifier
 from notify.public.voting_notify import VotingNotifier
 
@@ -283,7 +286,24 @@ class App(WithLogger):
         if d.cfg.get('native_scanner.enabled', True):
             # The block scanner itself
             max_attempts = d.cfg.as_int('native_scanner.max_attempts_per_block', 5)
-            d.block_scanner = BlockScanner(d, max_attempts=max_attempts)
+            d.block_scanner = BlockScanner(
+                d, max_attempts=max_attempts,
+                prefetch_window=d.cfg.as_int('native_scanner.prefetch.max_window', 8),
+                prefetch_target_latency=d.cfg.as_float('native_scanner.prefetch.target_latency', 2.0),
+                adaptive_polling=bool(d.cfg.get('native_scanner.adaptive_polling', True)),
+                streaming_decode=bool(d.cfg.get('native_scanner.streaming_decode', False)),
+                slow_block_threshold=d.cfg.as_float('native_scanner.slow_block_sec', THOR_BLOCK_TIME),
+            )
+            if d.cfg.get('native_scanner.dispatch.queued', False):
+                d.block_scanner.use_dispatch_queues(
+                    max_size=d.cfg.as_int('native_scanner.dispatch.queue_size', 100),
+                    overflow=d.cfg.as_str('native_scanner.dispatch.overflow', DispatchOverflow.BLOCK),
+                )
+            if d.cfg.get('native_scanner.checkpoints.enabled', False):
+                d.block_scanner.use_checkpoints(
+                    buffer_size=d.cfg.as_int('native_scanner.checkpoints.buffer_size', 200),
+                    max_catch_up_blocks=d.cfg.as_int('native_scanner.checkpoints.max_catch_up_blocks', 600),
+                )
             tasks.append(d.block_scanner)
             reserve_address = d.cfg.as_str('native_scanner.reserve_address')
 
@@ -333,18 +353,24 @@ class App(WithLogger):
             volume_filler = VolumeFillerUpdater(d)
             aggregator.add_subscriber(volume_filler)
 
+            # the dedup checks and marks of its subscribers, one Redis round trip per batch for all of them
+            tx_dedups = MultiTxDeduplicator(d.db, [
+                'VolumeRecorder', 'TxCount', 'route:seen_tx', DB_KEY_TX_ANNOUNCED_HASHES,
+            ])
+            volume_filler.add_subscriber(tx_dedups)
+
             d.dex_analytics = DexAnalyticsCollector(d)
             volume_filler.add_subscriber(d.dex_analytics)
 
             d.volume_recorder = VolumeRecorder(d)
-            volume_filler.add_subscriber(d.volume_recorder)
+            tx_dedups.add_subscriber(d.volume_recorder)
 
             d.tx_count_recorder = TxCountRecorder(d)
-            volume_filler.add_subscriber(d.tx_count_recorder)
+            tx_dedups.add_subscriber(d.tx_count_recorder)
 
             # Swap route recorder
             d.route_recorder = SwapRouteRecorder(d.db)
-            volume_filler.add_subscriber(d.route_recorder)
+            tx_dedups.add_subscriber(d.route_recorder)
 
             if achievements_enabled:
                 volume_filler.add_subscriber(achievements)
@@ -359,19 +385,19 @@ class App(WithLogger):
 
             if d.cfg.tx.liquidity.get('enabled', True):
                 self.liquidity_notifier_tx = LiquidityTxNotifier(d, d.cfg.tx.liquidity, curve=curve)
-                volume_filler.add_subscriber(self.liquidity_notifier_tx)
+                tx_dedups.add_subscriber(self.liquidity_notifier_tx)
                 self.liquidity_notifier_tx.add_subscriber(d.alert_presenter)
 
             if d.cfg.tx.donate.get('enabled', True):
                 self.donate_notifier_tx = GenericTxNotifier(d, d.cfg.tx.donate, tx_types=(ActionType.DONATE,),
                                                             curve=curve)
 
-                volume_filler.add_subscriber(self.donate_notifier_tx)
+                tx_dedups.add_subscriber(self.donate_notifier_tx)
                 self.donate_notifier_tx.add_subscriber(d.alert_presenter)
 
             if d.cfg.tx.swap.get('enabled', True):
                 self.swap_notifier_tx = SwapTxNotifier(d, d.cfg.tx.swap, curve=curve)
-                volume_filler.add_subscriber(self.swap_notifier_tx)
+                tx_dedups.add_subscriber(self.swap_notifier_tx)
                 self.swap_notifier_tx.add_subscriber(d.alert_presenter)
 
                 if d.cfg.tx.swap.also_trigger_when.streaming_swap.get('notify_start', True):
@@ -382,7 +408,7 @@ class App(WithLogger):
             if d.cfg.tx.refund.get('enabled', True):
                 self.refund_notifier_tx = RefundTxNotifier(d, d.cfg.tx.refund, curve=curve)
 
-                volume_filler.add_subscriber(self.refund_notifier_tx)
+                tx_dedups.add_subscriber(self.refund_notifier_tx)
                 self.refund_notifier_tx.add_subscriber(d.alert_presenter)
 
             if d.cfg.tx.loans.get('enabled', True):
@@ -699,6 +725,15 @@ class App(WithLogger):
         try:
             # noinspection PyAsyncCall
             asyncio.create_task(self.deps.data_controller.run_save_job(self.deps.db))
+            # noinspection PyAsyncCall
+            asyncio.create_task(dedup_stats_flusher.run_flush_job(
+                self.deps.cfg.as_interval('tx.dedup.stats_flush_interval', '1m')))
+            # noinspection PyAsyncCall
+            asyncio.create_task(
+                DedupCapacityMonitor(
+                    warn_before=self.deps.cfg.as_interval('tx.dedup.capacity_warn_before', '30d'),
+                ).run_check_job(self.deps.cfg.as_interval('tx.dedup.capacity_check_interval', '6h'))
+            )
 
             tasks = await self._prepare_task_graph()
             await self._preloading()
@@ -739,6 +774,11 @@ class App(WithLogger):
         self._bg_task = asyncio.create_task(self._run_background_jobs())
 
     async def on_shutdown(self, _):
+        try:
+            await dedup_stats_flusher.flush()
+        except Exception as e:
+            self.logger.exception(f'Failed to flush the dedup stats: {e!r}')
+
         if self.deps.session:
             await self.deps.session.close()
 
@@ -3,7 +3,7 @@ from collections import defaultdict
 from copy import copy
 from dataclasses import dataclass
 from enum import Enum
-from typing import Iterable, Union
+from typing import Iterable, Union, NamedTuple, Dict
 
 from lib.constants import RUNE_DENOM, Chains, NATIVE_RUNE_SYMBOL
 
@@ -120,13 +120,111 @@ _DELIMITER_TABLE = {
 
 
 def is_trade_asset(asset: str):
-    return AssetKind.recognize(asset) == AssetKind.TRADE
+    return parse_asset(asset).kind == AssetKind.TRADE
 
 
 def normalize_asset(asset: str):
-    kind = AssetKind.recognize(asset)
-    asset = asset.replace(kind.delimiter, Delimiter.NATIVE, 1).strip()
-    return asset
+    return parse_asset(asset).normalized
+
+
+class ParsedAsset(NamedTuple):
+    """
+    Immutable result of parsing an asset string. Get it from parse_asset(), so every distinct string is parsed once.
+    """
+    original: str
+    kind: AssetKind  # by the first delimiter, like AssetKind.recognize
+    chain: str
+    name: str
+    tag: str
+    is_synth: bool
+    is_virtual: bool
+    is_trade: bool
+    is_secured: bool
+    normalized: str  # the kind delimiter replaced with '.', the case is as is (see normalize_asset)
+    canonical: str  # like str(Asset)
+    native_pool_name: str
+
+    @property
+    def symbol(self):
+        return f'{self.name}-{self.tag}' if self.tag else self.name
+
+    def to_asset(self) -> 'Asset':
+        return Asset(self.chain, self.name, self.tag, self.is_synth, self.is_virtual, self.is_trade,
+                     is_secured=self.is_secured)
+
+    @classmethod
+    def parse(cls, asset: str) -> 'ParsedAsset':
+        kind = AssetKind.recognize(asset)
+        normalized = asset.replace(kind.delimiter, Delimiter.NATIVE, 1).strip()
+        if asset == RUNE_DENOM:
+            return cls(asset, kind, AssetRUNE.chain, AssetRUNE.name, AssetRUNE.tag, False, False, False, False,
+                       normalized, AssetRUNE.to_canonical, AssetRUNE.native_pool_name)
+        try:
+            chain, name_and_tag = asset.split(kind.delimiter, maxsplit=1)
+            name, tag = Asset.get_name_tag(name_and_tag)
+            chain, name, tag = chain.upper(), name.upper(), tag.upper()
+            is_virtual = chain == 'THOR' and name != 'RUNE'
+        except ValueError:
+            # not enough values to unpack. It's a string like "ETH" or "BTC"
+            gas_asset = Asset.gas_asset_from_chain(asset.upper())
+            chain, name, tag, is_virtual = gas_asset.chain, gas_asset.name, '', False
+
+        # the same construction as Asset.from_string used to do, __post_init__ included
+        a = Asset(chain, name, tag, kind == AssetKind.SYNTH, is_virtual, kind == AssetKind.TRADE,
+                  is_secured=kind == AssetKind.SECURED)
+        return cls(asset, kind, a.chain, a.name, a.tag, a.is_synth, a.is_virtual, a.is_trade, a.is_secured,
+                   normalized, a.to_canonical, a.native_pool_name)
+
+
+class AssetInternTable:
+    """
+    Bounded table of the parsed asset strings. The distinct assets are few, but the strings come from the chain,
+    so when it is full the oldest entries go first. Hits cost one dict lookup.
+    """
+
+    def __init__(self, max_size=20_000):
+        self.max_size = max_size
+        self._entries: Dict[str, ParsedAsset] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def get(self, asset: str) -> ParsedAsset:
+        parsed = self._entries.get(asset)
+        if parsed is not None:
+            self.hits += 1
+            return parsed
+
+        self.misses += 1
+        parsed = ParsedAsset.parse(asset)
+        if len(self._entries) >= self.max_size:
+            del self._entries[next(iter(self._entries))]
+        self._entries[asset] = parsed
+        return parsed
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+asset_intern_table = AssetInternTable()
+
+
+def parse_asset(asset: str) -> ParsedAsset:
+    return asset_intern_table.get(asset)
 
 
 @dataclass
@@ -182,28 +280,9 @@ class Asset:
         if asset == RUNE_DENOM:
             return copy(AssetRUNE)
 
-        is_synth, is_trade, is_secured = False, False, False
-        kind = AssetKind.recognize(asset)
-        match kind:
-            case AssetKind.SYNTH:
-                is_synth = True
-            case AssetKind.TRADE:
-                is_trade = True
-            case AssetKind.SECURED:
-                is_secured = True
-
-        try:
-            separator = kind.delimiter
-            chain, name_and_tag = asset.split(separator, maxsplit=1)
-            name, tag = cls.get_name_tag(name_and_tag)
-            chain = str(chain).upper()
-            name = str(name).upper()
-            tag = str(tag).upper()
-            is_virtual = chain == 'THOR' and name != 'RUNE'
-            return cls(chain, name, tag, is_synth, is_virtual, is_trade, is_secured=is_secured)
-        except ValueError:
-            # not enough values to unpack. It's a string like "ETH" or "BTC"
-            return cls.gas_asset_from_chain(str(asset).upper())
+        # a new object every time: the callers may change it
+        p = parse_asset(asset)
+        return cls(p.chain, p.name, p.tag, p.is_synth, p.is_virtual, p.is_trade, is_secured=p.is_secured)
 
     PILL = '💊'
     TRADE = '🔄'
@@ -278,6 +357,8 @@ class Asset:
 
     @classmethod
     def to_L1_pool_name(cls, asset: str):
+        if isinstance(asset, str):
+            return parse_asset(asset).native_pool_name
         return cls.from_string(asset).native_pool_name
 
     @property
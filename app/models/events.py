@@ -338,6 +338,12 @@ class EventTradeAccountWithdraw(NamedTuple):
         return thor_to_float(self.amount)
 
 
+PARSEABLE_EVENT_TYPES = (
+    'swap', 'streaming_swap', 'outbound', 'scheduled_outbound',
+    'loan_open', 'loan_repayment', 'trade_account_deposit', 'trade_account_withdraw',
+)
+
+
 def parse_swap_and_out_event(e: ThorEvent):
     if e.type == 'swap':
         return EventSwap.from_event(e)
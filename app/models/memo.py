@@ -1,7 +1,8 @@
 """
 See: https://dev.thorchain.org/thorchain-dev/concepts/memos
 """
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 from enum import Enum
 from typing import Union, NamedTuple, Optional, List
 
@@ -143,6 +144,63 @@ class Affiliate(NamedTuple):
     fee_bp: int
 
 
+class ParsedMemoCache:
+    """
+    Process-wide LRU of parsed memos by the memo string. The same memos are parsed by several stages
+    of the block pipeline, often more than once per tx. It keeps the originals, callers get copies.
+    The unknown memos are kept too (as None).
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_size=20_000):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, Optional['THORMemo']] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+        }
+
+    def get(self, memo: str):
+        parsed = self._entries.get(memo, self.MISSING)
+        if parsed is self.MISSING:
+            self.misses += 1
+        else:
+            self._entries.move_to_end(memo)
+            self.hits += 1
+        return parsed
+
+    def put(self, memo: str, parsed: Optional['THORMemo']):
+        if self.max_size <= 0:
+            return
+        self._entries[memo] = parsed
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+parsed_memo_cache = ParsedMemoCache()
+
+
 @dataclass
 class THORMemo:
     action: ActionType
@@ -241,6 +299,26 @@ class THORMemo:
 
     @classmethod
     def parse_memo(cls, memo: str, no_raise=False):
+        """
+        The results are memoized by the memo string (see parsed_memo_cache); every call gets its own copy.
+        """
+        parsed = parsed_memo_cache.get(memo)
+        if parsed is ParsedMemoCache.MISSING:
+            parsed = cls._parse_memo(memo)
+            parsed_memo_cache.put(memo, parsed)
+        if parsed is not None:
+            parsed = parsed.copy()
+
+        if parsed is None and not no_raise:
+            action = cls.ith_or_default(memo.split('|', maxsplit=2)[0].split(':'), 0, '').lower()
+            raise NotImplementedError(f"Not able to parse memo '{memo}' for {action} yet")
+        return parsed
+
+    def copy(self) -> 'THORMemo':
+        return replace(self, affiliates=list(self.affiliates) if self.affiliates is not None else None)
+
+    @classmethod
+    def _parse_memo(cls, memo: str) -> Optional['THORMemo']:
         gist, *_comment = memo.split('|', maxsplit=2)  # ignore comments
 
         components = [it for it in gist.split(':')]
@@ -398,10 +476,7 @@ class THORMemo:
 
         else:
             # todo: limit order, register memo, etc.
-            if no_raise:
-                return None
-            else:
-                raise NotImplementedError(f"Not able to parse memo '{memo}' for {action} yet")
+            return None
 
     @property
     def _fee_or_empty(self):
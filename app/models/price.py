@@ -8,7 +8,7 @@ from lib.constants import BTC_SYMBOL, STABLE_COIN_POOLS, thor_to_float, RUNE_IDE
 from lib.date_utils import now_ts, DAY, HOUR, YEAR
 from lib.delegates import INotified
 from lib.money import weighted_mean
-from lib.texts import fuzzy_search
+from lib.texts import FuzzySearchIndex
 from models.asset import Asset, is_rune, normalize_asset, AssetKind
 from .base import BaseModelMixin
 from .circ_supply import RuneCirculatingSupply
@@ -162,6 +162,8 @@ class LastPriceHolder(INotified):
         self.usd_per_rune = 1.0  # weighted across multiple stable coin pools
         self.btc_per_rune = 0.000001
         self.pool_info_map: PoolInfoMap = {}
+        self._pool_index: Optional[FuzzySearchIndex] = None
+        self._pool_index_source: Optional[PoolInfoMap] = None
         self.last_update_ts = 0
         self.stable_coins = list(stable_coins or STABLE_COIN_POOLS)
         self.market_info = RuneMarketInfo()
@@ -249,11 +251,26 @@ class LastPriceHolder(INotified):
             tlv += thor_to_float(pool.balance_rune)
         return tlv * 2.0
 
+    @property
+    def pool_index(self) -> FuzzySearchIndex:
+        """
+        Fuzzy search index of the pool names. It is rebuilt only when the set of pools changes,
+        not on every price update. Changes of pool_info_map in place are caught only if the pool count changes.
+        """
+        pool_map = self.pool_info_map
+        index = self._pool_index
+        if index is None or len(index) != len(pool_map) or (
+                self._pool_index_source is not pool_map and not index.name_set.issuperset(pool_map.keys())
+        ):
+            self._pool_index = FuzzySearchIndex(pool_map.keys())
+        self._pool_index_source = pool_map
+        return self._pool_index
+
     def pool_fuzzy_search(self, query: str, restore_type=False) -> List[str]:
         if (q := query.lower()) in Asset.SHORT_NAMES:
             # See: https://dev.thorchain.org/thorchain-dev/concepts/memos#shortened-asset-names
             return [Asset.SHORT_NAMES[q]]
-        results = fuzzy_search(query, self.pool_names)
+        results = self.pool_index.search(query)
         if restore_type:
             results = [AssetKind.restore_asset_type(query, r) for r in results]
         return results
@@ -1,20 +1,177 @@
 import asyncio
-from typing import List
+import json
+import weakref
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import List, Optional, Set, Dict, Iterable, Union
 
 from redis import Redis
+from redis.exceptions import WatchError
 
-from lib.bloom_filt import BloomFilter
+from lib.bloom_filt import BloomFilter, RotatingBloomFilter, MigratingBloomFilter, BloomCapacity
 from lib.cooldown import Cooldown
+from lib.date_utils import DAY, HOUR, MINUTE, now_ts
 from lib.db import DB
+from lib.delegates import INotified, WithDelegates
 from lib.logs import WithLogger
 from models.tx import ThorAction
 
 BLOOM_TX_CAPACITY = 100_000_000
 BLOOM_TX_ERROR_RATE = 0.005
 
+DEDUP_FRONT_CACHE_SIZE = 20_000
+DEDUP_STATS_FLUSH_INTERVAL = MINUTE
+DEDUP_LAYOUT_REFRESH_INTERVAL = MINUTE
+
+
+class DedupFrontCache:
+    """
+    In-process answers of a bloom filter for the recently checked and marked tx ids (LRU, bounded by size).
+    "Seen" is final for a bloom filter, so the positive answers live long. A negative answer turns stale
+    as soon as anyone marks the id, so it lives briefly: the marks of this process update the cache
+    (it is shared by all the deduplicators of the key, see front_cache_for), only the other processes
+    can make it wrong, for up to negative_ttl seconds.
+    """
+
+    def __init__(self, max_size=DEDUP_FRONT_CACHE_SIZE, positive_ttl=DAY, negative_ttl=60):
+        self.max_size = max_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[str, tuple] = OrderedDict()  # tx_id -> (seen, expires at)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+        }
+
+    def get(self, tx_id, positive_only=False, now=None) -> Optional[bool]:
+        """
+        True/False if the answer is known, None if Redis must be asked.
+        positive_only: a negative answer is of no use (the caller is going to mark the id anyway).
+        """
+        entry = self._entries.get(tx_id)
+        if entry is not None:
+            seen, expires_at = entry
+            if expires_at <= (now or now_ts()):
+                del self._entries[tx_id]
+            elif seen or not positive_only:
+                self._entries.move_to_end(tx_id)
+                self.hits += 1
+                return seen
+        self.misses += 1
+
+    def put(self, tx_id, seen: bool, now=None):
+        if self.max_size <= 0:
+            return
+        ttl = self.positive_ttl if seen else self.negative_ttl
+        self._entries[tx_id] = (seen, (now or now_ts()) + ttl)
+        self._entries.move_to_end(tx_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# the marks made while a MultiTxDeduplicator dispatches a batch: filter key -> tx ids (see MultiTxDeduplicator.on_data)
+_deferred_marks: ContextVar[Optional[Dict[str, List[str]]]] = ContextVar('deferred_dedup_marks', default=None)
+
+# DB -> {bloom filter key -> DedupFrontCache}
+# (keyed by the DB, not by its Redis connection: the deduplicators are made before the DB is connected)
+_front_caches = weakref.WeakKeyDictionary()
+
+
+def front_cache_for(db, key, **kwargs) -> DedupFrontCache:
+    """
+    The deduplicators of the same key share the cache, so a mark made by one is seen by the others.
+    """
+    caches = _front_caches.setdefault(db, {})
+    if key not in caches:
+        caches[key] = DedupFrontCache(**kwargs)
+    return caches[key]
+
+
+class DedupStatsFlusher(WithLogger):
+    """
+    The deduplicators count their requests in memory; this writes the counters of all of them to Redis
+    in one round trip, every flush_interval seconds (run_flush_job) and at shutdown (flush).
+    Along with the counters it writes last_flush_ts and flush_interval_sec to the stats hashes:
+    the readers see how stale the counters are, and a crash loses at most the counts made since last_flush_ts.
+    """
+
+    def __init__(self, flush_interval=DEDUP_STATS_FLUSH_INTERVAL):
+        super().__init__()
+        self.flush_interval = flush_interval
+        self._dedups = weakref.WeakSet()
+
+    def register(self, dedup: 'TxDeduplicator'):
+        self._dedups.add(dedup)
+
+    @property
+    def deduplicators(self) -> List['TxDeduplicator']:
+        return list(self._dedups)
+
+    async def flush(self, now=None):
+        dedups = [dedup for dedup in list(self._dedups) if dedup.has_pending_stats]
+        if not dedups:
+            return
+
+        now = now or now_ts()
+        # the deduplicators may use different Redis connections (tests do)
+        by_redis = {}
+        for dedup in dedups:
+            by_redis.setdefault(id(dedup.db.redis), []).append((dedup, dedup._take_pending_stats()))
+        try:
+            for group in by_redis.values():
+                async with group[0][0].db.redis.pipeline(transaction=False) as pipe:
+                    for dedup, stats in group:
+                        dedup._queue_stats(pipe, stats, self.flush_interval, now)
+                    await pipe.execute()
+                group.clear()
+        except Exception:
+            # keep the counts that did not make it for the next time
+            for group in by_redis.values():
+                for dedup, stats in group:
+                    dedup._pending_stats.update(stats)
+            raise
+
+    async def run_flush_job(self, flush_interval=None):
+        if flush_interval:
+            self.flush_interval = flush_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.logger.exception(f'Error while flushing the dedup stats: {e!r}')
+
+
+dedup_stats_flusher = DedupStatsFlusher()
+
 
 class TxDeduplicator(WithLogger):
-    def __init__(self, db: DB, key, capacity=BLOOM_TX_CAPACITY, error_rate=BLOOM_TX_ERROR_RATE):
+    def __init__(self, db: DB, key, capacity=BLOOM_TX_CAPACITY, error_rate=BLOOM_TX_ERROR_RATE,
+                 window_generations=0, window_period=7 * DAY, front_cache_size=DEDUP_FRONT_CACHE_SIZE):
+        """
+        window_generations > 0 makes a time-windowed filter (RotatingBloomFilter): it remembers the txs
+        of the last window_generations * window_period seconds; capacity is the number of txs in this window.
+        It uses other keys than the plain filter with the same key.
+        front_cache_size > 0 puts a DedupFrontCache in front of the filter.
+        """
         super().__init__()
         self.db = db
 
@@ -23,24 +180,225 @@ class TxDeduplicator(WithLogger):
         assert key and isinstance(key, str)
 
         full_key = f'tx:dedup_v2:{key}'
+        self._full_key = full_key
         self._stats_key = f'tx:dedup_v2:{key}:stats'
-        self._bf = BloomFilter(self.db.redis, full_key, capacity, error_rate)
+
+        # the filter of the layout in Redis if there is one (see start_migration), else this one
+        self._default_params = {
+            'key': full_key, 'capacity': capacity, 'error_rate': error_rate,
+            'generations': window_generations, 'period': window_period,
+        }
+        self._layout: Optional[dict] = None
+        self._layout_checked_ts = 0.0
+        self._bf = self._make_filter(self._default_params)
+
+        # an item of a rotating filter drops out of the window at some point
+        self.front_cache = front_cache_for(
+            self.db, full_key,
+            max_size=front_cache_size,
+            positive_ttl=min(HOUR, window_period) if window_generations > 0 else DAY,
+        ) if front_cache_size > 0 else None
+
+        # the request counters are written by dedup_stats_flusher
+        self._pending_stats = Counter()
+        dedup_stats_flusher.register(self)
         self.logger.info(
-            f'Initialized with key={key}, capacity={capacity}, error_rate={error_rate}. Size is {self._bf.size} bits')
+            f'Initialized with key={key}, capacity={capacity}, error_rate={error_rate}. '
+            f'Size is {self._bf.size} bits' +
+            (f' x {window_generations} generations of {window_period} sec' if window_generations > 0 else ''))
+
+    # --- layout: the filter can be replaced online ---
+
+    def _make_filter(self, params: dict) -> BloomFilter:
+        if params.get('generations', 0) > 0:
+            return RotatingBloomFilter(self.db.redis, params['key'], params['capacity'], params['error_rate'],
+                                       generations=params['generations'], period=params['period'])
+        return BloomFilter(self.db.redis, params['key'], params['capacity'], params['error_rate'])
+
+    def _filter_of_layout(self, layout: Optional[dict], now) -> BloomFilter:
+        if not layout:
+            return self._make_filter(self._default_params)
+        if not layout.get('next'):
+            return self._make_filter(layout['current'])
+        if now >= layout['until_ts']:
+            # the new filter has seen everything of the transition window, the old one is not needed
+            return self._make_filter(layout['next'])
+        return MigratingBloomFilter(self._make_filter(layout['current']), self._make_filter(layout['next']))
+
+    @property
+    def layout_key(self):
+        return f'{self._full_key}:layout'
+
+    async def refresh_layout(self, force=False, now=None):
+        """
+        Picks up the migrations started by other processes, at most once per DEDUP_LAYOUT_REFRESH_INTERVAL.
+        """
+        now = now or now_ts()
+        if not force and now < self._layout_checked_ts + DEDUP_LAYOUT_REFRESH_INTERVAL:
+            return
+        self._layout_checked_ts = now
+        raw = await self.db.redis.get(self.layout_key)
+        self._layout = json.loads(raw) if raw else None
+        bf = self._filter_of_layout(self._layout, now)
+        if str(bf) != str(self._bf):
+            self.logger.warning(f'{self._full_key}: {self._bf} -> {bf}')
+        self._bf = bf
+
+    async def _change_layout(self, change) -> dict:
+        """
+        Read-modify-write of the layout in a MULTI/EXEC transaction that WATCHes it, so of two operators
+        making conflicting changes at once the second one fails. change(layout or None) -> new layout,
+        or raises ValueError.
+        """
+        async with self.db.redis.pipeline(transaction=True) as tx:
+            await tx.watch(self.layout_key)
+            raw = await tx.get(self.layout_key)
+            layout = change(json.loads(raw) if raw else None)
+            tx.multi()
+            tx.set(self.layout_key, json.dumps(layout))
+            try:
+                await tx.execute()
+            except WatchError:
+                raise ValueError(f'{self._full_key}: the layout has been changed meanwhile, try again')
+        return layout
+
+    def _migration_in_progress(self, layout: Optional[dict]) -> dict:
+        if not layout or not layout.get('next'):
+            raise ValueError(f'{self._full_key}: no migration in progress')
+        return layout
+
+    async def start_migration(self, capacity, error_rate, transition_sec, generations=0, period=7 * DAY, now=None):
+        """
+        Starts to fill a new filter with these parameters: for transition_sec seconds every tx is written
+        to both filters and a tx is seen if either has it, then only the new one is used.
+        The transition must be longer than the age of the txs that can come again, or they are announced again.
+        The other processes write only the old filter until they refresh the layout, so the transition
+        is counted from DEDUP_LAYOUT_REFRESH_INTERVAL after the start (started_ts).
+        Call finish_migration() after it to drop the old filter.
+        """
+        assert capacity > 10
+        assert 0.0001 < error_rate < 0.1
+        assert transition_sec > 0
+
+        now = now or now_ts()
+
+        def change(layout):
+            layout = layout or {'version': 1, 'current': self._default_params, 'next': None}
+            if layout.get('next'):
+                raise ValueError(f'{self._full_key}: a migration is in progress already')
+            version = layout['version'] + 1
+            started_ts = now + DEDUP_LAYOUT_REFRESH_INTERVAL
+            return {
+                **layout,
+                'version': version,
+                'next': {
+                    'key': f'{self._full_key}:v{version}', 'capacity': capacity, 'error_rate': error_rate,
+                    'generations': generations, 'period': period,
+                },
+                'started_ts': started_ts,
+                'until_ts': started_ts + transition_sec,
+            }
+
+        layout = await self._change_layout(change)
+        await self.refresh_layout(force=True, now=now)
+        return layout
+
+    async def finish_migration(self, force=False, now=None):
+        """
+        Makes the new filter the only one and deletes the old one.
+        """
+        now = now or now_ts()
+        old_layout = {}
+
+        def change(layout):
+            old_layout.update(self._migration_in_progress(layout))
+            if now < layout['until_ts'] and not force:
+                raise ValueError(f'{self._full_key}: the transition lasts till {layout["until_ts"]}')
+            return {'version': layout['version'], 'current': layout['next'], 'next': None}
+
+        await self._change_layout(change)
+        await self._make_filter(old_layout['current']).clear()
+        await self.refresh_layout(force=True, now=now)
+
+    async def abort_migration(self, force=False, now=None):
+        """
+        Goes back to the old filter alone and deletes the new one.
+        After the transition only the new filter gets the marks, so aborting then loses them
+        (and the txs are announced again): it is refused unless forced, finish_migration() is what to do.
+        """
+        now = now or now_ts()
+        old_layout = {}
+
+        def change(layout):
+            old_layout.update(self._migration_in_progress(layout))
+            if now >= layout['until_ts'] and not force:
+                raise ValueError(f'{self._full_key}: the transition is over, '
+                                 f'the marks made since then are only in the new filter')
+            return {'version': layout['version'], 'current': layout['current'], 'next': None}
+
+        await self._change_layout(change)
+        await self._make_filter(old_layout['next']).clear()
+        await self.refresh_layout(force=True, now=now)
+
+    @property
+    def migration(self) -> Optional[dict]:
+        """
+        The layout if a migration is in progress (as of the last refresh_layout).
+        """
+        return self._layout if self._layout and self._layout.get('next') else None
+
+    async def capacity_reports(self, record=True, now=None) -> List[BloomCapacity]:
+        """
+        For every filter in use: both of them during a migration.
+        """
+        await self.refresh_layout(now=now)
+        return [await bf.capacity_report(now=now, record=record) for bf in self._bf.filters]
+
+    STATS_COUNTERS = ('total_requests', 'positive_requests', 'write_requests')
 
     async def load_stats(self):
+        """
+        The counters in Redis plus the ones of this instance that are not flushed yet.
+        The counters of other processes are up to flush_interval_sec behind (see DedupStatsFlusher),
+        and a crash loses at most the counts made since last_flush_ts.
+        """
         r: Redis = self.db.redis
         stats = await r.hgetall(self._stats_key)
         return {
-            'total_requests': int(stats.get('total_requests', 0)),
-            'positive_requests': int(stats.get('positive_requests', 0)),
-            'write_requests': int(stats.get('write_requests', 0)),
+            **{name: int(stats.get(name, 0)) + self._pending_stats[name] for name in self.STATS_COUNTERS},
+            'last_flush_ts': float(stats.get('last_flush_ts', 0)),
+            'flush_interval_sec': float(stats.get('flush_interval_sec', 0)),
         }
 
+    @property
+    def has_pending_stats(self):
+        return any(self._pending_stats.values())
+
+    def _take_pending_stats(self) -> Counter:
+        stats, self._pending_stats = self._pending_stats, Counter()
+        return stats
+
+    def _queue_stats(self, pipe, stats: Counter, flush_interval, now):
+        for name, value in stats.items():
+            if value:
+                pipe.hincrby(self._stats_key, name, value)
+        # the staleness and the bound of the loss on a crash, for the readers of the stats
+        pipe.hset(self._stats_key, mapping={'last_flush_ts': now, 'flush_interval_sec': flush_interval})
+
     async def bit_count(self):
+        await self.refresh_layout()
         return await self._bf.bit_count()
 
+    async def fill_ratio(self):
+        await self.refresh_layout()
+        return await self._bf.fill_ratio()
+
+    async def estimated_false_positive_rate(self):
+        await self.refresh_layout()
+        return await self._bf.estimated_false_positive_rate()
+
     async def length(self):
+        await self.refresh_layout()
         return await self._bf.get_length()
 
     @property
@@ -49,7 +407,7 @@ class TxDeduplicator(WithLogger):
 
     @property
     def key(self):
-        return self._bf.redis_key
+        return self._full_key
 
     def __repr__(self):
         return f'<TxDeduplicator key={self.key}, size={self._bf.size}, hashes={self._bf.hash_count}>'
@@ -57,14 +415,25 @@ class TxDeduplicator(WithLogger):
     async def mark_as_seen(self, tx_id):
         if not tx_id:
             return
-        await self._bf.add(tx_id)
-
-        await self.db.redis.hincrby(self._stats_key, 'write_requests', 1)
+        await self.mark_as_seen_hashes([tx_id])
+
+    async def mark_as_seen_hashes(self, tx_ids: List[str]):
+        """
+        Marks all the tx ids in one round trip, or, inside the dispatch of a MultiTxDeduplicator that has this key,
+        along with the marks of its other namespaces when the dispatch ends. The front cache has them meanwhile.
+        """
+        deferred = _deferred_marks.get()
+        if deferred is not None and self.key in deferred and self.front_cache is not None:
+            tx_ids = [tx_id for tx_id in tx_ids if tx_id]
+            self._pending_stats['write_requests'] += len(tx_ids)
+            for tx_id in tx_ids:
+                self.front_cache.put(tx_id, True)
+            deferred[self.key].extend(tx_ids)
+            return
+        await self._run_batch(tx_ids, BloomFilter.OP_ADD)
 
     async def mark_as_seen_txs(self, txs: List[ThorAction]):
-        for tx in txs:
-            if tx and tx.tx_hash:
-                await self.mark_as_seen(tx.tx_hash)
+        await self.mark_as_seen_hashes([tx.tx_hash for tx in txs if tx])
 
     async def forget(self, tx_id):
         raise NotImplementedError
@@ -77,16 +446,101 @@ class TxDeduplicator(WithLogger):
     async def have_ever_seen_hash(self, tx_id):
         if not tx_id:
             return True
-
-        r = await self._bf.contains(tx_id)
-        await self.db.redis.hincrby(self._stats_key, 'total_requests', 1)
-        if r:
-            await self.db.redis.hincrby(self._stats_key, 'positive_requests', 1)
-
-        return r
-
-    async def batch_ever_seen_hashes(self, txs: List[str]):
-        return await asyncio.gather(*[self.have_ever_seen_hash(tx_hash) for tx_hash in txs])
+        return (await self.batch_ever_seen_hashes([tx_id]))[0]
+
+    def _cached_answer(self, tx_id, op) -> Optional[bool]:
+        if self.front_cache is None:
+            return None
+        if op == BloomFilter.OP_CONTAINS:
+            return self.front_cache.get(tx_id)
+        # a rotating filter re-adds a seen item to the current generation, so it has to go to Redis
+        return None if self._bf.forgets_items else self.front_cache.get(tx_id, positive_only=True)
+
+    def _start_batch(self, tx_ids: List[str], op, count_stats=True, use_cache=True) -> List[Optional[bool]]:
+        """
+        Counts the requests and answers what it can from the front cache. None = ask Redis.
+        tx_ids must be non-empty. count_stats=False: a lookup on behalf of someone else (a prefetch),
+        who counts the request when it makes it. use_cache=False: all go to Redis (the deferred marks,
+        which are in the front cache already).
+        """
+        answers = [self._cached_answer(tx_id, op) if use_cache else None for tx_id in tx_ids]
+        if count_stats:
+            if op != BloomFilter.OP_CONTAINS:
+                self._pending_stats['write_requests'] += len(tx_ids)
+            if op != BloomFilter.OP_ADD:
+                self._pending_stats['total_requests'] += len(tx_ids)
+                self._pending_stats['positive_requests'] += sum(1 for seen in answers if seen)
+        return answers
+
+    def _queue_batch(self, pipe, tx_ids: List[str], op, positions: Optional[dict] = None) -> List[int]:
+        """
+        Queues the filter commands of the tx ids (one BITFIELD per tx id for the plain filter).
+        Returns the number of replies of each tx id.
+        """
+        reply_counts = []
+        for tx_id in tx_ids:
+            commands = self._bf.commands(op, tx_id, positions=positions.get(tx_id) if positions else None)
+            for command in commands:
+                pipe.execute_command(*command)
+            reply_counts.append(len(commands))
+        return reply_counts
+
+    def _finish_batch(self, tx_ids: List[str], op, answers: List[Optional[bool]], reply_counts, replies,
+                      count_stats=True) -> List[bool]:
+        """
+        Fills the gaps in the answers with the replies (from _queue_batch) and updates the front cache.
+        """
+        redis_answers, start = [], 0
+        for n in reply_counts:
+            redis_answers.append(self._bf.answer(op, replies[start:start + n]))
+            start += n
+
+        redis_answers_it = iter(redis_answers)
+        answers = [next(redis_answers_it) if seen is None else seen for seen in answers]
+
+        if count_stats and op != BloomFilter.OP_ADD:
+            self._pending_stats['positive_requests'] += sum(redis_answers)
+        if self.front_cache is not None:
+            for tx_id, seen in zip(tx_ids, answers):
+                self.front_cache.put(tx_id, seen or op != BloomFilter.OP_CONTAINS)
+        return answers
+
+    async def _run_batch(self, tx_ids: List[str], op) -> List[bool]:
+        """
+        The filter commands of the tx ids and the stats, all in one round trip.
+        The ids answered by the front cache are not sent, and if all are, there is no round trip at all.
+        The request counters are written later by dedup_stats_flusher (load_stats counts them in).
+        Empty tx ids are "seen", like in have_ever_seen_hash.
+        """
+        to_ask = [tx_id for tx_id in tx_ids if tx_id]
+        if not to_ask:
+            return [True] * len(tx_ids)
+
+        await self.refresh_layout()
+        answers = self._start_batch(to_ask, op)
+        if from_redis := [tx_id for tx_id, seen in zip(to_ask, answers) if seen is None]:
+            async with self.db.redis.pipeline(transaction=False) as pipe:
+                reply_counts = self._queue_batch(pipe, from_redis, op)
+                replies = await pipe.execute()
+        else:
+            reply_counts, replies = [], []
+        answers = self._finish_batch(to_ask, op, answers, reply_counts, replies)
+
+        answers_it = iter(answers)
+        return [next(answers_it) if tx_id else True for tx_id in tx_ids]
+
+    async def batch_ever_seen_hashes(self, txs: List[str]) -> List[bool]:
+        return await self._run_batch(txs, BloomFilter.OP_CONTAINS)
+
+    async def batch_check_and_mark_hashes(self, txs: List[str]) -> List[bool]:
+        """
+        Tells which tx ids have been seen before and marks them all, atomically for each tx id.
+        A repeated tx id is "seen" the second time.
+        """
+        return await self._run_batch(txs, BloomFilter.OP_CHECK_AND_ADD)
+
+    async def batch_ever_seen_txs(self, txs: List[ThorAction]) -> List[bool]:
+        return await self.batch_ever_seen_hashes([(tx.tx_hash if tx else '') for tx in txs])
 
     async def only_hashes_having_certain_flag(self, txs: List[str], desired_flag) -> List[str]:
         flags = await self.batch_ever_seen_hashes(txs)
@@ -119,8 +573,47 @@ class TxDeduplicator(WithLogger):
         return await self.only_txs_having_certain_flag(txs, True)
 
     async def clear(self):
-        r: Redis = self.db.redis
-        await r.delete(self.key)
+        await self.refresh_layout()
+        await self._bf.clear()
+        if self.front_cache is not None:
+            self.front_cache.clear()
+
+
+class DedupCapacityMonitor(WithLogger):
+    """
+    Checks the fill of the filters of all the deduplicators of the process (see TxDeduplicator.capacity_reports)
+    and warns if the false positive target is exceeded or is going to be within warn_before seconds.
+    The fix is a bigger filter: tools/dedup_capacity.py migrate.
+    """
+
+    def __init__(self, warn_before=30 * DAY):
+        super().__init__()
+        self.warn_before = warn_before
+
+    async def check(self, dedups: Iterable[TxDeduplicator], now=None) -> Dict[str, List[BloomCapacity]]:
+        now = now or now_ts()
+        by_key = {dedup.key: dedup for dedup in dedups}
+        results = {}
+        for key, dedup in by_key.items():
+            results[key] = reports = await dedup.capacity_reports(now=now)
+            for report in reports:
+                if report.is_breached:
+                    self.logger.error(
+                        f'{report.key}: false positive rate {report.false_positive_rate:.2g} is above '
+                        f'the target {report.target_false_positive_rate:.2g} (fill {report.fill_ratio:.1%})')
+                elif report.breach_ts is not None and report.breach_ts < now + self.warn_before:
+                    self.logger.warning(
+                        f'{report.key}: false positive target is going to be exceeded '
+                        f'in {(report.breach_ts - now) / DAY:.1f} days (fill {report.fill_ratio:.1%})')
+        return results
+
+    async def run_check_job(self, interval=6 * HOUR):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check(dedup_stats_flusher.deduplicators)
+            except Exception as e:
+                self.logger.exception(f'Error while checking the dedup capacity: {e!r}')
 
 
 class TxDeduplicatorSenderCooldown(TxDeduplicator):
@@ -142,3 +635,143 @@ class TxDeduplicatorSenderCooldown(TxDeduplicator):
 
         await sender_cd.do()
         return False
+
+
+class MultiTxDeduplicator(WithDelegates, INotified, WithLogger):
+    """
+    Several TxDeduplicators (namespaces) behind one call: "which namespaces have seen these txs",
+    "mark these txs in A, B and C". It is one Redis round trip per batch for all the namespaces,
+    and the bit positions of a tx are computed once for all the filters of the same shape (all by default).
+    As a pipeline stage in front of the consumers of the namespaces (see on_data) it prefetches their answers
+    in one go and writes their marks in one go.
+    """
+
+    def __init__(self, db: DB, namespaces: Iterable[Union[str, TxDeduplicator]] = ()):
+        super().__init__()
+        self.db = db
+        self.dedups: Dict[str, TxDeduplicator] = {}
+        for ns in namespaces:
+            self.add_namespace(ns)
+
+    def add_namespace(self, ns: Union[str, TxDeduplicator]) -> TxDeduplicator:
+        dedup = ns if isinstance(ns, TxDeduplicator) else TxDeduplicator(self.db, ns)
+        return self.dedups.setdefault(dedup.key.removeprefix('tx:dedup_v2:'), dedup)
+
+    def __getitem__(self, ns) -> TxDeduplicator:
+        return self.dedups[ns]
+
+    @staticmethod
+    def _positions(dedups: List[TxDeduplicator], tx_ids) -> List[dict]:
+        """
+        The bit positions of the txs for every filter, computed once per group of filters of the same shape.
+        """
+        results, computed = [], []
+        for dedup in dedups:
+            bf = dedup._bf
+            positions = next((p for other, p in computed if other.same_positions_as(bf)), None)
+            if positions is None:
+                positions = {tx_id: bf.positions(tx_id) for tx_id in tx_ids}
+                computed.append((bf, positions))
+            results.append(positions)
+        return results
+
+    async def _run_many(self, asks: Dict[str, List[str]], op, count_stats=True,
+                        use_cache=True) -> Dict[str, List[bool]]:
+        """
+        Every namespace answers for its own tx ids (non-empty), all in one round trip.
+        count_stats=False: the namespaces have counted the requests already or will count them when they make them.
+        use_cache=False: the front caches are not asked (see TxDeduplicator._start_batch).
+        """
+        asks = {ns: tx_ids for ns, tx_ids in asks.items() if tx_ids}
+        if not asks:
+            return {}
+        dedups = [self.dedups[ns] for ns in asks]
+
+        for dedup in dedups:
+            await dedup.refresh_layout()
+        answers = [dedup._start_batch(tx_ids, op, count_stats, use_cache)
+                   for dedup, tx_ids in zip(dedups, asks.values())]
+        from_redis = [
+            [tx_id for tx_id, seen in zip(tx_ids, ns_answers) if seen is None]
+            for tx_ids, ns_answers in zip(asks.values(), answers)
+        ]
+
+        reply_counts = [[] for _ in dedups]
+        replies = []
+        if any(from_redis):
+            positions = self._positions(dedups, {tx_id for ns_tx_ids in from_redis for tx_id in ns_tx_ids})
+            async with self.db.redis.pipeline(transaction=False) as pipe:
+                for i, dedup in enumerate(dedups):
+                    reply_counts[i] = dedup._queue_batch(pipe, from_redis[i], op, positions[i])
+                replies = await pipe.execute()
+
+        results = {}
+        start = 0
+        for (ns, tx_ids), dedup, ns_answers, ns_reply_counts in zip(asks.items(), dedups, answers, reply_counts):
+            n = sum(ns_reply_counts)
+            results[ns] = dedup._finish_batch(tx_ids, op, ns_answers, ns_reply_counts, replies[start:start + n],
+                                              count_stats)
+            start += n
+        return results
+
+    async def _run(self, tx_ids: List[str], op, namespaces=None, count_stats=True) -> List[Set[str]]:
+        """
+        For every tx id, the namespaces where the answer is "seen". Empty ids are seen everywhere.
+        """
+        names = list(self.dedups) if namespaces is None else list(namespaces)
+        to_ask = [tx_id for tx_id in tx_ids if tx_id]
+        results = await self._run_many({ns: to_ask for ns in names}, op, count_stats)
+
+        seen_in = [set() for _ in to_ask]
+        for ns, ns_answers in results.items():
+            for tx_seen_in, seen in zip(seen_in, ns_answers):
+                if seen:
+                    tx_seen_in.add(ns)
+
+        seen_in_it = iter(seen_in)
+        return [next(seen_in_it) if tx_id else set(names) for tx_id in tx_ids]
+
+    async def batch_seen_in(self, tx_ids: List[str], namespaces=None) -> List[Set[str]]:
+        """
+        Which namespaces (all by default) have seen every tx id.
+        """
+        return await self._run(tx_ids, BloomFilter.OP_CONTAINS, namespaces)
+
+    async def prefetch(self, tx_ids: List[str], namespaces=None):
+        """
+        Like batch_seen_in, only for the front caches: the requests are not counted in the stats,
+        the consumers count them when they ask.
+        """
+        await self._run(tx_ids, BloomFilter.OP_CONTAINS, namespaces, count_stats=False)
+
+    async def batch_check_and_mark(self, tx_ids: List[str], namespaces=None) -> List[Set[str]]:
+        """
+        Marks the tx ids in the namespaces and tells where they had been seen before.
+        """
+        return await self._run(tx_ids, BloomFilter.OP_CHECK_AND_ADD, namespaces)
+
+    async def batch_mark(self, tx_ids: List[str], namespaces=None):
+        await self._run(tx_ids, BloomFilter.OP_ADD, namespaces)
+
+    async def on_data(self, sender, txs: List[ThorAction]):
+        """
+        Prefetches the answers for the txs, passes them to the subscribers, and writes the marks they have made
+        in the namespaces (mark_as_seen_hashes) meanwhile, in one round trip after the last of them.
+        A subscriber with a dispatch queue runs later, so it marks on its own.
+        """
+        if isinstance(txs, list):
+            try:
+                await self.prefetch([tx.tx_hash for tx in txs if tx and tx.tx_hash])
+            except Exception as e:
+                # not fatal, the namespaces will ask Redis themselves
+                self.logger.exception(f'Dedup prefetch failed: {e!r}')
+
+        marks = {dedup.key: [] for dedup in self.dedups.values()}
+        token = _deferred_marks.set(marks)
+        try:
+            await self.pass_data_to_listeners(txs, sender)
+        finally:
+            _deferred_marks.reset(token)
+            # the marks are counted in the stats and put in the front caches when they are made
+            await self._run_many({ns: marks[dedup.key] for ns, dedup in self.dedups.items()},
+                                 BloomFilter.OP_ADD, count_stats=False, use_cache=False)
@@ -12,3 +12,14 @@ def fixture_deps():
     d.loop = asyncio.get_event_loop()
     d.db = DB(d.loop)
     return d
+
+
+@pytest.fixture(scope="function")
+def fake_db():
+    """
+    DB on an in-memory Redis (fakeredis, see requirements_test.txt); the test is skipped if it is not installed.
+    """
+    fakeredis = pytest.importorskip('fakeredis')
+    db = DB(None)
+    db.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return db
@@ -2,7 +2,7 @@ import pytest
 
 from lib.money import short_address
 from models.asset import Asset
-from models.asset import is_ambiguous_asset, AssetKind
+from models.asset import is_ambiguous_asset, AssetKind, AssetInternTable, parse_asset
 
 
 @pytest.mark.parametrize("asset_string, expected_chain, expected_name, expected_tag, expected_str", [
@@ -68,6 +68,26 @@ def test_recognize_kind():
     assert AssetKind.recognize('ETH~USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48') == AssetKind.TRADE
 
 
+def test_interned_assets():
+    p = parse_asset('eth~usdc-0xA0B8')
+    assert p is parse_asset('eth~usdc-0xA0B8')
+    assert (p.kind, p.chain, p.symbol, p.is_trade) == (AssetKind.TRADE, 'ETH', 'USDC-0XA0B8', True)
+    assert p.canonical == str(Asset.from_string('eth~usdc-0xA0B8')) == 'ETH~USDC-0XA0B8'
+    assert p.native_pool_name == 'ETH.USDC-0XA0B8'
+    assert p.normalized == 'eth.usdc-0xA0B8'
+    assert parse_asset('rune').canonical == 'THOR.RUNE'
+
+    # Asset objects are still separate and mutable
+    a = Asset.from_string('BTC.BTC')
+    a.is_trade = True
+    assert not Asset.from_string('BTC.BTC').is_trade
+
+    table = AssetInternTable(max_size=2)
+    for asset in ('BTC.BTC', 'ETH.ETH', 'BTC.BTC', 'XRP.XRP'):
+        table.get(asset)
+    assert len(table) == 2 and table.stats['hits'] == 1
+
+
 def test_convert_synth():
     p1 = Asset.to_L1_pool_name('ETH/USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48')
     assert p1 == 'ETH.USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48'
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+import ujson
+
+from jobs.scanner.scan_cache import BlockRawCache
+from tests.helpers import fake_db
+
+def make_block(height):
+    return {
+        'header': {'height': height, 'time': '2024-03-01T12:00:00.000000000Z'},
+        'txs': [{'hash': f'{height:064X}', 'result': {'code': 0, 'events': []}}] * 10,
+        'end_block_events': [{'type': 'swap', 'pool': 'BTC.BTC', 'coin': '1000 BTC.BTC'}] * 20,
+    }
+
+
+@pytest.fixture
+def cache(fake_db):
+    return BlockRawCache(fake_db, max_blocks=5, max_age=0)
+
+
+def test_encode_decode_roundtrip():
+    c = BlockRawCache(None)
+    block = make_block(123)
+    data = c.encode(block)
+    assert data.startswith(BlockRawCache.COMPRESSED_PREFIX)
+    assert len(data) < len(ujson.dumps(block))
+    assert BlockRawCache.decode(data) == block
+
+    # legacy uncompressed records are still readable
+    assert BlockRawCache.decode(ujson.dumps(block)) == block
+
+
+@pytest.mark.asyncio
+async def test_evicts_lowest_heights(cache):
+    for h in range(100, 110):
+        await cache.put(h, make_block(h))
+
+    assert await cache.get(104) is None
+    assert await cache.get(105) == make_block(105)
+    assert await cache.get(109) == make_block(109)
+
+    stats = await cache.stats()
+    assert stats['blocks'] == 5
+    assert stats['evicted'] == 5
+    assert stats['hits'] == 2 and stats['misses'] == 1
+
+    r = await cache.db.get_redis()
+    stored = await r.hvals(BlockRawCache.DB_KEY_BLOCK)
+    assert stats['bytes'] == sum(len(v) for v in stored)
+
+
+@pytest.mark.asyncio
+async def test_bytes_and_age_bounds(cache):
+    one_size = len(cache.encode(make_block(1)))
+    cache.max_blocks = 0
+    cache.max_bytes = one_size * 3
+    for h in range(1, 10):
+        await cache.put(h, make_block(h))
+    assert (await cache.stats())['blocks'] == 3
+
+    cache.max_age = 1e-9
+    await asyncio.sleep(0.01)
+    await cache.evict()
+    stats = await cache.stats()
+    assert stats['blocks'] == 0
+    assert stats['bytes'] == 0
+
+
+@pytest.mark.asyncio
+async def test_reindex_legacy(cache):
+    r = await cache.db.get_redis()
+    for h in range(1, 4):
+        await r.hset(BlockRawCache.DB_KEY_BLOCK, str(h), ujson.dumps(make_block(h)))
+
+    assert await cache.reindex() == 3
+    stats = await cache.stats()
+    assert stats['blocks'] == 3
+    assert stats['bytes'] == sum([len(v) for v in (await r.hgetall(BlockRawCache.DB_KEY_BLOCK)).values()])
+    assert await cache.get(2) == make_block(2)
+    assert (await r.hget(BlockRawCache.DB_KEY_BLOCK, '2')).startswith(BlockRawCache.COMPRESSED_PREFIX)
+
+    assert await cache.reindex() == 0
+    cache.max_bytes = stats['bytes'] - 1  # the legacy blocks are under the byte limit now
+    await cache.evict()
+    assert (await cache.stats())['blocks'] == 2
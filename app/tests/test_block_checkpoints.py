@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from jobs.scanner.block_result import BlockResult, ScannerError
+from jobs.scanner.checkpoints import BlockCheckpointStore, BlockCatchUpBuffer, CheckpointedSubscriber
+from jobs.scanner.native_scan import BlockScanner
+from lib.delegates import INotified
+from lib.depcont import DepContainer
+from tests.helpers import fake_db
+
+def make_block(height):
+    return BlockResult(height, txs=[], end_block_events=[], begin_block_events=[], error=ScannerError(0, ''))
+
+
+class Consumer(INotified):
+    def __init__(self, fail_at=(), delay=0.0):
+        self.fail_at = set(fail_at)
+        self.delay = delay
+        self.heights = []
+
+    async def on_data(self, sender, block):
+        await asyncio.sleep(self.delay)
+        if block.block_no in self.fail_at:
+            self.fail_at.discard(block.block_no)
+            raise ValueError('boom')
+        self.heights.append(block.block_no)
+
+
+class Fetcher:
+    def __init__(self):
+        self.fetched = []
+
+    async def __call__(self, height):
+        self.fetched.append(height)
+        await asyncio.sleep(0.01)
+        return make_block(height)
+
+
+@pytest.fixture
+def store(fake_db):
+    return BlockCheckpointStore(fake_db)
+
+
+async def feed(sub: CheckpointedSubscriber, buffer, heights):
+    for h in heights:
+        block = make_block(h)
+        buffer.put(block)
+        await sub.on_data(None, block)
+        await sub.store.flush()
+    while sub.is_catching_up:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_failed_block_is_retried_in_order(store):
+    buffer = BlockCatchUpBuffer(Fetcher())
+    consumer = Consumer(fail_at=[101])
+    sub = CheckpointedSubscriber(consumer, 'c', store, buffer, retry_delay=0.0)
+
+    await feed(sub, buffer, [100, 101, 102, 103])
+
+    assert consumer.heights == [100, 101, 102, 103]
+    assert sub.checkpoint == 103
+    assert await store.db.redis.hget(BlockCheckpointStore.DB_KEY, 'c') == '103'
+
+
+@pytest.mark.asyncio
+async def test_resumes_from_checkpoint_after_restart(store):
+    store.set('c', 95)
+    await store.flush()
+
+    fetcher = Fetcher()
+    buffer = BlockCatchUpBuffer(fetcher)
+    consumer = Consumer()
+    sub = CheckpointedSubscriber(consumer, 'c', BlockCheckpointStore(store.db), buffer, retry_delay=0.0)
+
+    await feed(sub, buffer, [100])
+
+    assert consumer.heights == [96, 97, 98, 99, 100]
+    assert fetcher.fetched == [96, 97, 98, 99]
+
+
+@pytest.mark.asyncio
+async def test_too_far_behind_skips_ahead(store):
+    store.set('c', 10)
+    await store.flush()
+
+    buffer = BlockCatchUpBuffer(Fetcher())
+    consumer = Consumer()
+    sub = CheckpointedSubscriber(consumer, 'c', BlockCheckpointStore(store.db), buffer, max_catch_up_blocks=2)
+
+    await feed(sub, buffer, [100])
+    assert consumer.heights == [98, 99, 100]
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts(store):
+    buffer = BlockCatchUpBuffer(Fetcher())
+    consumer = Consumer(fail_at=[1])
+    sub = CheckpointedSubscriber(consumer, 'c', store, buffer, max_attempts=1)
+
+    await feed(sub, buffer, [1, 2])
+    assert consumer.heights == [2]
+    assert sub.skipped == 1
+
+
+@pytest.mark.asyncio
+async def test_buffer_fetches_once_for_all_waiters():
+    fetcher = Fetcher()
+    buffer = BlockCatchUpBuffer(fetcher, max_blocks=2)
+    results = await asyncio.gather(buffer.get(5), buffer.get(5), buffer.get(5))
+    assert [b.block_no for b in results] == [5, 5, 5]
+    assert fetcher.fetched == [5]
+
+    for h in (6, 7):
+        buffer.put(make_block(h))
+    assert len(buffer) == 2
+    await buffer.get(5)  # evicted, so fetched again
+    assert fetcher.fetched == [5, 5]
+
+
+@pytest.mark.asyncio
+async def test_scanner_puts_dispatched_blocks_into_empty_buffer(store):
+    deps = DepContainer()
+    deps.db = store.db
+    scanner = BlockScanner(deps).use_checkpoints(buffer_size=10)
+    scanner.add_subscriber(Consumer(), name='c')
+    assert len(scanner.catch_up_buffer) == 0  # empty, so falsy
+
+    await scanner._dispatch_block(make_block(100))
+
+    assert len(scanner.catch_up_buffer) == 1
+    assert (await scanner.catch_up_buffer.get(100)).block_no == 100
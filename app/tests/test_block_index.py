@@ -0,0 +1,72 @@
+from jobs.scanner.block_result import BlockResult
+from jobs.scanner.tx import ThorTxMessage
+
+
+def make_tx(tx_hash, *messages):
+    return {
+        'hash': tx_hash,
+        'result': {'code': 0, 'events': []},
+        'tx': {'body': {'messages': list(messages), 'memo': ''}},
+    }
+
+
+def observed(tx_id, memo='SWAP:BTC.BTC:thor1x'):
+    return {'tx': {'id': tx_id, 'chain': 'BTC', 'from_address': 'bc1q', 'to_address': 'bc1v',
+                   'coins': [], 'gas': [], 'memo': memo}}
+
+
+RAW_BLOCK = {
+    'header': {'time': '2024-03-01T12:00:00.000000000Z'},
+    'txs': [
+        make_tx('A', {'@type': ThorTxMessage.MsgDeposit, 'signer': 'thor1a'}),
+        make_tx('B', {'@type': ThorTxMessage.MsgSend}, {'@type': ThorTxMessage.MsgDeposit, 'signer': 'thor1b'}),
+        make_tx('C', {'@type': ThorTxMessage.MsgObservedTxIn, 'txs': [observed('X1'), observed('X2')]}),
+        make_tx('D', {'@type': ThorTxMessage.MsgObservedTxQuorum,
+                      'quoTx': {'inbound': True, 'obsTx': observed('X3')}}),
+    ],
+    'end_block_events': [
+        {'type': 'swap', 'id': '1'},
+        {'type': 'outbound', 'id': '2', 'coin': '10 BTC.BTC'},
+        {'type': 'fee', 'id': '3'},
+        {'type': 'swap', 'id': '4'},
+    ],
+    'begin_block_events': [],
+}
+
+
+def load():
+    return BlockResult.load_block(RAW_BLOCK, 100)
+
+
+def test_find_tx_by_type():
+    b = load()
+    assert [tx.tx_hash for tx in b.find_tx_by_type(ThorTxMessage.MsgDeposit)] == ['A', 'B']
+    assert list(b.find_tx_by_type('/nothing')) == []
+
+    pairs = b.find_messages_by_type(ThorTxMessage.MsgSend, ThorTxMessage.MsgDeposit)
+    assert [(tx.tx_hash, m.type) for tx, m in pairs] == [
+        ('A', ThorTxMessage.MsgDeposit),
+        ('B', ThorTxMessage.MsgSend),
+        ('B', ThorTxMessage.MsgDeposit),
+    ]
+
+
+def test_end_block_event_index_keeps_order():
+    b = load()
+    assert [e.get('id') for e in b.find_end_block_events('swap')] == ['1', '4']
+    assert [e.get('id') for e in b.find_end_block_events('swap', 'outbound')] == ['1', '2', '4']
+    assert b.find_end_block_events('nope') == []
+    assert b.all_event_types == {'swap', 'outbound', 'fee'}
+
+
+def test_observed_txs_are_memoized():
+    b = load()
+    observed_txs = b.all_observed_txs
+    assert [tx.tx_id for tx in observed_txs] == ['X1', 'X2', 'X3']
+    assert b.all_observed_txs is observed_txs
+    assert b.observed_txs_by_id['X3'].is_inbound
+
+    # a filtered copy gets its own indexes
+    b2 = b.only_successful
+    assert b2 is not b
+    assert [tx.tx_id for tx in b2.all_observed_txs] == ['X1', 'X2', 'X3']
@@ -0,0 +1,117 @@
+import asyncio
+import random
+
+import pytest
+
+from jobs.scanner.block_result import BlockResult, ScannerError
+from jobs.scanner.prefetch import BlockPrefetchWindow
+
+HEAD = 100
+
+
+def make_block(height):
+    if height > HEAD:
+        return BlockResult(height, [], [], [], error=ScannerError(ScannerError.CODE_FUTURE, 'future'))
+    return BlockResult(height, [], [], [], error=ScannerError(0, ''))
+
+
+class FakeNode:
+    def __init__(self, delay=0.001, fail_at=()):
+        self.delay = delay
+        self.fail_at = set(fail_at)
+        self.requested = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, height):
+        self.requested.append(height)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay * random.uniform(0.5, 2.0))
+            if height in self.fail_at:
+                self.fail_at.remove(height)
+                raise ConnectionError(f'Block #{height} failed')
+            return make_block(height)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_in_order_and_concurrent():
+    node = FakeNode()
+    window = BlockPrefetchWindow(node.fetch, max_size=6, target_latency=1.0)
+
+    heights = []
+    for h in range(1, 50):
+        block = await window.get(h)
+        assert not block.is_error
+        heights.append(block.block_no)
+
+    assert heights == list(range(1, 50))
+    assert window.size == 6
+    assert 1 < node.max_in_flight <= 6
+    window.reset()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_shrinks_on_error():
+    node = FakeNode(fail_at=[20])
+    window = BlockPrefetchWindow(node.fetch, max_size=8, target_latency=1.0)
+
+    for h in range(1, 20):
+        await window.get(h)
+    assert window.size == 8
+
+    with pytest.raises(ConnectionError):
+        await window.get(20)
+    assert window.size == 4
+    assert not window.pending_heights
+
+    # retry succeeds
+    assert (await window.get(20)).block_no == 20
+    window.reset()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_drops_blocks_ahead_of_node():
+    node = FakeNode()
+    window = BlockPrefetchWindow(node.fetch, max_size=8, target_latency=1.0)
+
+    h = HEAD - 20
+    while True:
+        block = await window.get(h)
+        if block.is_ahead:
+            break
+        h += 1
+
+    assert h == HEAD + 1
+    assert not window.pending_heights
+    assert window.size == 8  # "not produced yet" is not an error
+
+
+@pytest.mark.asyncio
+async def test_prefetch_stops_at_the_last_known_height():
+    node = FakeNode()
+    window = BlockPrefetchWindow(node.fetch, max_size=8, target_latency=1.0, last_height_fn=lambda: HEAD)
+    window.size = 8
+
+    for h in range(HEAD - 20, HEAD + 1):
+        assert (await window.get(h)).block_no == h
+    assert max(node.requested) == HEAD
+    assert window.size == 8
+
+    # above it, only the asked height goes to the node
+    assert (await window.get(HEAD + 1)).is_ahead
+    assert max(node.requested) == HEAD + 1
+    assert window.size == 8 and not window.pending_heights
+
+
+@pytest.mark.asyncio
+async def test_prefetch_shrinks_when_slow():
+    node = FakeNode(delay=0.02)
+    window = BlockPrefetchWindow(node.fetch, max_size=8, target_latency=0.0)
+    window.size = 8
+    await window.get(1)
+    assert window.size == 4
+    window.reset()
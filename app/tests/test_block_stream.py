@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from jobs.scanner.block_result import BlockResult
+from jobs.scanner.block_stream import BlockResultStreamDecoder
+from lib.json_stream import JsonObjectStream
+from tests.test_block_index import RAW_BLOCK
+
+
+def feed_in_chunks(decoder, data: bytes, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        decoder.feed(data[i:i + chunk_size])
+    return decoder.close()
+
+
+def tx_view(block: BlockResult):
+    return [(tx.tx_hash, tx.timestamp, [m.type for m in tx.messages]) for tx in block.txs]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 17, 1 << 16])
+def test_stream_decoder_matches_load_block(chunk_size):
+    data = json.dumps(RAW_BLOCK, indent=1, ensure_ascii=False).encode('utf-8')
+    expected = BlockResult.load_block(RAW_BLOCK, 100)
+
+    result = feed_in_chunks(BlockResultStreamDecoder(100), data, chunk_size)
+
+    assert not result.is_error
+    assert result.timestamp == expected.timestamp
+    assert tx_view(result) == tx_view(expected)
+    assert result.end_block_events == expected.end_block_events
+    assert result.begin_block_events == expected.begin_block_events
+
+
+def test_stream_decoder_header_after_txs():
+    raw = {k: RAW_BLOCK[k] for k in ('txs', 'end_block_events', 'header')}
+    result = feed_in_chunks(BlockResultStreamDecoder(100), json.dumps(raw).encode(), 5)
+    assert tx_view(result) == tx_view(BlockResult.load_block(RAW_BLOCK, 100))
+
+
+def test_stream_decoder_error_reply():
+    data = json.dumps({'code': 2, 'message': 'height 100 is not available yet'}).encode()
+    result = feed_in_chunks(BlockResultStreamDecoder(100), data, 7)
+    assert result.is_error
+    assert result.error.code == 2
+
+
+def test_json_stream_values_and_unicode():
+    items = []
+    stream = JsonObjectStream(['a'], lambda key, item: items.append((key, item)))
+    data = json.dumps({'n': 12345, 'a': [{'s': 'ü ] } "x"'}, [1, [2]], 3.5, None], 'b': 'ö'},
+                      ensure_ascii=False).encode('utf-8')
+    assert feed_in_chunks(stream, data, 1) == {'n': 12345, 'a': [], 'b': 'ö'}
+    assert items == [('a', {'s': 'ü ] } "x"'}), ('a', [1, [2]]), ('a', 3.5), ('a', None)]
+
+
+def test_json_stream_truncated():
+    stream = JsonObjectStream(['a'], lambda key, item: None)
+    stream.feed(b'{"a": [1, 2')
+    with pytest.raises(json.JSONDecodeError):
+        stream.close()
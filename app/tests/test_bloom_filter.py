@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+import lib.bloom_filt
+from lib.bloom_filt import BloomFilter, BloomFilterV2, RotatingBloomFilter, MigratingBloomFilter
+from lib.date_utils import DAY
+from tests.helpers import fake_db
+
+@pytest.fixture
+def redis(fake_db):
+    return fake_db.redis
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('cls', [BloomFilter, BloomFilterV2])
+async def test_bit_layout_is_the_same_as_setbit(redis, cls):
+    bf = cls(redis, 'bf', capacity=1000, error_rate=0.01)
+
+    # written bit by bit like before
+    for position in bf.positions('old'):
+        await redis.setbit('bf', position, 1)
+    assert await bf.contains('old')
+
+    await bf.add('new')
+    assert all([await redis.getbit('bf', position) for position in bf.positions('new')])
+    assert await bf.bit_count() == len(set(bf.positions('old')) | set(bf.positions('new')))
+
+
+@pytest.mark.asyncio
+async def test_check_and_add(redis):
+    bf = BloomFilter(redis, 'bf', capacity=1000, error_rate=0.01)
+    assert not await bf.contains('tx')
+    assert not await bf.check_and_add('tx')
+    assert await bf.check_and_add('tx')
+    assert await bf.contains('tx')
+    assert not await bf.contains('other')
+
+
+@pytest.mark.asyncio
+async def test_rotating_filter_forgets_old_generations(redis, monkeypatch):
+    period = 1000
+    start = (int(time.time()) // period + 1) * period  # real time, otherwise EXPIREAT drops the keys at once
+    monkeypatch.setattr(lib.bloom_filt, 'now_ts', lambda: clock)
+    bf = RotatingBloomFilter(redis, 'rbf', capacity=4000, error_rate=0.01, generations=4, period=period)
+    assert bf.size == BloomFilter.get_size(1000, 0.0025)
+
+    clock = start
+    assert not await bf.check_and_add('old')
+    assert await bf.check_and_add('old')
+    assert await redis.expiretime(bf.generation_key(bf.generation_no())) == start + 4 * period
+
+    clock = start + 3 * period + 999  # the last period where the first generation is in the window
+    assert await bf.contains('old')
+    await bf.add('new')
+    assert await bf.check_and_add('new')
+    assert await bf.estimated_false_positive_rate() > 0.0
+
+    clock = start + 4 * period
+    assert not await bf.contains('old')
+    assert await bf.contains('new')
+    assert await bf.bit_count() == len(set(bf.positions('new')))
+    assert await bf.fill_ratio() == await bf.bit_count() / bf.size
+
+    await bf.clear()
+    assert not await bf.contains('new')
+    assert await bf.estimated_false_positive_rate() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_capacity_report_projects_the_breach(redis):
+    bf = BloomFilter(redis, 'bf', capacity=1000, error_rate=0.01)
+    empty = await bf.capacity_report(now=1000)
+    assert empty.fill_ratio == 0.0 and empty.items == 0.0 and not empty.is_breached
+    assert empty.breach_ts is None
+    assert 900 < empty.items_left < 1100  # about the capacity
+
+    for i in range(200):
+        await bf.add(f'tx{i}')
+    report = await bf.capacity_report(now=1000 + DAY)
+    assert 180 < report.items < 220
+    assert 150 < report.items_per_day < 250
+    assert 3 * DAY < report.breach_ts - (1000 + DAY) < 6 * DAY
+    assert await redis.llen(bf.capacity_samples_key) == 2
+
+    for i in range(200, 2000):
+        await bf.add(f'tx{i}')
+    report = await bf.capacity_report(now=1000 + DAY + 60, record=False)
+    assert report.is_breached and report.breach_ts == 1000 + DAY + 60
+
+
+def test_migrating_filter_has_the_shape_of_the_old_one(redis):
+    old = RotatingBloomFilter(redis, 'rbf', capacity=4000, error_rate=0.01, generations=4)
+    bf = MigratingBloomFilter(old, BloomFilter(redis, 'bf:v2', capacity=8000, error_rate=0.001))
+    assert (bf.size, bf.hash_count, bf.capacity, bf.error_rate) == (old.size, old.hash_count, 4000, 0.01)
+    assert bf.positions('tx') == old.positions('tx')
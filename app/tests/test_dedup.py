@@ -0,0 +1,232 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from lib.bloom_filt import BloomFilter
+from lib.date_utils import DAY, now_ts
+from lib.db import DB
+from lib.delegates import INotified
+
+from notify.dup_stop import TxDeduplicator, DedupFrontCache, MultiTxDeduplicator, DedupStatsFlusher, \
+    DEDUP_LAYOUT_REFRESH_INTERVAL
+from tests.helpers import fake_db
+
+@pytest.fixture
+def dedup(fake_db):
+    return TxDeduplicator(fake_db, 'test', capacity=10_000, error_rate=0.001)
+
+
+@pytest.mark.asyncio
+async def test_batch_check_and_mark(dedup):
+    await dedup.mark_as_seen_hashes(['A', 'B', ''])
+    assert await dedup.batch_ever_seen_hashes(['A', 'C', '', 'B']) == [True, False, True, True]
+    assert await dedup.have_ever_seen_hash('A')
+    assert not await dedup.have_ever_seen_hash('C')
+
+    assert await dedup.batch_check_and_mark_hashes(['C', 'A', 'C']) == [False, True, True]
+    assert await dedup.only_new_hashes(['A', 'C', 'D']) == ['D']
+
+    counters = {
+        'total_requests': 3 + 1 + 1 + 3 + 3,  # the empty id is not asked
+        'positive_requests': 2 + 1 + 0 + 2 + 2,
+        'write_requests': 2 + 3,
+    }
+    assert await dedup.load_stats() == {**counters, 'last_flush_ts': 0.0, 'flush_interval_sec': 0.0}
+    assert not await dedup.db.redis.exists(dedup._stats_key)  # nothing is written yet
+
+    flusher = DedupStatsFlusher(flush_interval=30)
+    flusher.register(dedup)
+    await flusher.flush(now=1000)
+    assert not dedup.has_pending_stats
+    assert await dedup.load_stats() == {**counters, 'last_flush_ts': 1000.0, 'flush_interval_sec': 30.0}
+
+    await dedup.have_ever_seen_hash('A')
+    await flusher.flush(now=1030)
+    assert (await dedup.load_stats())['total_requests'] == counters['total_requests'] + 1
+
+
+def test_dedup_on_unconnected_db():
+    db = DB(None)
+    dedup = TxDeduplicator(db, 'test', capacity=10_000, error_rate=0.001)
+    assert dedup.front_cache is not None
+    assert TxDeduplicator(db, 'test', capacity=10_000, error_rate=0.001).front_cache is dedup.front_cache
+    assert TxDeduplicator(DB(None), 'test', capacity=10_000, error_rate=0.001).front_cache is not dedup.front_cache
+
+
+@pytest.mark.asyncio
+async def test_front_cache_answers_locally_and_follows_marks(dedup):
+    await dedup.mark_as_seen_hashes(['A'])
+    assert await dedup.batch_ever_seen_hashes(['A', 'B']) == [True, False]
+
+    # the answers come from memory now
+    await dedup.db.redis.delete(dedup.key)
+    hits = dedup.front_cache.hits
+    assert await dedup.batch_ever_seen_hashes(['A', 'B']) == [True, False]
+    assert dedup.front_cache.hits == hits + 2
+
+    # a mark by another deduplicator of the key overrides the cached negative answer
+    other = TxDeduplicator(dedup.db, 'test', capacity=10_000, error_rate=0.001)
+    assert other.front_cache is dedup.front_cache
+    await other.mark_as_seen('B')
+    assert await dedup.have_ever_seen_hash('B')
+
+    # not cached by a deduplicator of another key
+    assert not await TxDeduplicator(dedup.db, 'other', capacity=10_000, error_rate=0.001).have_ever_seen_hash('A')
+
+    assert (await dedup.load_stats())['total_requests'] == 2 + 2 + 1
+
+
+def test_front_cache_expiry_and_size():
+    cache = DedupFrontCache(max_size=2, positive_ttl=100, negative_ttl=10)
+    cache.put('A', True, now=1000)
+    cache.put('B', False, now=1000)
+    assert cache.get('B', now=1005) is False
+    assert cache.get('B', positive_only=True, now=1005) is None
+    assert cache.get('B', now=1010) is None  # expired
+    assert cache.get('A', now=1050) is True
+    cache.put('C', True, now=1050)
+    cache.put('D', True, now=1050)
+    assert cache.get('A', now=1050) is None and len(cache) == 2
+    assert cache.hits == 2 and cache.misses == 3
+
+
+@pytest.mark.asyncio
+async def test_multi_namespace_in_one_round_trip(dedup, monkeypatch):
+    multi = MultiTxDeduplicator(dedup.db, [
+        dedup,
+        TxDeduplicator(dedup.db, 'volume', capacity=10_000, error_rate=0.001),
+        TxDeduplicator(dedup.db, 'count', capacity=10_000, error_rate=0.001),
+    ])
+    await dedup.mark_as_seen_hashes(['A'])
+
+    hashed, round_trips = [], []
+    positions = BloomFilter.positions
+    monkeypatch.setattr(BloomFilter, 'positions', lambda self, item: hashed.append(item) or positions(self, item))
+    execute = type(dedup.db.redis.pipeline()).execute
+    monkeypatch.setattr(type(dedup.db.redis.pipeline()), 'execute',
+                        lambda self, *args, **kwargs: round_trips.append(1) or execute(self, *args, **kwargs))
+
+    assert await multi.batch_check_and_mark(['A', 'B', ''], ['volume', 'count']) == [set(), set(), {'volume', 'count'}]
+    assert len(round_trips) == 1 and sorted(hashed) == ['A', 'B']  # once for both namespaces
+
+    assert await multi.batch_seen_in(['A', 'B', 'C']) == [{'test', 'volume', 'count'}, {'volume', 'count'}, set()]
+    assert len(round_trips) == 2
+
+    await multi.batch_mark(['C'], ['test'])
+    assert await multi['test'].have_ever_seen_hash('C')  # from the front cache
+    assert len(round_trips) == 3
+
+
+@pytest.mark.asyncio
+async def test_online_migration_to_a_bigger_filter(dedup):
+    await dedup.mark_as_seen_hashes(['old'])
+    other_process = TxDeduplicator(dedup.db, 'test', capacity=10_000, error_rate=0.001, front_cache_size=0)
+
+    now = now_ts()
+    await dedup.start_migration(20_000, 0.0005, transition_sec=DAY, now=now)
+    with pytest.raises(ValueError):
+        await dedup.start_migration(20_000, 0.0005, transition_sec=DAY, now=now)
+
+    # the other process picks it up on its next layout refresh
+    await other_process.refresh_layout(force=True, now=now + 1)
+    assert other_process.migration and len(await other_process.capacity_reports(record=False, now=now + 1)) == 2
+    assert await other_process.batch_check_and_mark_hashes(['old', 'new']) == [True, False]  # double read
+    new_filter = BloomFilter(dedup.db.redis, f'{dedup.key}:v2', 20_000, 0.0005)
+    assert await new_filter.contains('old') and await new_filter.contains('new')  # double write
+
+    # the transition counts from when every process has picked the migration up
+    end = now + DEDUP_LAYOUT_REFRESH_INTERVAL + DAY
+    with pytest.raises(ValueError):
+        await dedup.finish_migration(now=now + DAY)
+    await dedup.finish_migration(now=end)
+    assert not await dedup.db.redis.exists(f'{dedup.key}')
+    await other_process.refresh_layout(force=True, now=end)
+    assert other_process.size == new_filter.size and not other_process.migration
+    assert await other_process.batch_ever_seen_hashes(['old', 'new', 'other']) == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_migrations_do_not_overwrite_each_other(dedup):
+    operator = TxDeduplicator(dedup.db, 'test', capacity=10_000, error_rate=0.001)
+    results = await asyncio.gather(
+        dedup.start_migration(20_000, 0.0005, transition_sec=DAY),
+        operator.start_migration(40_000, 0.0005, transition_sec=DAY),
+        return_exceptions=True,
+    )
+    assert sorted(type(r).__name__ for r in results) == ['ValueError', 'dict']
+    started = next(r for r in results if isinstance(r, dict))
+    await dedup.refresh_layout(force=True)
+    assert dedup.migration['next'] == started['next']
+
+
+@pytest.mark.asyncio
+async def test_abort_is_refused_after_the_transition(dedup):
+    now = now_ts()
+    await dedup.start_migration(20_000, 0.0005, transition_sec=10, now=now - DEDUP_LAYOUT_REFRESH_INTERVAL - 20)
+    await dedup.refresh_layout(force=True)
+    await dedup.mark_as_seen('late')  # only in the new filter now
+
+    with pytest.raises(ValueError):
+        await dedup.abort_migration()
+    dedup.front_cache.clear()
+    assert await dedup.have_ever_seen_hash('late')
+
+    await dedup.abort_migration(force=True)
+    assert not dedup.migration
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_not_counted(dedup):
+    multi = MultiTxDeduplicator(dedup.db, [dedup])
+    await multi.on_data(None, [])  # no txs, no subscribers
+    await multi.prefetch(['A', 'B', 'C'])
+    assert await dedup.batch_ever_seen_hashes(['A', 'B', 'C']) == [False, False, False]  # from the front cache
+
+    stats = await dedup.load_stats()
+    assert stats['total_requests'] == 3 and stats['positive_requests'] == 0
+
+
+class Recorder(INotified):
+    def __init__(self, db, ns):
+        self.dedup = TxDeduplicator(db, ns, capacity=10_000, error_rate=0.001)
+        self.recorded = []
+
+    async def on_data(self, sender, txs):
+        txs = await self.dedup.only_new_txs(txs)
+        self.recorded += [tx.tx_hash for tx in txs]
+        await self.dedup.mark_as_seen_txs(txs)
+
+
+@pytest.mark.asyncio
+async def test_stage_checks_and_marks_for_its_subscribers_in_one_go(fake_db, monkeypatch):
+    volume, count = Recorder(fake_db, 'volume'), Recorder(fake_db, 'count')
+    multi = MultiTxDeduplicator(fake_db, [volume.dedup, count.dedup])
+    multi.add_subscriber(volume)
+    multi.add_subscriber(count)
+    await count.dedup.mark_as_seen_hashes(['A'])
+
+    round_trips = []
+    execute = type(fake_db.redis.pipeline()).execute
+    monkeypatch.setattr(type(fake_db.redis.pipeline()), 'execute',
+                        lambda self, *args, **kwargs: round_trips.append(1) or execute(self, *args, **kwargs))
+
+    txs = [SimpleNamespace(tx_hash='A'), SimpleNamespace(tx_hash='B')]
+    await multi.on_data(None, txs)
+    assert volume.recorded == ['A', 'B'] and count.recorded == ['B']
+    assert len(round_trips) == 2  # the prefetch and the marks
+
+    other_process = {ns: TxDeduplicator(fake_db, ns, capacity=10_000, error_rate=0.001, front_cache_size=0)
+                     for ns in ('volume', 'count')}
+    for dedup in other_process.values():
+        assert await dedup.batch_ever_seen_hashes(['A', 'B', 'C']) == [True, True, False]
+    assert (await volume.dedup.load_stats())['write_requests'] == 2
+
+    # a queued subscriber runs after the dispatch, so it marks on its own
+    late = Recorder(fake_db, 'count')
+    queued = MultiTxDeduplicator(fake_db, [late.dedup]).use_dispatch_queues()
+    queued.add_subscriber(late)
+    await queued.on_data(None, [SimpleNamespace(tx_hash='C')])
+    await asyncio.sleep(0.05)
+    assert late.recorded == ['C']
+    assert await other_process['count'].have_ever_seen_hash('C')
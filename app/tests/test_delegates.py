@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from lib.delegates import WithDelegates, INotified, QueuedDelegate, DispatchOverflow
+
+
+class Recorder(INotified):
+    def __init__(self, delay=0.0, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.received = []
+
+    async def on_data(self, sender, data):
+        await asyncio.sleep(self.delay)
+        if data == self.fail_on:
+            raise ValueError('boom')
+        self.received.append(data)
+
+
+@pytest.mark.asyncio
+async def test_sequential_by_default():
+    source = WithDelegates()
+    r = Recorder()
+    source.add_subscriber(r)
+    source.add_subscriber(r)
+    assert source.delegates == [r]
+    await source.pass_data_to_listeners(1)
+    assert r.received == [1]
+
+
+@pytest.mark.asyncio
+async def test_slow_listener_does_not_block_fast_one():
+    source = WithDelegates().use_dispatch_queues(max_size=100)
+    slow, fast = Recorder(delay=0.05), Recorder()
+    source.add_subscriber(slow).add_subscriber(fast)
+    source.add_subscriber(slow)
+    assert len(source.delegates) == 2
+    assert source.subscribers == [slow, fast]
+
+    for i in range(1, 6):
+        await source.pass_data_to_listeners(i)
+    await asyncio.sleep(0.01)
+
+    assert fast.received == [1, 2, 3, 4, 5]
+    assert len(slow.received) < 5
+
+    stats = source.dispatch_stats[str(slow)]
+    assert stats['queue_length'] > 0
+    assert stats['lag_sec'] > 0
+
+    for d in source.delegates:
+        await d.join()
+        d.stop()
+    assert slow.received == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_block_overflow_waits():
+    r = Recorder(delay=0.01)
+    q = QueuedDelegate(r, max_size=2, overflow=DispatchOverflow.BLOCK)
+    for i in range(6):
+        await q.on_data(None, i)
+        assert q.queue_length <= 2
+    await q.join()
+    q.stop()
+    assert r.received == list(range(6))
+    assert q.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_and_coalesce():
+    r = Recorder(delay=0.05)
+    q = QueuedDelegate(r, max_size=2, overflow=DispatchOverflow.DROP_OLDEST)
+    for i in range(6):
+        await q.on_data(None, i)
+    await q.join()
+    q.stop()
+    assert r.received[-2:] == [4, 5]
+    assert q.dropped > 0
+    assert len(r.received) + q.dropped == 6
+
+    r = Recorder(delay=0.05)
+    q = QueuedDelegate(r, max_size=1, overflow=DispatchOverflow.COALESCE)
+    await q.on_data(None, [1])
+    await asyncio.sleep(0.01)  # the worker takes [1]
+    await q.on_data(None, [2])
+    await q.on_data(None, [3])
+    await q.on_data(None, [4])
+    await q.join()
+    q.stop()
+    assert r.received == [[1], [2, 3, 4]]
+    assert q.coalesced == 2
+
+    # the payloads that are not lists are not merged (nor lost): the sender waits, like with BLOCK
+    r = Recorder(delay=0.02)
+    q = QueuedDelegate(r, max_size=1, overflow=DispatchOverflow.COALESCE)
+    for data in ('a', [1], 'b', 'c'):
+        await q.on_data(None, data)
+        assert q.queue_length <= 1
+    await q.join()
+    q.stop()
+    assert r.received == ['a', [1], 'b', 'c']
+    assert q.coalesced == 0 and q.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_errors():
+    r = Recorder(fail_on=2)
+    q = QueuedDelegate(r, max_size=10)
+    for i in range(4):
+        await q.on_data(None, i)
+    await q.join()
+    q.stop()
+    assert r.received == [0, 1, 3]
+    assert q.errors == 1
+
+
+def test_bad_policy():
+    with pytest.raises(ValueError):
+        QueuedDelegate(Recorder(), overflow='whatever')
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from jobs.scanner.event_db import EventDatabase
+from tests.helpers import fake_db
+
+@pytest.fixture
+def ev_db(fake_db):
+    return EventDatabase(fake_db, expiration_sec=1000)
+
+
+@pytest.mark.asyncio
+async def test_index_lists_pages_and_backs_up(ev_db, tmp_path):
+    for i in range(7):
+        await ev_db.write_tx_status_kw(f'T{i}', id=f'T{i}', status='observed_in')
+        await ev_db.db.redis.zadd(EventDatabase.DB_KEY_INDEX, {f'T{i}': 1000 + i})  # make the order certain
+    await ev_db.write_tx_status_kw('T0', status='given_away')  # the latest update now
+
+    assert await ev_db.count_tx_ids() == 7
+    assert await ev_db.list_tx_ids(limit=3) == ['T0', 'T6', 'T5']
+    assert await ev_db.list_tx_ids(offset=3, limit=3, newest_first=False) == ['T4', 'T5', 'T6']
+    assert [x async for x in ev_db.iter_tx_ids(page_size=2)] == ['T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'T0']
+
+    # a key that has gone is dropped from the index during the backup
+    await ev_db.db.redis.delete(ev_db.key_to_tx('T3'))
+    path = tmp_path / 'backup.json'
+    assert await ev_db.backup(str(path)) == 6
+    with open(path) as f:
+        data = json.load(f)
+    assert data[ev_db.key_to_tx('T0')]['status'] == 'given_away'
+    assert ev_db.key_to_tx('T3') not in data
+    assert await ev_db.count_tx_ids() == 6
+
+    await ev_db.erase_tx_id('T1')
+    assert 'T1' not in await ev_db.list_tx_ids(limit=100)
+
+    assert await ev_db.erase_tx_ids(['T2', 'T4', 'nope']) == 2
+    assert await ev_db.list_tx_ids(limit=100, newest_first=False) == ['T5', 'T6', 'T0']
+    assert not await ev_db.db.redis.exists(ev_db.key_to_tx('T2'), ev_db.key_to_tx('T4'))
+
+
+@pytest.mark.asyncio
+async def test_prune_and_rebuild(ev_db):
+    r = ev_db.db.redis
+    await ev_db.write_tx_status_kw('NEW', status='x')
+    await r.zadd(EventDatabase.DB_KEY_INDEX, {'OLD': 1.0})
+    assert await ev_db.prune_index() == 1
+    assert await ev_db.list_tx_ids() == ['NEW']
+
+    # written before the index existed
+    await r.hset(ev_db.key_to_tx('LEGACY'), mapping={'status': 'x'})
+    await r.expire(ev_db.key_to_tx('LEGACY'), 500)
+    assert await ev_db.rebuild_index(scan_count=1) == 2
+    assert set(await ev_db.list_tx_ids()) == {'NEW', 'LEGACY'}
+    assert await ev_db.list_tx_ids(limit=1, newest_first=False) == ['LEGACY']
+
+
+@pytest.mark.asyncio
+async def test_iteration_survives_writes_and_pruning(ev_db):
+    r = ev_db.db.redis
+    await r.zadd(EventDatabase.DB_KEY_INDEX, {f'T{i}': 1000 + i // 2 for i in range(10)})  # pairs of equal scores
+
+    seen = []
+    async for tx_id in ev_db.iter_tx_ids(page_size=3):
+        seen.append(tx_id)
+        if tx_id == 'T3':
+            await r.zadd(EventDatabase.DB_KEY_INDEX, {'T0': 2000, 'T8': 2001})  # updated, moved to the end
+            await r.zrem(EventDatabase.DB_KEY_INDEX, 'T1', 'T2')  # pruned
+    # T0 was yielded before its update, so it comes again
+    assert seen == ['T0', 'T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'T7', 'T9', 'T0', 'T8']
+
+    # more equal scores than the page size
+    await r.zadd(EventDatabase.DB_KEY_INDEX, {f'S{i}': 1 for i in range(7)})
+    ids = [x async for x in ev_db.iter_tx_ids(page_size=2)]
+    assert len(ids) == len(set(ids)) == await r.zcard(EventDatabase.DB_KEY_INDEX)
@@ -0,0 +1,75 @@
+import pytest
+
+from jobs.scanner.event_db import EventDatabase
+from tests.helpers import fake_db
+
+def test_record_encoding():
+    small = {'status': 'observed_in'}
+    assert EventDatabase.encode_record(small) == '{"status":"observed_in"}'  # does not pay off to compress
+
+    big = {f'ev_swap_{i}': '{"pool": "BTC.BTC", "swap_slip": "10", "liquidity_fee": "1234"}' for i in range(20)}
+    encoded = EventDatabase.encode_record(big)
+    assert encoded.startswith(EventDatabase.COMPRESSED_PREFIX)
+    assert EventDatabase.decode_record(encoded) == big
+    assert EventDatabase.decode_record(None) == {}
+
+
+@pytest.mark.asyncio
+async def test_compact_and_legacy_records_read_the_same(fake_db):
+    legacy = EventDatabase(fake_db, expiration_sec=1000, compact=False)
+    compact = EventDatabase(fake_db, expiration_sec=1000)
+
+    await legacy.write_tx_status_kw('L', id='L', status='observed_in', in_amount=5, is_streaming=True)
+    await compact.write_tx_status_kw('C', id='C', status='observed_in', in_amount=5, is_streaming=True)
+    assert await fake_db.redis.type(compact.key_to_tx('L')) == 'hash'
+    assert await fake_db.redis.type(compact.key_to_tx('C')) == 'string'
+    assert 0 < await fake_db.redis.ttl(compact.key_to_tx('C')) <= 1000
+
+    for reader in (legacy, compact):
+        raw = await reader.read_tx_status_raw_many(['L', 'C', 'nope'])
+        assert raw['L'] == {**raw['C'], 'id': 'L'}
+        assert raw['nope'] == {}
+
+    # either writer merges into either format, and the format of a record does not change
+    await compact.write_tx_status_kw('L', status='given_away')
+    await legacy.write_tx_status_kw('C', status='given_away')
+    assert await fake_db.redis.type(compact.key_to_tx('C')) == 'string'
+    for tx_id in ('L', 'C'):
+        props = await compact.read_tx_status(tx_id)
+        assert props.attrs['status'] == 'given_away' and props.attrs['in_amount'] == '5'
+
+
+@pytest.mark.asyncio
+async def test_batch_writes_whole_compact_records(fake_db):
+    ev_db = EventDatabase(fake_db, expiration_sec=1000)
+    await ev_db.write_tx_status_kw('A', id='A', status='observed_in')
+
+    batch = ev_db.batch()
+    await batch.load(['A'])
+    batch.write_tx_status_kw('A', status='given_away')
+    batch.write_tx_status('B', {'ev_swap_1': {'id': 1}})  # not loaded: read at commit
+    await batch.commit()
+
+    assert await ev_db.read_tx_status_raw_many(['A', 'B']) == {
+        'A': {'id': 'A', 'status': 'given_away'},
+        'B': {'ev_swap_1': '{"id": 1}'},
+    }
+
+
+@pytest.mark.asyncio
+async def test_migration_keeps_attributes_and_ttl(fake_db):
+    legacy = EventDatabase(fake_db, expiration_sec=1000, compact=False)
+    for i in range(5):
+        await legacy.write_tx_status_kw(f'T{i}', id=f'T{i}', status='observed_in')
+    await fake_db.redis.expire(legacy.key_to_tx('T0'), 100)
+    before = await legacy.read_tx_status_raw_many([f'T{i}' for i in range(5)])
+
+    compact = EventDatabase(fake_db, expiration_sec=1000)
+    stats = await compact.migrate_to_compact(scan_count=2)
+
+    assert stats['converted'] == 5 and stats['failed'] == 0
+    for i in range(5):
+        assert await fake_db.redis.type(compact.key_to_tx(f'T{i}')) == 'string'
+    assert 90 < await fake_db.redis.ttl(compact.key_to_tx('T0')) <= 100
+    assert await compact.read_tx_status_raw_many(before.keys()) == before
+    assert (await compact.migrate_to_compact())['converted'] == 0
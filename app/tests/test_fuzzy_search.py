@@ -0,0 +1,48 @@
+import random
+
+from lib.texts import fuzzy_search, FuzzySearchIndex
+from models.pool_info import PoolInfo
+from models.price import LastPriceHolder
+
+POOLS = [
+    'BTC.BTC', 'ETH.ETH', 'BSC.BNB', 'BASE.ETH', 'GAIA.ATOM', 'DOGE.DOGE', 'AVAX.AVAX',
+    'ETH.USDT-0XDAC17F958D2EE523A2206206994597C13D831EC7',
+    'ETH.USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48',
+    'BSC.USDT-0X55D398326F99059FF775485246999027B3197955',
+    'BASE.USDC-0X833589FCD6EDB6E08F4C7C32D4F71B54BDA02913',
+    'AVAX.USDC-0XB97EF9EF8734C71904D8002F8B6BC66DD9C48A6E',
+]
+
+
+def test_index_matches_the_scan():
+    index = FuzzySearchIndex(POOLS)
+    rnd = random.Random(42)
+    queries = ['', 'btc.btc', 'ETH', 'E.USDT', 'ETH.USDT-EC7', 'ETH.USDT-', 'USDC', '-3606EB48', 'X', 'NOPE',
+               'eth.usdc-0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48']
+    for _ in range(200):
+        name = rnd.choice(POOLS)
+        i, j = sorted(rnd.sample(range(len(name) + 1), 2))
+        queries.append(name[i:j].lower())
+
+    for query in queries:
+        assert index.search(query) == [p for p in POOLS if p in fuzzy_search(query, set(POOLS))], query
+        assert index.search(query) == index.search(query)  # memoized
+
+
+def make_pool(name, depth):
+    return PoolInfo(name, depth, depth, 1, PoolInfo.AVAILABLE)
+
+
+def test_pool_index_is_rebuilt_on_pool_set_change():
+    ph = LastPriceHolder()
+    ph.update_pools({name: make_pool(name, 100 + i) for i, name in enumerate(POOLS)})
+    assert ph.pool_fuzzy_first('ETH.USDT') == POOLS[7]
+    assert ph.pool_fuzzy_first('usdc') == POOLS[-1]  # the deepest one
+    index = ph.pool_index
+
+    ph.update_pools(dict(ph.pool_info_map))  # a price update
+    assert ph.pool_index is index
+
+    ph.update_pools({'BTC.BTC': make_pool('BTC.BTC', 1)})
+    assert ph.pool_index is not index
+    assert ph.pool_fuzzy_first('ETH.USDT') == ''
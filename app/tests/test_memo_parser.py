@@ -1,6 +1,6 @@
 import pytest
 
-from models.memo import THORMemo, ActionType, is_action
+from models.memo import THORMemo, ActionType, is_action, parsed_memo_cache
 
 
 def test_memo1():
@@ -82,3 +82,23 @@ def test_memo2():
 ])
 def test_action_type(x, y, result):
     assert is_action(x, y) == result
+
+
+def test_parsed_memos_are_memoized_and_copied():
+    parsed_memo_cache.clear()
+    memo_str = '=:BTC.BTC:bc1qaddr:0/3/10:tr:15'
+
+    first = THORMemo.parse_memo(memo_str)
+    first.asset = 'MUTATED'
+    first.affiliates.append(('x', 1))
+
+    second = THORMemo.parse_memo(memo_str)
+    assert second.asset == 'BTC.BTC'
+    assert second.affiliate_address == 'tr' and second.affiliate_fee_bp == 15
+    assert parsed_memo_cache.hits == 1 and parsed_memo_cache.misses == 1
+
+    # the unknown memos are memoized as well, raising or not like before
+    assert THORMemo.parse_memo('FOO:BAR', no_raise=True) is None
+    with pytest.raises(NotImplementedError):
+        THORMemo.parse_memo('FOO:BAR')
+    assert parsed_memo_cache.hits == 2
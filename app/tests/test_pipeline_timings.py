@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from lib.delegates import WithDelegates, INotified
+from lib.lru import WindowPercentiles, percentile_of_sorted
+from lib.timings import PipelineTimings, pipeline_timings, measure_hop
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'perf_counter', clock)
+    pipeline_timings.reset()
+    return clock
+
+
+class Sleeper(WithDelegates, INotified):
+    def __init__(self, clock, delay):
+        super().__init__()
+        self.clock = clock
+        self.delay = delay
+
+    async def on_data(self, sender, data):
+        self.clock.now += self.delay
+        await self.pass_data_to_listeners(data, self)
+
+
+class Outer(Sleeper):
+    pass
+
+
+class Inner(Sleeper):
+    pass
+
+
+def test_window_percentiles():
+    w = WindowPercentiles(100)
+    assert w.percentile(50) is None
+    for i in range(1, 101):
+        w.append(i)
+    assert w.percentiles(50, 90, 99) == [51, 91, 100]
+    w.append(1000)  # the oldest value goes away
+    assert w.percentile(100) == 1000
+    assert w.min == 2
+
+
+def test_percentile_of_sorted():
+    assert percentile_of_sorted([], 50) is None
+    assert percentile_of_sorted([1, 2, 3, 4], 0) == 1
+    assert percentile_of_sorted([1, 2, 3, 4], 50) == 3
+    assert percentile_of_sorted([1, 2, 3, 4], 100) == 4
+
+
+@pytest.mark.asyncio
+async def test_self_time_excludes_nested_hops(clock):
+    source = WithDelegates()
+    outer = Outer(clock, 0.25)
+    outer.add_subscriber(Inner(clock, 0.5))
+    source.add_subscriber(outer)
+
+    trace = pipeline_timings.begin_block(123)
+    await source.pass_data_to_listeners(1)
+    trace = pipeline_timings.end_block(trace, total=0.75, slow_threshold=0.5)
+
+    outer_stats = pipeline_timings.stages['Outer']
+    inner_stats = pipeline_timings.stages['Inner']
+    assert outer_stats.calls == inner_stats.calls == 1
+    assert outer_stats.total.max == 0.75
+    assert outer_stats.self_time.max == 0.25
+    assert inner_stats.total.max == inner_stats.self_time.max == 0.5
+    assert dict(trace.stages) == {'Outer': 0.25, 'Inner': 0.5}
+
+    assert trace.height == 123
+    assert [name for name, _ in trace.top(2)] == ['Inner', 'Outer']
+    assert list(pipeline_timings.slow_blocks) == [trace]
+    assert list(pipeline_timings.summary.keys())[:2] == [PipelineTimings.BLOCK, 'Inner']
+
+
+@pytest.mark.asyncio
+async def test_measure_hop_outside_of_block(clock):
+    with measure_hop('fetch') as t:
+        clock.now += 0.125
+    assert t.elapsed == 0.125
+    assert pipeline_timings.stages['fetch'].calls == 1
+    assert pipeline_timings.stages['fetch'].self_time.max == 0.125
+    assert not pipeline_timings.slow_blocks
@@ -0,0 +1,53 @@
+from jobs.scanner.lag_monitor import ScannerLagMonitor
+
+T0 = 1_700_000_000.0
+
+
+def make_monitor():
+    return ScannerLagMonitor(block_time=6.0, min_poll=0.5, max_sleep=6.0, stale_after=18.0, max_backoff=60.0)
+
+
+def test_behind_means_no_sleep():
+    m = make_monitor()
+    m.on_node_height(1000)
+    m.on_block(900, block_time=T0 - 600, now=T0)
+    assert m.lag_blocks == 100
+    assert m.lag_seconds(now=T0) == 600
+    assert m.next_sleep(now=T0) == 0.0
+
+
+def test_at_head_waits_for_the_next_block():
+    m = make_monitor()
+    m.on_node_height(1000)
+    m.on_block(1000, block_time=T0, now=T0 + 1.0)
+    assert m.lag_blocks == 0
+    assert m.next_sleep(now=T0 + 1.0) == 5.0
+
+    # the block is late: poll tightly
+    m.on_empty_poll()
+    assert m.next_sleep(now=T0 + 7.0) == 0.5
+
+
+def test_stale_node_backoff():
+    m = make_monitor()
+    m.on_block(1000, block_time=T0, now=T0)
+    sleeps = []
+    for i in range(1, 10):
+        m.on_empty_poll()
+        sleeps.append(m.next_sleep(now=T0 + 20.0 + i))
+    assert sleeps == sorted(sleeps)
+    assert sleeps[0] == 1.0
+    assert sleeps[-1] == 60.0
+
+    # a new block resets everything
+    m.on_block(1001, block_time=T0 + 100, now=T0 + 101)
+    assert m.next_sleep(now=T0 + 101) == 5.0
+
+
+def test_errors_backoff():
+    m = make_monitor()
+    m.on_node_height(1000)
+    m.on_block(900, block_time=T0, now=T0)
+    m.on_error()
+    m.on_error()
+    assert m.next_sleep(now=T0) == 2.0
@@ -1,6 +1,7 @@
 import pytest
 
-from jobs.scanner.util import thor_decode_amount_field
+from jobs.scanner.util import thor_decode_amount_field, pubkey_to_thor_address, parse_thor_address, \
+    address_cache_stats
 
 
 @pytest.mark.parametrize("input_str, expected", [
@@ -13,6 +14,8 @@ from jobs.scanner.util import thor_decode_amount_field
     ("98765btc", (98765, "BTC")),
     ("BTC 123456", (123456, "BTC")),
     ("BTC~BTC 0", (0, "BTC~BTC")),
+    ("12rune34", (12, "RUNE34")),
+    ("\u0661\u0662rune", (12, "RUNE")),  # non-ASCII digits, like str.isdigit() sees them
 ])
 def test_valid_cases(input_str, expected):
     assert thor_decode_amount_field(input_str) == expected
@@ -24,7 +27,21 @@ def test_valid_cases(input_str, expected):
     " rune",  # amount missing
     "12 34 56",  # multiple spaces
     "",  # empty string
+    "\u00b2rune",  # a digit for str.isdigit(), but not for int()
 ])
 def test_invalid_cases(invalid_input):
     with pytest.raises(ValueError):
         thor_decode_amount_field(invalid_input)
+
+
+def test_addresses_are_cached():
+    pubkey = 'A7dfWmk8lROhAOMYrSx/XaVc1U27nT73WSLpbUzany5I'
+    address = pubkey_to_thor_address(pubkey)
+    assert address.startswith('thor1')
+    hits = address_cache_stats()['pubkey']['hits']
+    assert pubkey_to_thor_address(pubkey) == address
+    assert address_cache_stats()['pubkey']['hits'] == hits + 1
+
+    raw = bytes(range(20))
+    assert parse_thor_address(raw) == parse_thor_address(list(raw))
+    assert parse_thor_address(b'thor1abc') == 'thor1abc'
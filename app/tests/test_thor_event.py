@@ -0,0 +1,58 @@
+from jobs.scanner.tx import ThorEvent
+from models.events import parse_swap_and_out_event, EventOutbound
+
+
+def outbound_dict():
+    return {
+        'type': 'outbound',
+        'chain': 'BTC',
+        'coin': '1500000 BTC.BTC',
+        'from': 'bc1qfrom',
+        'to': 'bc1qto',
+        'id': '0000000000000000000000000000000000000000000000000000000000000000',
+        'in_tx_id': 'ABCDEF',
+        'memo': 'OUT:ABCDEF',
+    }
+
+
+def test_decoding_is_deferred():
+    raw = outbound_dict()
+    ev = ThorEvent.from_dict(raw, height=123)
+
+    assert ev.type == 'outbound'
+    assert ev.get('chain') == 'BTC'
+    assert ev.height == 123
+    assert '_amount' not in raw
+
+    assert ev.amount == 1500000
+    assert ev.asset == 'BTC.BTC'
+    assert raw['_height'] == 123
+
+
+def test_same_as_eager_representation():
+    ev = ThorEvent.from_dict(outbound_dict(), height=123)
+    assert list(ev.attrs.keys())[-3:] == ['_amount', '_asset', '_height']
+    assert repr(ev).startswith("ThorEvent(attrs={'type': 'outbound'")
+    assert ev == ThorEvent(dict(ev.attrs))
+    assert ev
+
+
+def test_amount_with_letters():
+    ev = ThorEvent.from_dict({'type': 'transfer', 'amount': '114731984rune'})
+    assert ev.amount == 114731984
+    assert ev.asset == 'RUNE'
+    assert ev.height == 0
+
+    ev = ThorEvent.from_dict({'type': 'fee', 'amount': '1000'})
+    assert ev.amount == 0
+
+
+def test_restored_height_and_parsing():
+    stored = dict(ThorEvent.from_dict(outbound_dict(), height=555).attrs)
+    ev = ThorEvent.from_dict(stored)
+    assert ev.height == 555
+
+    out = parse_swap_and_out_event(ev)
+    assert isinstance(out, EventOutbound)
+    assert out.height == 555
+    assert out.amount == 1500000
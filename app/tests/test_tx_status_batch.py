@@ -0,0 +1,104 @@
+import pytest
+
+from jobs.scanner.event_db import EventDatabase, TxStateCache
+from lib.date_utils import now_ts
+from tests.helpers import fake_db
+
+@pytest.fixture
+def ev_db(fake_db):
+    return EventDatabase(fake_db, expiration_sec=1000)
+
+
+@pytest.mark.asyncio
+async def test_batch_sees_own_writes_and_matches_redis(ev_db):
+    await ev_db.write_tx_status_kw('A', id='A', status='observed_in', in_amount=5)
+
+    batch = ev_db.batch()
+    await batch.load(['A', 'B', 'A'])
+
+    assert batch.read_tx_status('A').attrs['status'] == 'observed_in'
+    assert batch.read_tx_status('B') is None
+
+    batch.write_tx_status('B', {'ev_swap_1': {'type': 'swap', 'id': 1}, 'is_streaming': True, 'amount': 1.5})
+    batch.write_tx_status_kw('A', status='given_away')
+    assert batch.read_tx_status('A').attrs['status'] == 'given_away'
+    local_b = dict(batch.read_tx_status('B').attrs)
+
+    # nothing is written until commit
+    assert (await ev_db.read_tx_status('A')).attrs['status'] == 'observed_in'
+
+    await batch.commit()
+    assert batch.pending_writes == 0
+    assert (await ev_db.read_tx_status('A')).attrs['status'] == 'given_away'
+    assert (await ev_db.read_tx_status('B')).attrs == local_b
+    assert 0 < await ev_db.db.redis.ttl(ev_db.key_to_tx('B')) <= 1000
+
+
+@pytest.mark.asyncio
+async def test_batch_reads_none_for_empty_and_unloaded_ids(ev_db):
+    await ev_db.write_tx_status_kw('A', id='A', status='observed_in')
+
+    batch = ev_db.batch()
+    await batch.load(['', None])
+    assert batch.read_tx_status('') is None  # e.g. an outbound without in-tx id
+    assert batch.read_tx_status(None) is None
+    assert batch.read_tx_status('A') is None  # not loaded
+    await batch.commit()  # no-op
+
+
+def test_tx_state_cache_lru_and_ttl():
+    cache = TxStateCache(max_size=2, ttl=100)
+    cache.put('A', {'status': 'observed_in'}, now=1000)
+    cache.put('B', {}, now=1000)
+    assert cache.get('A', now=1050) == {'status': 'observed_in'}
+    cache.put('C', {}, now=1050)  # B is the least recently used one
+    assert 'B' not in cache and 'A' in cache
+
+    cache.update('A', {'status': 'given_away'}, now=1090)  # restarts the TTL
+    cache.update('Z', {'status': 'given_away'}, now=1090)  # not cached: ignored
+    assert 'Z' not in cache
+    assert cache.get('A', now=1150) == {'status': 'given_away'}
+    assert cache.get('C', now=1150) is None  # expired
+    assert cache.hits == 2 and cache.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_hot_cache_serves_repeated_reads(ev_db):
+    ev_db = EventDatabase(ev_db.db, expiration_sec=1000, hot_cache_size=100)
+    await ev_db.write_tx_status_kw('A', id='A', status='observed_in')
+
+    assert (await ev_db.read_tx_status('A')).status == 'observed_in'  # miss, now cached
+    await ev_db.db.redis.set(ev_db.key_to_tx('A'), ev_db.encode_record({'status': 'changed behind our back'}))
+    assert (await ev_db.read_tx_status('A')).status == 'observed_in'  # served from memory
+
+    # write-through, single and batched
+    await ev_db.write_tx_status_kw('A', status='given_away')
+    assert (await ev_db.read_tx_status('A')).status == 'given_away'
+    batch = ev_db.batch()
+    await batch.load(['A'])
+    batch.write_tx_status_kw('A', status='x')
+    await batch.commit()
+    assert (await ev_db.read_tx_status('A')).status == 'x'
+    assert ev_db.cache.hit_ratio > 0.5
+
+    # after a restart it is all in Redis
+    fresh = EventDatabase(ev_db.db, expiration_sec=1000, hot_cache_size=100)
+    assert (await fresh.read_tx_status('A')).status == 'x'
+
+
+@pytest.mark.asyncio
+async def test_hot_cache_entry_does_not_outlive_the_key(ev_db):
+    await ev_db.write_tx_status_kw('A', id='A', status='observed_in')
+    await ev_db.write_tx_status_kw('B', id='B', status='observed_in')
+    await ev_db.db.redis.expire(ev_db.key_to_tx('A'), 10)
+
+    cached = EventDatabase(ev_db.db, expiration_sec=1000, hot_cache_size=100)
+    await cached.read_tx_status_raw_many(['A', 'B'])
+    now = now_ts()
+    assert cached.cache.get('A', now=now + 5) == {'id': 'A', 'status': 'observed_in'}
+    assert cached.cache.get('A', now=now + 11) is None  # gone from Redis by then
+    assert cached.cache.get('B', now=now + 11) is not None
+
+    # a write restarts the TTL, like in Redis
+    await cached.write_tx_status_kw('B', status='given_away')
+    assert cached.cache.get('B', now=now + 999) is not None
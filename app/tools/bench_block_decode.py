@@ -0,0 +1,98 @@
+"""
+    Compares the regular block decoding (whole text -> ujson -> BlockResult.load_block) with
+    the streaming one (BlockResultStreamDecoder) on a directory of recorded blocks
+    (the same format as tools/replay_blocks.py uses).
+    Reports the decode time and the peak traced memory per block for both.
+
+    #: PYTHONPATH="/app" python tools/bench_block_decode.py ./replay/blocks --chunk 65536
+"""
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+import ujson
+
+from jobs.scanner.block_result import BlockResult
+from jobs.scanner.block_stream import BlockResultStreamDecoder
+from jobs.scanner.scan_cache import BlockRawCache
+
+
+def load_payload(path) -> bytes:
+    with open(path, 'r') as f:
+        data = f.read().strip()
+    if data.startswith('"'):
+        data = json.loads(data)
+    if data.startswith(BlockRawCache.COMPRESSED_PREFIX):
+        # the bench needs the bytes as they come from the node
+        return ujson.dumps(BlockRawCache.decode(data)).encode('utf-8')
+    return data.encode('utf-8')
+
+
+def decode_regular(payload: bytes, height):
+    return BlockResult.load_block(ujson.loads(payload.decode('utf-8')), height)
+
+
+def decode_streaming(payload: bytes, height, chunk_size):
+    decoder = BlockResultStreamDecoder(height)
+    for i in range(0, len(payload), chunk_size):
+        decoder.feed(payload[i:i + chunk_size])
+    return decoder.close()
+
+
+def measure(fn, *args):
+    gc.collect()
+    t0 = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+
+    gc.collect()
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Block decoding benchmark')
+    parser.add_argument('directory', type=str, help='Directory with <height>.json files')
+    parser.add_argument('--chunk', type=int, default=1 << 16, help='Chunk size for the streaming decoder')
+    parser.add_argument('--min-size', type=int, default=0, help='Skip blocks smaller than this (bytes)')
+    args = parser.parse_args()
+
+    names = sorted((n for n in os.listdir(args.directory) if n.endswith('.json') and n[:-5].isdigit()),
+                   key=lambda n: int(n[:-5]))
+
+    totals = {'regular': [0.0, 0], 'streaming': [0.0, 0]}
+    n = 0
+    for name in names:
+        height = int(name[:-5])
+        payload = load_payload(os.path.join(args.directory, name))
+        if len(payload) < args.min_size:
+            continue
+
+        t_reg, peak_reg = measure(decode_regular, payload, height)
+        t_str, peak_str = measure(decode_streaming, payload, height, args.chunk)
+        totals['regular'][0] += t_reg
+        totals['regular'][1] = max(totals['regular'][1], peak_reg)
+        totals['streaming'][0] += t_str
+        totals['streaming'][1] = max(totals['streaming'][1], peak_str)
+        n += 1
+
+        print(f'#{height}: {len(payload) / 1e6:.2f} MB; '
+              f'regular {t_reg * 1e3:.1f} ms, peak {peak_reg / 1e6:.1f} MB; '
+              f'streaming {t_str * 1e3:.1f} ms, peak {peak_str / 1e6:.1f} MB')
+
+    if not n:
+        print('No blocks.')
+        return
+
+    for kind, (total_time, max_peak) in totals.items():
+        print(f'{kind:>10}: {total_time:.3f} sec for {n} blocks, max peak {max_peak / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+    Bloom filter latency: the old way (one SETBIT/GETBIT round trip per bit) vs one BITFIELD command per item.
+    Runs against fakeredis and, if --redis-url is given, against a real Redis (use a scratch database!).
+    The number of bits per item depends on the error rate only; the default capacity is small because fakeredis
+    copies the whole bit string on every write.
+
+    #: PYTHONPATH="/app" python tools/bench_bloom.py --items 2000 --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from lib.bloom_filt import BloomFilter
+from notify.dup_stop import BLOOM_TX_ERROR_RATE
+
+BENCH_KEY = '_bench:bloom'
+
+
+async def add_bit_by_bit(bf: BloomFilter, item):
+    for position in bf.positions(item):
+        await bf.redis.setbit(bf.redis_key, position, 1)
+
+
+async def contains_bit_by_bit(bf: BloomFilter, item):
+    for position in bf.positions(item):
+        if not await bf.redis.getbit(bf.redis_key, position):
+            return False
+    return True
+
+
+async def timed(fn, items):
+    t0 = time.perf_counter()
+    for item in items:
+        await fn(item)
+    return (time.perf_counter() - t0) / len(items)
+
+
+async def run(title, redis, n, capacity, error_rate):
+    bf = BloomFilter(redis, BENCH_KEY, capacity, error_rate)
+    seen = [os.urandom(32).hex() for _ in range(n)]
+    new = [os.urandom(32).hex() for _ in range(n)]
+
+    await redis.delete(BENCH_KEY)
+    results = {
+        'add, bit by bit': await timed(lambda x: add_bit_by_bit(bf, x), seen),
+        'check seen, bit by bit': await timed(lambda x: contains_bit_by_bit(bf, x), seen),
+        'check new, bit by bit': await timed(lambda x: contains_bit_by_bit(bf, x), new),
+    }
+    await redis.delete(BENCH_KEY)
+    results.update({
+        'add, BITFIELD': await timed(bf.add, seen),
+        'check seen, BITFIELD': await timed(bf.contains, seen),
+        'check new, BITFIELD': await timed(bf.contains, new),
+        'check-and-add, BITFIELD': await timed(bf.check_and_add, new),
+    })
+    await redis.delete(BENCH_KEY)
+
+    print(f'{title} (k={bf.hash_count} bits per item, {n} items):')
+    for name, t in results.items():
+        print(f'  {name:>24}: {t * 1e6:8.1f} us per item')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Bloom filter benchmark')
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--capacity', type=int, default=100_000)
+    parser.add_argument('--error-rate', type=float, default=BLOOM_TX_ERROR_RATE)
+    parser.add_argument('--redis-url', type=str, help='A real Redis to compare with')
+    args = parser.parse_args()
+
+    import fakeredis
+    await run('fakeredis', fakeredis.FakeAsyncRedis(decode_responses=True), args.items,
+              args.capacity, args.error_rate)
+
+    if args.redis_url:
+        from redis.asyncio import Redis
+        redis = Redis.from_url(args.redis_url, decode_responses=True)
+        await run(args.redis_url, redis, args.items, args.capacity, args.error_rate)
+        await redis.aclose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
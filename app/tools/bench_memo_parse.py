@@ -0,0 +1,74 @@
+"""
+    Memo parsing cost per block with and without the parsed memo cache, on a directory of recorded blocks
+    (the same format as tools/replay_blocks.py uses). Every memo found in a block is parsed --calls times,
+    the way several stages of the pipeline parse the same memo.
+
+    #: PYTHONPATH="/app" python tools/bench_memo_parse.py ./replay/blocks --calls 4
+"""
+import argparse
+import os
+import time
+
+import ujson
+
+from models.memo import THORMemo, parsed_memo_cache
+from tools.bench_block_decode import load_payload
+
+
+def find_memos(node, results):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == 'memo' and isinstance(v, str):
+                results.append(v)
+            else:
+                find_memos(v, results)
+    elif isinstance(node, list):
+        for v in node:
+            find_memos(v, results)
+    return results
+
+
+def parse_all(parse_fn, memos, calls):
+    t0 = time.perf_counter()
+    for memo in memos:
+        for _ in range(calls):
+            try:
+                parse_fn(memo)
+            except Exception:
+                pass
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memo parsing benchmark')
+    parser.add_argument('directory', type=str, help='Directory with <height>.json files')
+    parser.add_argument('--calls', type=int, default=4, help='How many times each memo is parsed per block')
+    args = parser.parse_args()
+
+    names = sorted((n for n in os.listdir(args.directory) if n.endswith('.json') and n[:-5].isdigit()),
+                   key=lambda n: int(n[:-5]))
+
+    blocks = []
+    for name in names:
+        payload = load_payload(os.path.join(args.directory, name))
+        blocks.append(find_memos(ujson.loads(payload), []))
+    if not blocks:
+        print('No blocks.')
+        return
+
+    n_memos = sum(len(memos) for memos in blocks)
+    print(f'{len(blocks)} blocks, {n_memos} memos, {len(set(m for ms in blocks for m in ms))} distinct.')
+
+    # the cache lives through all the blocks, like in the scanner
+    parsed_memo_cache.clear()
+    t_uncached = sum(parse_all(THORMemo._parse_memo, memos, args.calls) for memos in blocks)
+    t_cached = sum(parse_all(THORMemo.parse_memo, memos, args.calls) for memos in blocks)
+
+    per_block = 1e3 / len(blocks)
+    print(f'  uncached: {t_uncached * per_block:.3f} ms per block')
+    print(f'    cached: {t_cached * per_block:.3f} ms per block '
+          f'({t_uncached / t_cached if t_cached else 0:.1f}x), {parsed_memo_cache.stats}')
+
+
+if __name__ == '__main__':
+    main()
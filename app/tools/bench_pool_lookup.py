@@ -0,0 +1,93 @@
+"""
+    Fuzzy pool lookup micro-benchmark: the scan (fuzzy_search over the pool names, like pool_fuzzy_first did)
+    vs FuzzySearchIndex, at the current pool count and at a multiple of it.
+    The pool names come from a pools.json snapshot (see tools/replay_blocks.py export --pools) or are synthetic.
+
+    #: PYTHONPATH="/app" python tools/bench_pool_lookup.py --pools ./replay/blocks/pools.json --scale 10
+"""
+import argparse
+import json
+import random
+import time
+
+from lib.texts import fuzzy_search, FuzzySearchIndex
+
+CHAINS = ['ETH', 'BSC', 'BASE', 'AVAX', 'TRON', 'SOL']
+COINS = ['BTC.BTC', 'ETH.ETH', 'BSC.BNB', 'BASE.ETH', 'GAIA.ATOM', 'DOGE.DOGE', 'AVAX.AVAX', 'LTC.LTC',
+         'BCH.BCH', 'XRP.XRP']
+
+
+def synthetic_pools(n, rnd: random.Random):
+    names = list(COINS[:n])
+    while len(names) < n:
+        token = ''.join(rnd.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rnd.randint(3, 6)))
+        address = '0X' + ''.join(rnd.choice('0123456789ABCDEF') for _ in range(40))
+        names.append(f'{rnd.choice(CHAINS)}.{token}-{address}')
+    return names
+
+
+def make_queries(names, n, rnd: random.Random):
+    queries = []
+    for _ in range(n):
+        name = rnd.choice(names)
+        chain_and_token, _, address = name.partition('-')
+        queries.append(rnd.choice([
+            name,  # exact
+            chain_and_token,  # ETH.USDT
+            f'{chain_and_token}-{address[-3:]}' if address else chain_and_token,  # ETH.USDT-EC7
+            chain_and_token.lower(),
+        ]))
+    return queries
+
+
+def bench(fn, queries, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            fn(q)
+    return (time.perf_counter() - t0) / (repeat * len(queries))
+
+
+def run(names, queries, repeat):
+    pool_map = dict.fromkeys(names)
+
+    t0 = time.perf_counter()
+    index = FuzzySearchIndex(pool_map.keys())
+    t_build = time.perf_counter() - t0
+
+    for q in queries:
+        assert index.search(q) == [n for n in names if n in fuzzy_search(q, set(pool_map.keys()))], q
+
+    # the old path built the set of pool names on every call
+    t_scan = bench(lambda q: fuzzy_search(q, set(pool_map.keys())), queries, repeat)
+    t_index = bench(index._search, queries, repeat)
+    t_memo = bench(index.search, queries, repeat)
+
+    print(f'{len(names):>6} pools: build {t_build * 1e3:.2f} ms; per query: scan {t_scan * 1e6:.1f} us, '
+          f'index {t_index * 1e6:.2f} us ({t_scan / t_index:.0f}x), memoized {t_memo * 1e6:.2f} us '
+          f'({t_scan / t_memo:.0f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuzzy pool lookup benchmark')
+    parser.add_argument('--pools', type=str, help='pools.json snapshot')
+    parser.add_argument('--count', type=int, default=60, help='Pool count without a snapshot')
+    parser.add_argument('--scale', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    if args.pools:
+        with open(args.pools, 'r') as f:
+            names = list(json.load(f).keys())
+    else:
+        names = synthetic_pools(args.count, rnd)
+
+    for names in (names, names + synthetic_pools(len(names) * args.scale, rnd)[len(names):]):
+        names = list(dict.fromkeys(names))
+        run(names, make_queries(names, args.queries, rnd), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,22 +5,25 @@ import asyncio
 import logging
 
 import tqdm
-from redis.asyncio import Redis
 
+from jobs.scanner.event_db import EventDatabase
 from lib.constants import THOR_BLOCK_TIME
 from lib.date_utils import DAY
 from lib.money import format_percent
 from tools.lib.lp_common import LpAppFramework
 
 MAX_AGE = 30 * DAY
+PAGE_SIZE = 500
 
 
 async def do_job(app):
-    r: Redis = await app.deps.db.get_redis()
-    logging.info('Loading all txs from DB')
-    tx_keys = await r.keys('tx:tracker:*')
-    logging.info(f'Found {len(tx_keys)} txs')
-    if not tx_keys:
+    ev_db = EventDatabase(app.deps.db)
+    if not await ev_db.count_tx_ids():
+        logging.info('The index is empty. Indexing the txs first')
+        await ev_db.rebuild_index()
+    total = await ev_db.count_tx_ids()
+    logging.info(f'Found {total} txs')
+    if not total:
         logging.error('No txs found!')
         return
 
@@ -37,24 +40,27 @@ async def do_job(app):
 
     none_height_blocks = 0
     old_blocks = 0
+    to_delete = []
 
-    for tx_key in tqdm.tqdm(tx_keys):
-        block_height = await r.hget(tx_key, 'block_height')
+    progress = tqdm.tqdm(total=total)
+    async for tx_id, attrs in ev_db.iter_tx_records(page_size=PAGE_SIZE):
+        progress.update()
+        block_height = attrs.get('block_height')
         if block_height is None:
-            block_height = 0
             none_height_blocks += 1
-        elif block_height:
-            block_height = int(block_height)
+        block_height = int(block_height or 0)
 
-        block_height = int(block_height)
-        will_delete = block_height < min_block
-        if will_delete:
+        if block_height < min_block:
             old_blocks += 1
-            await r.delete(tx_key)
-        # print(f"Block height: {block_height}; will delete? {block_height < min_block}")
+            to_delete.append(tx_id)
+            if len(to_delete) >= PAGE_SIZE:
+                await ev_db.erase_tx_ids(to_delete)
+                to_delete = []
+    await ev_db.erase_tx_ids(to_delete)
+    progress.close()
 
-    print(f'None height blocks: {none_height_blocks} ({format_percent(none_height_blocks, len(tx_keys))})')
-    print(f"Old blocks: {old_blocks} ({format_percent(old_blocks, len(tx_keys))})")
+    print(f'None height blocks: {none_height_blocks} ({format_percent(none_height_blocks, total)})')
+    print(f"Old blocks: {old_blocks} ({format_percent(old_blocks, total)})")
 
 
 async def main():
@@ -1,29 +1,38 @@
+from lib.date_utils import format_time_ago, now_ts, seconds_human
 from lib.money import format_percent
 from notify.dup_stop import TxDeduplicator
 
+DEDUP_NAMES = [
+    "scanner:last_seen", 'route:seen_tx', 'TxCount', 'VolumeRecorder', "loans:announced-hashes",
+    'RunePool:announced-hashes', 'ss-started:announced-hashes', 'TradeAcc:announced-hashes',
+    'large-tx:announced-hashes'
+]
 
-async def dedup_dashboard_info(d):
-    items = [
-        "scanner:last_seen", 'route:seen_tx', 'TxCount', 'VolumeRecorder', "loans:announced-hashes",
-        'RunePool:announced-hashes', 'ss-started:announced-hashes', 'TradeAcc:announced-hashes',
-        'large-tx:announced-hashes'
-    ]
 
+async def dedup_dashboard_info(d):
     summary = []
-    for name in items:
+    for name in DEDUP_NAMES:
         dedup = TxDeduplicator(d.db, name)
         bit_count = await dedup.bit_count()
         size = await dedup.length()
         stats = await dedup.load_stats()
+        capacity = (await dedup.capacity_reports(record=False))[0]
         summary.append({
             'Names': name,
             'Bits 1': bit_count,
             'Size': size,
-            'Fill %': format_percent(bit_count, size),
+            'Fill %': format_percent(capacity.fill_ratio, 1.0),
+            'FP rate': f'{capacity.false_positive_rate:.2g} / {capacity.target_false_positive_rate:.2g}',
+            'Breach in': ('now' if capacity.is_breached else
+                          seconds_human(capacity.breach_ts - now_ts()) if capacity.breach_ts else '-'),
+            'Migrating': 'yes' if dedup.migration else '',
             'Total read': stats['total_requests'],
             'Positive': stats['positive_requests'],
             'Success': format_percent(stats['positive_requests'], stats['total_requests']),
             'Writes': stats['write_requests'],
+            # the counters are flushed periodically: a crash of the bot loses at most the counts since then
+            'Flushed': format_time_ago(now_ts() - stats['last_flush_ts'] if stats['last_flush_ts'] else 0),
+            'Flush every (s)': stats['flush_interval_sec'],
         })
 
     return summary
@@ -0,0 +1,107 @@
+# Instructions:
+# $ make attach
+# $ PYTHONPATH="/app" python tools/dedup_capacity.py /config/config.yaml report
+# $ PYTHONPATH="/app" python tools/dedup_capacity.py /config/config.yaml migrate large-tx:announced-hashes \
+#       --capacity 200000000 --error-rate 0.002 --transition 7d
+# $ PYTHONPATH="/app" python tools/dedup_capacity.py /config/config.yaml status large-tx:announced-hashes
+# $ PYTHONPATH="/app" python tools/dedup_capacity.py /config/config.yaml finish large-tx:announced-hashes
+#
+# A migration fills a new filter next to the old one: during the transition every tx is written to both
+# and it is "seen" if either has it, so nothing is announced again and nothing stops. The running bot picks
+# the migration up within a minute, and the transition counts from then. After the transition only the new filter
+# is used; "finish" deletes the old one.
+# The transition must be longer than the age of the txs that can come again (tx.max_age and alike).
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from lib.date_utils import parse_timespan_to_seconds
+from lib.money import format_percent
+from notify.dup_stop import TxDeduplicator
+from tools.dashboard.dedup import DEDUP_NAMES
+from tools.lib.lp_common import LpAppFramework
+
+
+def print_capacity(dedup: TxDeduplicator, reports):
+    for report in reports:
+        print(f'{dedup.key} ({report.key}): size {report.size} bits, k={report.hash_count}')
+        print(f'  fill {format_percent(report.fill_ratio, 1.0)}, ~{report.items:,.0f} items, '
+              f'FP rate {report.false_positive_rate:.3g} (target {report.target_false_positive_rate:.3g}), '
+              f'~{max(0.0, report.items_left):,.0f} items left')
+        if report.is_breached:
+            print('  (!) the target is exceeded')
+        elif report.breach_ts:
+            print(f'  +{report.items_per_day:,.0f} items/day, the target is exceeded '
+                  f'on {datetime.fromtimestamp(report.breach_ts):%Y-%m-%d}')
+        else:
+            print('  no growth recorded yet')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fill of the tx dedup bloom filters and their online migration')
+    parser.add_argument('config', type=str, help='Path to the configuration file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_report = sub.add_parser('report', help='Fill, false positive rate and its projection (records a sample)')
+    p_report.add_argument('names', nargs='*', default=DEDUP_NAMES)
+    p_migrate = sub.add_parser('migrate', help='Start the transition to a new filter')
+    p_migrate.add_argument('name')
+    p_migrate.add_argument('--capacity', type=int, required=True)
+    p_migrate.add_argument('--error-rate', type=float, required=True)
+    p_migrate.add_argument('--transition', type=str, default='7d', help='Double-writing period, like 7d')
+    p_migrate.add_argument('--generations', type=int, default=0, help='> 0: rotating (time-windowed) filter')
+    p_migrate.add_argument('--period', type=str, default='7d', help='Of a generation of a rotating filter')
+    for command, help_text in [('status', 'The migration in progress'),
+                               ('finish', 'Drop the old filter after the transition'),
+                               ('abort', 'Drop the new filter')]:
+        p = sub.add_parser(command, help=help_text)
+        p.add_argument('name')
+        if command == 'finish':
+            p.add_argument('--force', action='store_true', help='Before the end of the transition')
+        elif command == 'abort':
+            p.add_argument('--force', action='store_true',
+                           help='After the end of the transition: the marks made since then are lost!')
+    args = parser.parse_args()
+
+    # clear argv: Config reads the path from sys.argv[1]
+    sys.argv = sys.argv[:1]
+    sys.argv.append(args.config)
+
+    app = LpAppFramework(log_level=logging.INFO)
+    async with app(brief=True):
+        d = app.deps
+
+        if args.command == 'report':
+            for name in args.names:
+                dedup = TxDeduplicator(d.db, name)
+                print_capacity(dedup, await dedup.capacity_reports())
+            return
+
+        dedup = TxDeduplicator(d.db, args.name)
+        if args.command == 'migrate':
+            layout = await dedup.start_migration(
+                args.capacity, args.error_rate,
+                transition_sec=parse_timespan_to_seconds(args.transition),
+                generations=args.generations,
+                period=parse_timespan_to_seconds(args.period),
+            )
+            print(f'Started: {layout}')
+        elif args.command == 'finish':
+            await dedup.finish_migration(force=args.force)
+            print('Finished')
+        elif args.command == 'abort':
+            await dedup.abort_migration(force=args.force)
+            print('Aborted')
+        else:
+            await dedup.refresh_layout(force=True)
+            if migration := dedup.migration:
+                print(f'Migration: {migration["current"]} -> {migration["next"]}, '
+                      f'till {datetime.fromtimestamp(migration["until_ts"])}')
+            else:
+                print('No migration in progress')
+            print_capacity(dedup, await dedup.capacity_reports(record=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
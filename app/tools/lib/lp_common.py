@@ -12,6 +12,7 @@ from jobs.volume_recorder import VolumeRecorder, TxCountRecorder
 from lib.constants import NetworkIdents
 from lib.delegates import INotified
 from lib.draw_utils import img_to_bio
+from notify.dup_stop import dedup_stats_flusher
 from api.midgard.parser import MidgardParserV2
 from lib.texts import sep
 from lib.utils import load_json
@@ -102,6 +103,7 @@ class LpAppFramework(App):
         await d.pool_fetcher.run_once()
 
     async def close(self):
+        await dedup_stats_flusher.flush()
         await self.deps.session.close()
 
     async def __aenter__(self):
@@ -0,0 +1,325 @@
+"""
+    Offline block replay harness.
+
+    Feeds a recorded directory of raw block JSON through the same block-scanner subscriber graph that App wires
+    in main.py, against an in-memory fake Redis and with pools frozen from a snapshot, as fast as possible.
+    Reports blocks/sec, per-stage latency percentiles (self time and total time incl. downstream) and
+    Redis command counts.
+
+    The directory contains files named "<height>.json". Each one is either plain block JSON or
+    a compressed payload the way BlockScannerCached stores it in Redis.
+    Optional "pools.json" holds the pool snapshot ({asset: PoolInfo.as_dict_brief()}).
+
+    Examples:
+
+    1. Dump the blocks cached by BlockScannerCached to a directory (and fetch the pools once):
+    #: PYTHONPATH="/app" python tools/replay_blocks.py /config/config.yaml export ./replay/blocks \\
+        --start 19000000 --end 19001000 --pools
+
+    2. Replay:
+    #: PYTHONPATH="/app" python tools/replay_blocks.py /config/config.yaml replay ./replay/blocks
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+from api.w3.aggregator import AggregatorDataExtractor
+from jobs.achievement.notifier import AchievementsNotifier
+from jobs.scanner.loan_extractor import LoanExtractorBlock
+from jobs.scanner.native_scan import BlockScanner
+from jobs.scanner.runepool import RunePoolEventDecoder
+from jobs.scanner.scan_cache import BlockRawCache
+from jobs.scanner.swap_extractor import SwapExtractorBlock
+from jobs.scanner.swap_routes import SwapRouteRecorder
+from jobs.scanner.trade_acc import TradeAccEventDecoder
+from jobs.scanner.transfer_detector import RuneTransferDetector
+from jobs.user_counter import UserCounterMiddleware
+from jobs.volume_filler import VolumeFillerUpdater
+from jobs.volume_recorder import VolumeRecorder, TxCountRecorder
+from lib.delegates import INotified, WithDelegates
+from lib.texts import sep
+from lib.timings import pipeline_timings, PipelineTimings
+from models.pool_info import PoolInfo
+from notify.dup_stop import MultiTxDeduplicator
+from tools.lib.lp_common import LpAppFramework
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+POOLS_FILE = 'pools.json'
+WINDOW_PER_BLOCK = 20  # a stage may run several times per block
+
+
+class CommandCounter:
+    def __init__(self):
+        self.commands = Counter()
+        self.round_trips = 0
+
+    @property
+    def total(self):
+        return sum(self.commands.values())
+
+
+def make_counting_redis(counter: CommandCounter):
+    if fakeredis is None:
+        raise ImportError('fakeredis is required for the replay. Run "pip install fakeredis".')
+
+    class CountingFakeRedis(fakeredis.FakeAsyncRedis):
+        async def execute_command(self, *args, **options):
+            counter.commands[str(args[0]).upper()] += 1
+            counter.round_trips += 1
+            return await super().execute_command(*args, **options)
+
+        def pipeline(self, transaction=True, shard_hint=None):
+            pipe = super().pipeline(transaction=transaction, shard_hint=shard_hint)
+            original_execute = pipe.execute
+
+            async def execute(raise_on_error=True):
+                for args, _ in pipe.command_stack:
+                    counter.commands[str(args[0]).upper()] += 1
+                counter.round_trips += 1
+                return await original_execute(raise_on_error)
+
+            pipe.execute = execute
+            return pipe
+
+    return CountingFakeRedis(decode_responses=True)
+
+
+class PassThroughStage(WithDelegates, INotified):
+    """
+    Stands in for a stage that would go to the network (e.g. the DEX aggregator, which calls web3).
+    """
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    async def on_data(self, sender, data):
+        await self.pass_data_to_listeners(data, sender)
+
+
+class ReplayBlockScanner(BlockScanner):
+    def __init__(self, deps, directory):
+        super().__init__(deps, adaptive_polling=False)
+        self.directory = directory
+
+    @staticmethod
+    def list_heights(directory):
+        heights = []
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext == '.json' and stem.isdigit():
+                heights.append(int(stem))
+        return sorted(heights)
+
+    async def _fetch_raw_block(self, block_no):
+        path = os.path.join(self.directory, f'{block_no}.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            data = f.read().strip()
+        if data.startswith('"'):
+            data = json.loads(data)  # a JSON string with the compressed payload
+        return BlockRawCache.decode(data)
+
+    async def replay_block(self, block):
+        await self._dispatch_block(block)
+
+
+def build_pipeline(app: LpAppFramework, scanner: BlockScanner):
+    """
+    The block scanner part of the graph that App wires in main.py, without the notifiers.
+    """
+    d = app.deps
+    d.block_scanner = scanner
+
+    achievements = AchievementsNotifier(d)
+
+    reserve_address = d.cfg.as_str('native_scanner.reserve_address')
+    scanner.add_subscriber(RuneTransferDetector(reserve_address))
+
+    d.user_counter = UserCounterMiddleware(d)
+    scanner.add_subscriber(d.user_counter)
+
+    aggregator = PassThroughStage(AggregatorDataExtractor.__name__)
+    swap_extractor = SwapExtractorBlock(d)
+    scanner.add_subscriber(swap_extractor)
+    swap_extractor.add_subscriber(aggregator)
+
+    volume_filler = VolumeFillerUpdater(d)
+    aggregator.add_subscriber(volume_filler)
+
+    tx_dedups = MultiTxDeduplicator(d.db, ['VolumeRecorder', 'TxCount', 'route:seen_tx'])
+    volume_filler.add_subscriber(tx_dedups)
+
+    d.volume_recorder = VolumeRecorder(d)
+    tx_dedups.add_subscriber(d.volume_recorder)
+    d.tx_count_recorder = TxCountRecorder(d)
+    tx_dedups.add_subscriber(d.tx_count_recorder)
+    d.route_recorder = SwapRouteRecorder(d.db)
+    tx_dedups.add_subscriber(d.route_recorder)
+    volume_filler.add_subscriber(achievements)
+
+    loan_extractor = LoanExtractorBlock(d)
+    scanner.add_subscriber(loan_extractor)
+    loan_extractor.add_subscriber(achievements)
+
+    trade_acc_decoder = TradeAccEventDecoder(d.price_holder)
+    runepool_decoder = RunePoolEventDecoder(d.db, d.price_holder)
+    for decoder in (trade_acc_decoder, runepool_decoder):
+        scanner.add_subscriber(decoder)
+        decoder.add_subscriber(d.volume_recorder)
+        decoder.add_subscriber(d.tx_count_recorder)
+    trade_acc_decoder.add_subscriber(achievements)
+
+
+def load_pools(directory):
+    path = os.path.join(directory, POOLS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        raw = json.load(f)
+    return {k: PoolInfo.from_dict_brief(v) for k, v in raw.items()}
+
+
+def save_pools(directory, pool_map):
+    with open(os.path.join(directory, POOLS_FILE), 'w') as f:
+        json.dump({k: p.as_dict_brief() for k, p in pool_map.items()}, f)
+
+
+async def freeze_pools(app: LpAppFramework, directory):
+    d = app.deps
+    pool_map = load_pools(directory)
+    if not pool_map:
+        logging.warning(f'No {POOLS_FILE} in {directory}. Loading the pools from the node once.')
+        pool_map = await d.pool_fetcher.load_pools(caching=False)
+        save_pools(directory, pool_map)
+
+    d.price_holder.update_pools(pool_map)
+
+    async def frozen_pools(*_, **__):
+        return pool_map
+
+    d.pool_fetcher.load_pools = frozen_pools
+
+
+async def run_replay(args):
+    counter = CommandCounter()
+    app = LpAppFramework(log_level=logging.WARNING, emergency=False)
+    d = app.deps
+    d.db.redis = make_counting_redis(counter)
+
+    async with app(brief=True):
+        await freeze_pools(app, args.directory)
+
+        scanner = ReplayBlockScanner(d, args.directory)
+        heights = scanner.list_heights(args.directory)
+        if args.limit:
+            heights = heights[:args.limit]
+        if not heights:
+            logging.error(f'No blocks found in {args.directory}')
+            return
+
+        d.last_block_store.last_thor_block = heights[-1]
+        build_pipeline(app, scanner)
+
+        # the setup is not interesting; keep every sample of the replay for the percentiles
+        pipeline_timings.reset(window=len(heights) * WINDOW_PER_BLOCK)
+        counter.commands.clear()
+        counter.round_trips = 0
+
+        t_start = time.perf_counter()
+        for height in heights:
+            block = await scanner.fetch_one_block(height)
+            if block is None or block.is_error:
+                logging.error(f'Block #{height} is not usable. Skipping.')
+                continue
+            await scanner.replay_block(block)
+        elapsed = time.perf_counter() - t_start
+
+    print_report(heights, elapsed, pipeline_timings, counter, args.top)
+
+
+def print_report(heights, elapsed, timings: PipelineTimings, counter: CommandCounter, top):
+    n = len(heights)
+    sep()
+    print(f'Blocks: {n} (#{heights[0]} ... #{heights[-1]})')
+    print(f'Elapsed: {elapsed:.3f} sec; {n / elapsed if elapsed else 0.0:.1f} blocks/sec')
+
+    sep()
+    print(f'{"stage":<36} {"calls":>7} {"self p50":>9} {"p90":>9} {"p99":>9} '
+          f'{"total p99":>10} {"max":>9} {"self sum":>9}')
+    for name, st in timings.summary.items():
+        print(f'{name:<36} {st["calls"]:>7} {st["self_p50"] * 1e3:>7.2f}ms {st["self_p90"] * 1e3:>7.2f}ms '
+              f'{st["self_p99"] * 1e3:>7.2f}ms {st["total_p99"] * 1e3:>8.2f}ms {st["max"] * 1e3:>7.2f}ms '
+              f'{st["self_sum"]:>8.2f}s')
+
+    sep()
+    print(f'Redis: {counter.total} commands in {counter.round_trips} round trips; '
+          f'{counter.total / n:.1f} commands/block, {counter.round_trips / n:.1f} round trips/block')
+    for command, count in counter.commands.most_common(top):
+        print(f'  {command:<20} {count:>9} ({count / n:.2f}/block)')
+
+
+async def run_export(args):
+    app = LpAppFramework(log_level=logging.INFO, emergency=False)
+    async with app(brief=True):
+        d = app.deps
+        os.makedirs(args.directory, exist_ok=True)
+
+        r = await d.db.get_redis()
+        n = 0
+        async for key, data in r.hscan_iter(BlockRawCache.DB_KEY_BLOCK):
+            if not key.isdigit() or not (args.start <= int(key) <= (args.end or int(key))):
+                continue
+            with open(os.path.join(args.directory, f'{key}.json'), 'w') as f:
+                f.write(data)
+            n += 1
+        print(f'Exported {n} blocks to {args.directory}')
+
+        if args.pools:
+            save_pools(args.directory, await d.pool_fetcher.load_pools(caching=False))
+            print(f'Saved the pools to {POOLS_FILE}')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Offline block replay harness')
+    parser.add_argument('config', type=str, help='Path to the configuration file')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_replay = sub.add_parser('replay', help='Replay the recorded blocks through the block scanner pipeline')
+    p_replay.add_argument('directory', type=str, help='Directory with <height>.json files')
+    p_replay.add_argument('--limit', type=int, default=0, help='Replay only the first N blocks')
+    p_replay.add_argument('--top', type=int, default=20, help='How many Redis commands to list')
+
+    p_export = sub.add_parser('export', help='Dump the raw block cache from Redis to a directory')
+    p_export.add_argument('directory', type=str, help='Output directory')
+    p_export.add_argument('--start', type=int, default=0, help='First height')
+    p_export.add_argument('--end', type=int, default=0, help='Last height (0 = no limit)')
+    p_export.add_argument('--pools', action='store_true', help='Also save the current pools to pools.json')
+
+    args = parser.parse_args()
+
+    # clear argv: Config reads the path from sys.argv[1]
+    sys.argv = sys.argv[:1]
+    sys.argv.append(args.config)
+
+    if args.command == 'replay':
+        await run_replay(args)
+    else:
+        await run_export(args)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# Instructions:
+# $ make attach
+# $ PYTHONPATH="/app" python tools/tx_tracker_index.py /config/config.yaml rebuild
+# $ PYTHONPATH="/app" python tools/tx_tracker_index.py /config/config.yaml backup /tmp/tx_tracker_backup.json
+# $ PYTHONPATH="/app" python tools/tx_tracker_index.py /config/config.yaml list --limit 20
+# $ PYTHONPATH="/app" python tools/tx_tracker_index.py /config/config.yaml memory --sample 1000
+# $ PYTHONPATH="/app" python tools/tx_tracker_index.py /config/config.yaml migrate
+import argparse
+import asyncio
+import logging
+import sys
+from collections import defaultdict
+
+from redis.asyncio import Redis
+
+from jobs.scanner.event_db import EventDatabase
+from tools.lib.lp_common import LpAppFramework
+
+
+async def memory_report(ev_db: EventDatabase, sample):
+    """
+    Average Redis memory per record of either format on a random sample of the indexed txs.
+    """
+    r: Redis = await ev_db.db.get_redis()
+    tx_ids = await r.zrandmember(ev_db.DB_KEY_INDEX, sample)
+    async with r.pipeline(transaction=False) as pipe:
+        for tx_id in tx_ids:
+            pipe.type(ev_db.key_to_tx(tx_id))
+            pipe.memory_usage(ev_db.key_to_tx(tx_id))
+        results = await pipe.execute()
+
+    usage = defaultdict(list)
+    for key_type, size in zip(results[0::2], results[1::2]):
+        if size:
+            usage[key_type].append(size)
+    for key_type, sizes in usage.items():
+        print(f'{key_type}: {len(sizes)} records, {sum(sizes) / len(sizes):.0f} bytes per record on average')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Index of the tracked txs (tx:tracker:*)')
+    parser.add_argument('config', type=str, help='Path to the configuration file')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('rebuild', help='Index the txs written before the index existed (SCAN, not KEYS)')
+    sub.add_parser('prune', help='Remove the expired txs from the index')
+    p_backup = sub.add_parser('backup', help='Stream all tracked txs to a JSON file')
+    p_backup.add_argument('filename', type=str)
+    p_list = sub.add_parser('list', help='The most recently updated txs')
+    p_list.add_argument('--limit', type=int, default=20)
+    p_list.add_argument('--offset', type=int, default=0)
+    p_memory = sub.add_parser('memory', help='Memory per record, hashes vs compact records')
+    p_memory.add_argument('--sample', type=int, default=1000)
+    p_migrate = sub.add_parser('migrate', help='Convert the hash records into compact ones in place (online)')
+    p_migrate.add_argument('--page', type=int, default=200)
+    args = parser.parse_args()
+
+    # clear argv: Config reads the path from sys.argv[1]
+    sys.argv = sys.argv[:1]
+    sys.argv.append(args.config)
+
+    app = LpAppFramework(log_level=logging.INFO)
+    async with app(brief=True):
+        d = app.deps
+        ev_db = EventDatabase(d.db, expiration_sec=d.cfg.as_interval('native_scanner.db.ttl', '3d'))
+
+        if args.command == 'rebuild':
+            await ev_db.rebuild_index()
+        elif args.command == 'prune':
+            await ev_db.prune_index()
+        elif args.command == 'backup':
+            await ev_db.backup(args.filename)
+        elif args.command == 'memory':
+            await memory_report(ev_db, args.sample)
+        elif args.command == 'migrate':
+            await memory_report(ev_db, 1000)
+            print(await ev_db.migrate_to_compact(scan_count=args.page))
+            await memory_report(ev_db, 1000)
+        else:
+            for tx_id in await ev_db.list_tx_ids(offset=args.offset, limit=args.limit):
+                print(tx_id)
+
+        print(f'Indexed txs: {await ev_db.count_tx_ids()}')
+
+
+if __name__ == "__main__":
+    asyncio.run(main())